@@ -0,0 +1,38 @@
+"""reminder watermarks
+
+Revision ID: 0010_reminder_watermarks
+Revises: 0009_enums_and_overlap_fix
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010_reminder_watermarks"
+down_revision = "0009_enums_and_overlap_fix"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "reminder_watermarks",
+        sa.Column("name", sa.String(length=64), primary_key=True),
+        sa.Column("value", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+    # catch-up ищет активные записи по starts_at
+    op.create_index(
+        "ix_appointments_active_starts_at",
+        "appointments",
+        ["starts_at", "id"],
+        postgresql_where=sa.text("status = 'active'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_appointments_active_starts_at", table_name="appointments")
+    op.drop_table("reminder_watermarks")
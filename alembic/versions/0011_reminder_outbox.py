@@ -0,0 +1,52 @@
+"""reminder outbox
+
+Revision ID: 0011_reminder_outbox
+Revises: 0010_reminder_watermarks
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0011_reminder_outbox"
+down_revision = "0010_reminder_watermarks"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    outbox_status = postgresql.ENUM("pending", "sent", "failed", name="outbox_status")
+
+    op.create_table(
+        "reminder_outbox",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column(
+            "appointment_id", sa.Integer(), sa.ForeignKey("appointments.id", ondelete="CASCADE"), nullable=False
+        ),
+        sa.Column("kind", sa.String(length=16), nullable=False),
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("payload", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("status", outbox_status, server_default="pending", nullable=False),
+        sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("sent_at", sa.DateTime(timezone=True), nullable=True),
+        sa.UniqueConstraint("appointment_id", "kind", name="uq_reminder_outbox_appointment_kind"),
+    )
+    op.create_index(
+        "ix_reminder_outbox_pending",
+        "reminder_outbox",
+        ["next_attempt_at"],
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_reminder_outbox_pending", table_name="reminder_outbox")
+    op.drop_table("reminder_outbox")
+    postgresql.ENUM(name="outbox_status").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,84 @@
+"""booking change notifications (LISTEN/NOTIFY)
+
+Revision ID: 0012_booking_notify
+Revises: 0011_reminder_outbox
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+revision = "0012_booking_notify"
+down_revision = "0011_reminder_outbox"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_appointment_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('booking_events', json_build_object(
+                'table', 'appointments',
+                'op', TG_OP,
+                'id', NEW.id,
+                'appointment_id', NEW.id,
+                'status', NEW.status,
+                'old_status', CASE WHEN TG_OP = 'UPDATE' THEN OLD.status END,
+                'user_id', NEW.user_id,
+                'master_id', NEW.master_id,
+                'starts_at', NEW.starts_at,
+                'old_starts_at', CASE WHEN TG_OP = 'UPDATE' THEN OLD.starts_at END
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_appointments_notify
+        AFTER INSERT OR UPDATE OF status, starts_at ON appointments
+        FOR EACH ROW
+        EXECUTE FUNCTION notify_appointment_change();
+        """
+    )
+
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_payment_change() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND NEW.status IS NOT DISTINCT FROM OLD.status THEN
+                RETURN NULL;
+            END IF;
+            PERFORM pg_notify('booking_events', json_build_object(
+                'table', 'payments',
+                'op', TG_OP,
+                'id', NEW.id,
+                'appointment_id', (SELECT a.id FROM appointments a WHERE a.payment_id = NEW.id LIMIT 1),
+                'status', NEW.status,
+                'old_status', CASE WHEN TG_OP = 'UPDATE' THEN OLD.status END
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_payments_notify
+        AFTER INSERT OR UPDATE OF status ON payments
+        FOR EACH ROW
+        EXECUTE FUNCTION notify_payment_change();
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_payments_notify ON payments")
+    op.execute("DROP FUNCTION IF EXISTS notify_payment_change()")
+    op.execute("DROP TRIGGER IF EXISTS trg_appointments_notify ON appointments")
+    op.execute("DROP FUNCTION IF EXISTS notify_appointment_change()")
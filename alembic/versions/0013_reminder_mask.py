@@ -0,0 +1,55 @@
+"""reminder bitmask instead of per-offset flags
+
+Revision ID: 0013_reminder_mask
+Revises: 0012_booking_notify
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0013_reminder_mask"
+down_revision = "0012_booking_notify"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "appointments",
+        sa.Column("reminded_mask", sa.Integer(), server_default="0", nullable=False),
+    )
+    # биты по умолчанию REMINDER_OFFSETS=24h,1h: 24h -> бит 0, 1h -> бит 1
+    op.execute(
+        """
+        UPDATE appointments
+        SET reminded_mask = (CASE WHEN reminded_24h THEN 1 ELSE 0 END)
+                          | (CASE WHEN reminded_1h THEN 2 ELSE 0 END)
+        WHERE reminded_24h OR reminded_1h
+        """
+    )
+    op.drop_column("appointments", "reminded_1h")
+    op.drop_column("appointments", "reminded_24h")
+
+
+def downgrade() -> None:
+    op.add_column(
+        "appointments",
+        sa.Column("reminded_24h", sa.Boolean(), server_default=sa.text("false"), nullable=False),
+    )
+    op.add_column(
+        "appointments",
+        sa.Column("reminded_1h", sa.Boolean(), server_default=sa.text("false"), nullable=False),
+    )
+    op.execute(
+        """
+        UPDATE appointments
+        SET reminded_24h = (reminded_mask & 1) <> 0,
+            reminded_1h = (reminded_mask & 2) <> 0
+        WHERE reminded_mask <> 0
+        """
+    )
+    op.drop_column("appointments", "reminded_mask")
@@ -0,0 +1,32 @@
+"""bans stored in the database
+
+Revision ID: 0014_bans
+Revises: 0013_reminder_mask
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0014_bans"
+down_revision = "0013_reminder_mask"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # без FK на users: забанить можно и того, кто ещё ни разу не писал боту
+    op.create_table(
+        "bans",
+        sa.Column("user_id", sa.BigInteger(), primary_key=True),
+        sa.Column("reason", sa.Text(), nullable=True),
+        sa.Column("banned_by", sa.BigInteger(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("bans")
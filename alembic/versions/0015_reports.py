@@ -0,0 +1,164 @@
+"""materialized report rollups
+
+Revision ID: 0015_reports
+Revises: 0014_bans
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0015_reports"
+down_revision = "0014_bans"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # день мастера: загрузка (минуты по расписанию / занятые минуты), счётчики и выручка
+    op.create_table(
+        "report_master_days",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("master_id", sa.Integer(), sa.ForeignKey("masters.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("working_minutes", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("booked_minutes", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("appointments", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("cancelled", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("unpaid", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("revenue_cents", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("refreshed_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("day", "master_id"),
+    )
+    op.create_table(
+        "report_service_days",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("master_id", sa.Integer(), sa.ForeignKey("masters.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("service_id", sa.Integer(), sa.ForeignKey("services.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("appointments", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("cancelled", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("revenue_cents", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.PrimaryKeyConstraint("day", "master_id", "service_id"),
+    )
+
+    # что пересчитать: starts_at — день записи (локальную дату считает воркер), day — конкретная дата,
+    # оба NULL — всё расписание мастера начиная с сегодня
+    op.create_table(
+        "report_dirty",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("master_id", sa.Integer(), nullable=False),
+        sa.Column("starts_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("day", sa.Date(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION report_dirty_appointment() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                INSERT INTO report_dirty (master_id, starts_at) VALUES (OLD.master_id, OLD.starts_at);
+            END IF;
+            IF TG_OP <> 'DELETE' AND (TG_OP = 'INSERT'
+                    OR NEW.master_id IS DISTINCT FROM OLD.master_id OR NEW.starts_at IS DISTINCT FROM OLD.starts_at) THEN
+                INSERT INTO report_dirty (master_id, starts_at) VALUES (NEW.master_id, NEW.starts_at);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_appointments_report_dirty
+        AFTER INSERT OR DELETE OR UPDATE OF status, starts_at, ends_at, master_id, service_id, payment_id ON appointments
+        FOR EACH ROW
+        EXECUTE FUNCTION report_dirty_appointment();
+        """
+    )
+
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION report_dirty_payment() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.status IS NOT DISTINCT FROM OLD.status AND NEW.amount_cents = OLD.amount_cents THEN
+                RETURN NULL;
+            END IF;
+            INSERT INTO report_dirty (master_id, starts_at)
+            SELECT a.master_id, a.starts_at FROM appointments a WHERE a.payment_id = NEW.id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_payments_report_dirty
+        AFTER UPDATE OF status, amount_cents ON payments
+        FOR EACH ROW
+        EXECUTE FUNCTION report_dirty_payment();
+        """
+    )
+
+    # расписание по дням недели и новый мастер — пересчёт всех дней мастера начиная с сегодня
+    # (прошлые дни остаются снимком того расписания, по которому мастер тогда работал)
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION report_dirty_schedule() RETURNS trigger AS $$
+        BEGIN
+            IF TG_TABLE_NAME = 'master_days_off' THEN
+                IF TG_OP <> 'INSERT' THEN
+                    INSERT INTO report_dirty (master_id, day) VALUES (OLD.master_id, OLD.date);
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    INSERT INTO report_dirty (master_id, day) VALUES (NEW.master_id, NEW.date);
+                END IF;
+            ELSIF TG_TABLE_NAME = 'masters' THEN
+                INSERT INTO report_dirty (master_id) VALUES (NEW.id);
+            ELSE
+                IF TG_OP <> 'INSERT' THEN
+                    INSERT INTO report_dirty (master_id) VALUES (OLD.master_id);
+                END IF;
+                IF TG_OP <> 'DELETE' AND (TG_OP = 'INSERT' OR NEW.master_id IS DISTINCT FROM OLD.master_id) THEN
+                    INSERT INTO report_dirty (master_id) VALUES (NEW.master_id);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for table in ("master_working_hours", "master_breaks", "master_days_off"):
+        op.execute(
+            f"""
+            CREATE TRIGGER trg_{table}_report_dirty
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW
+            EXECUTE FUNCTION report_dirty_schedule();
+            """
+        )
+    op.execute(
+        """
+        CREATE TRIGGER trg_masters_report_dirty
+        AFTER INSERT ON masters
+        FOR EACH ROW
+        EXECUTE FUNCTION report_dirty_schedule();
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_masters_report_dirty ON masters")
+    for table in ("master_days_off", "master_breaks", "master_working_hours"):
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_report_dirty ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS report_dirty_schedule()")
+    op.execute("DROP TRIGGER IF EXISTS trg_payments_report_dirty ON payments")
+    op.execute("DROP FUNCTION IF EXISTS report_dirty_payment()")
+    op.execute("DROP TRIGGER IF EXISTS trg_appointments_report_dirty ON appointments")
+    op.execute("DROP FUNCTION IF EXISTS report_dirty_appointment()")
+    op.execute("DELETE FROM reminder_watermarks WHERE name = 'reports'")
+    op.drop_table("report_dirty")
+    op.drop_table("report_service_days")
+    op.drop_table("report_master_days")
@@ -0,0 +1,135 @@
+"""schedule templates and per-date master schedule
+
+Revision ID: 0016_schedule_templates
+Revises: 0015_reports
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0016_schedule_templates"
+down_revision = "0015_reports"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "schedule_templates",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("name", sa.String(length=80), nullable=False, unique=True),
+        sa.Column("days", postgresql.JSONB(), nullable=False),
+        sa.Column("breaks", postgresql.JSONB(), nullable=False, server_default=sa.text("'[]'::jsonb")),
+    )
+    op.create_table(
+        "master_schedules",
+        sa.Column("master_id", sa.Integer(), sa.ForeignKey("masters.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column(
+            "template_id", sa.Integer(), sa.ForeignKey("schedule_templates.id", ondelete="CASCADE"), nullable=False
+        ),
+        sa.Column("anchor", sa.Date(), nullable=False),
+    )
+    op.create_index("ix_master_schedules_template_id", "master_schedules", ["template_id"])
+    op.create_table(
+        "schedule_holidays",
+        sa.Column("date", sa.Date(), primary_key=True),
+        sa.Column("name", sa.Text(), nullable=True),
+    )
+    op.create_table(
+        "master_day_schedule",
+        sa.Column("master_id", sa.Integer(), sa.ForeignKey("masters.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("start_time", sa.Time(), nullable=True),
+        sa.Column("end_time", sa.Time(), nullable=True),
+        sa.Column("breaks", postgresql.JSONB(), nullable=False, server_default=sa.text("'[]'::jsonb")),
+        sa.PrimaryKeyConstraint("master_id", "date"),
+    )
+
+    # правка правил удаляет затронутые строки с вчерашнего дня (запас на часовой пояс): до новой раскладки
+    # движок слотов считает эти даты по правилам напрямую, прошлые даты остаются снимком
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION schedule_invalidate() RETURNS trigger AS $$
+        BEGIN
+            IF TG_TABLE_NAME IN ('master_working_hours', 'master_breaks') THEN
+                DELETE FROM master_day_schedule s
+                WHERE s.master_id IN (OLD.master_id, NEW.master_id)
+                  AND s.date >= current_date - 1
+                  AND extract(isodow FROM s.date)::int - 1 IN (OLD.weekday, NEW.weekday);
+            ELSIF TG_TABLE_NAME = 'master_days_off' THEN
+                DELETE FROM master_day_schedule s
+                WHERE s.master_id IN (OLD.master_id, NEW.master_id) AND s.date IN (OLD.date, NEW.date);
+            ELSIF TG_TABLE_NAME = 'schedule_holidays' THEN
+                DELETE FROM master_day_schedule s WHERE s.date IN (OLD.date, NEW.date);
+            ELSIF TG_TABLE_NAME = 'master_schedules' THEN
+                DELETE FROM master_day_schedule s
+                WHERE s.master_id IN (OLD.master_id, NEW.master_id) AND s.date >= current_date - 1;
+            ELSIF TG_TABLE_NAME = 'schedule_templates' THEN
+                DELETE FROM master_day_schedule s
+                WHERE s.master_id IN (SELECT ms.master_id FROM master_schedules ms WHERE ms.template_id = NEW.id)
+                  AND s.date >= current_date - 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for table in ("master_working_hours", "master_breaks", "master_days_off", "schedule_holidays", "master_schedules"):
+        op.execute(
+            f"""
+            CREATE TRIGGER trg_{table}_schedule_invalidate
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW
+            EXECUTE FUNCTION schedule_invalidate();
+            """
+        )
+    # удаление шаблона доходит до master_schedules каскадом — там и сработает
+    op.execute(
+        """
+        CREATE TRIGGER trg_schedule_templates_schedule_invalidate
+        AFTER UPDATE ON schedule_templates
+        FOR EACH ROW
+        EXECUTE FUNCTION schedule_invalidate();
+        """
+    )
+
+    # отчёты (0015) пересчитывают дни, у которых поменялась раскладка
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION report_dirty_day_schedule() RETURNS trigger AS $$
+        BEGIN
+            -- ключ строки не меняется: достаточно одной отметки
+            INSERT INTO report_dirty (master_id, day)
+            VALUES (coalesce(NEW.master_id, OLD.master_id), coalesce(NEW.date, OLD.date));
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_master_day_schedule_report_dirty
+        AFTER INSERT OR UPDATE OR DELETE ON master_day_schedule
+        FOR EACH ROW
+        EXECUTE FUNCTION report_dirty_day_schedule();
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_master_day_schedule_report_dirty ON master_day_schedule")
+    op.execute("DROP FUNCTION IF EXISTS report_dirty_day_schedule()")
+    op.execute("DROP TRIGGER IF EXISTS trg_schedule_templates_schedule_invalidate ON schedule_templates")
+    for table in ("master_schedules", "schedule_holidays", "master_days_off", "master_breaks", "master_working_hours"):
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_schedule_invalidate ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS schedule_invalidate()")
+    op.drop_table("master_day_schedule")
+    op.drop_table("schedule_holidays")
+    op.drop_index("ix_master_schedules_template_id", table_name="master_schedules")
+    op.drop_table("master_schedules")
+    op.drop_table("schedule_templates")
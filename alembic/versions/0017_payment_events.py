@@ -0,0 +1,59 @@
+"""payment provider webhook queue
+
+Revision ID: 0017_payment_events
+Revises: 0016_schedule_templates
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0017_payment_events"
+down_revision = "0016_schedule_templates"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    provider = postgresql.ENUM(name="payment_provider", create_type=False)
+    status = postgresql.ENUM(name="payment_status", create_type=False)
+
+    # повтор уведомления провайдера не создаёт строку: ключ — платёж провайдера и новый статус
+    op.create_table(
+        "payment_events",
+        sa.Column("provider", provider, nullable=False),
+        sa.Column("external_id", sa.String(length=128), nullable=False),
+        sa.Column("status", status, nullable=False),
+        sa.Column("amount_cents", sa.Integer(), nullable=True),
+        sa.Column("payload", postgresql.JSONB(), nullable=False),
+        sa.Column("received_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("processed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("result", sa.String(length=32), nullable=True),
+        sa.PrimaryKeyConstraint("provider", "external_id", "status"),
+    )
+    op.create_index(
+        "ix_payment_events_pending",
+        "payment_events",
+        ["received_at"],
+        postgresql_where=sa.text("processed_at IS NULL"),
+    )
+
+    # платежи из записи (demo) получали только pay_url — external_id нужен, чтобы их нашёл вебхук
+    op.execute("UPDATE payments SET external_id = id::text WHERE provider = 'dummy' AND external_id IS NULL")
+    op.create_index(
+        "uq_payments_provider_external_id",
+        "payments",
+        ["provider", "external_id"],
+        unique=True,
+        postgresql_where=sa.text("external_id IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_payments_provider_external_id", table_name="payments")
+    op.drop_index("ix_payment_events_pending", table_name="payment_events")
+    op.drop_table("payment_events")
@@ -0,0 +1,33 @@
+"""reminded_mask bits pinned to reminder offsets
+
+Revision ID: 0018_reminder_bits
+Revises: 0017_payment_events
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0018_reminder_bits"
+down_revision = "0017_payment_events"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # строки заводит воркер при старте (bind_reminder_bits) по своему REMINDER_OFFSETS:
+    # на пустой таблице бит = позиция срока в списке, как в reminded_mask до этой ревизии
+    op.create_table(
+        "reminder_bits",
+        sa.Column("minutes", sa.Integer(), primary_key=True),
+        sa.Column("bit", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.UniqueConstraint("bit", name="uq_reminder_bits_bit"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("reminder_bits")
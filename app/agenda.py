@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import time
+from html import escape
+from typing import Callable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database.requests import MasterAgendaRow, get_master_agenda
+from app.events import BookingEvent
+from app.formatting import TG_MESSAGE_LIMIT, tg_len
+from app.keyboards.builders import master_agenda_kb
+from app.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+AGENDA_VIEWS = Counter("master_agenda_views_total", "Master agenda renders by source", labels=("source",))
+AGENDA_PUSHES = Counter("master_agenda_pushes_total", "Open master agendas re-rendered on booking events", labels=("result",))
+
+VIEWS = ("today", "tomorrow")
+# отрисованный день живёт в кэше столько секунд: страховка на случай потерянного NOTIFY
+PREFETCH_TTL = 10 * 60
+# открытое сообщение с записями обновляется push'ем столько секунд после последнего просмотра
+PIN_TTL = 24 * 60 * 60
+KEY_PREFIX = "agenda"
+
+
+def render_master_day(name: str, day: dt.date, rows: list[MasterAgendaRow], tz: dt.tzinfo) -> str:
+    """Один день мастера — одно сообщение: его правят на месте, поэтому хвост не влезшего дня срезается."""
+    lines = [f"🗓 <b>{escape(name)}</b>, записи на {day.strftime('%d.%m.%Y')}:"]
+    if not rows:
+        lines.append("Записей нет.")
+    for r in rows:
+        who = f"@{escape(r.username)}" if r.username else f"user_id={r.user_id}"
+        line = (
+            f"• {r.starts_at.astimezone(tz):%H:%M}–{r.ends_at.astimezone(tz):%H:%M} — "
+            f"{escape(r.service_name)} — {who}"
+        )
+        if r.status == "pending_payment":
+            line += " — ⏳ не оплачено"
+        lines.append(line)
+    shown = len(lines)
+    while tg_len("\n".join(lines[:shown])) > TG_MESSAGE_LIMIT - 32:
+        shown -= 1
+    if shown < len(lines):
+        lines = lines[:shown] + [f"… и ещё {len(lines) - shown}"]
+    return "\n".join(lines)
+
+
+class MasterAgenda:
+    """
+    Записи мастера на сегодня и завтра. Запрос за днём берёт и следующий (get_master_agenda на 2 дня):
+    «Завтра» после «Сегодня» отдаётся из кэша без запроса. Кэш — в Redis (общий для процессов-обработчиков
+    и процесса, который слушает события), без Redis — в памяти.
+
+    У кэша мастера есть поколение: событие по его записям (AgendaUpdater) увеличивает его, и всё
+    отрисованное раньше перестаёт читаться. Отрисовка помечается поколением, прочитанным до запроса
+    в БД, — так день, посчитанный до коммита новой записи, не переживёт её событие.
+    """
+
+    def __init__(
+        self,
+        tz: dt.tzinfo,
+        redis: Redis | None = None,
+        ttl: float = PREFETCH_TTL,
+        pin_ttl: float = PIN_TTL,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.tz = tz
+        self.redis = redis
+        self.ttl = ttl
+        self.pin_ttl = pin_ttl
+        # часы — общие для процессов (срок отрисовки хранится в самом значении)
+        self._clock = clock
+        # без Redis: master_id -> (истекает, поле -> значение), как у хэша в Redis
+        self._local: dict[int, tuple[float, dict[str, str]]] = {}
+
+    def today(self) -> dt.date:
+        return dt.datetime.now(tz=self.tz).date()
+
+    def day_of(self, view: str) -> dt.date:
+        return self.today() + dt.timedelta(days=VIEWS.index(view))
+
+    # ---- хранилище: хэш agenda:<master_id> с полями gen, pin и <дата> = "<gen> <истекает>\n<текст>" ----
+    def _key(self, master_id: int) -> str:
+        return f"{KEY_PREFIX}:{master_id}"
+
+    async def _fields(self, master_id: int, *names: str) -> list[str | None]:
+        if self.redis is not None:
+            values = await self.redis.hmget(self._key(master_id), names)
+            return [v.decode() if isinstance(v, bytes) else v for v in values]
+        entry = self._local.get(master_id)
+        if entry is None or entry[0] <= self._clock():
+            self._local.pop(master_id, None)
+            return [None] * len(names)
+        return [entry[1].get(n) for n in names]
+
+    async def _store(self, master_id: int, fields: dict[str, str]) -> None:
+        # хэш живёт pin_ttl с последней записи; отрисовки дней истекают раньше — по сроку в значении
+        if self.redis is not None:
+            key = self._key(master_id)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping=fields)
+                pipe.expire(key, int(self.pin_ttl))
+                await pipe.execute()
+            return
+        now = self._clock()
+        expires, values = self._local.get(master_id, (0.0, {}))
+        values = {**values, **fields} if expires > now else dict(fields)
+        self._local[master_id] = (now + self.pin_ttl, values)
+
+    async def _bump(self, master_id: int) -> None:
+        if self.redis is not None:
+            key = self._key(master_id)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hincrby(key, "gen", 1)
+                pipe.expire(key, int(self.pin_ttl))
+                await pipe.execute()
+            return
+        (gen,) = await self._fields(master_id, "gen")
+        await self._store(master_id, {"gen": str(int(gen or 0) + 1)})
+
+    # ---- просмотр ----
+    async def view(self, session: AsyncSession, master_id: int, day: dt.date) -> str | None:
+        """Текст дня мастера: из кэша или одним запросом (вместе со следующим днём). None — мастера нет."""
+        gen, cached = await self._fields(master_id, "gen", day.isoformat())
+        gen = gen or "0"
+        if cached is not None:
+            head, _, text = cached.partition("\n")
+            cached_gen, _, expires = head.partition(" ")
+            if cached_gen == gen and float(expires) > self._clock():
+                AGENDA_VIEWS.inc(source="cache")
+                return text
+
+        AGENDA_VIEWS.inc(source="db")
+        name, rows = await get_master_agenda(session, self.tz, master_id, day, days=2)
+        if name is None:
+            return None
+        texts = {
+            d.isoformat(): render_master_day(name, d, [r for r in rows if r.starts_at.astimezone(self.tz).date() == d], self.tz)
+            for d in (day, day + dt.timedelta(days=1))
+        }
+        expires = self._clock() + self.ttl
+        await self._store(master_id, {k: f"{gen} {expires:.0f}\n{v}" for k, v in texts.items()})
+        return texts[day.isoformat()]
+
+    async def pin(self, master_id: int, chat_id: int, message_id: int, view: str) -> None:
+        """Запомнить сообщение, которое мастер сейчас смотрит: его правит AgendaUpdater."""
+        await self._store(master_id, {"pin": f"{chat_id}:{message_id}:{view}"})
+
+    async def pinned(self, master_id: int) -> tuple[int, int, str] | None:
+        (value,) = await self._fields(master_id, "pin")
+        if not value:
+            return None
+        chat_id, message_id, view = value.split(":")
+        return int(chat_id), int(message_id), view
+
+    async def unpin(self, master_id: int) -> None:
+        await self._store(master_id, {"pin": ""})
+
+    async def invalidate(self, master_id: int) -> None:
+        await self._bump(master_id)
+
+
+def _affected_days(event: BookingEvent, tz: dt.tzinfo) -> set[dt.date]:
+    return {ts.astimezone(tz).date() for ts in (event.starts_at, event.old_starts_at) if ts is not None}
+
+
+class AgendaUpdater:
+    """
+    Подписчик BookingEventListener: событие по записи мастера сбрасывает его кэш, а если у мастера
+    открыты записи на затронутый день — перерисовывает это сообщение (один запрос, как при просмотре).
+    Уведомление о самом событии шлёт MasterNotifier; здесь только обновляется открытый список.
+    """
+
+    def __init__(self, bot: Bot, sessionmaker: async_sessionmaker, agenda: MasterAgenda, redis: Redis | None = None) -> None:
+        self.bot = bot
+        self.sessionmaker = sessionmaker
+        self.agenda = agenda
+        # NOTIFY получает каждая реплика бота — перерисует только одна
+        self.redis = redis
+
+    async def _claim(self, event: BookingEvent) -> bool:
+        if self.redis is None:
+            return True
+        key = f"notify:agenda:{event.id}:{event.status}:{event.starts_at.isoformat() if event.starts_at else '-'}"
+        return bool(await self.redis.set(key, "1", nx=True, ex=24 * 3600))
+
+    async def __call__(self, event: BookingEvent) -> None:
+        if event.table != "appointments" or event.master_id is None:
+            return
+        await self.agenda.invalidate(event.master_id)
+
+        pin = await self.agenda.pinned(event.master_id)
+        if pin is None:
+            return
+        chat_id, message_id, view = pin
+        day = self.agenda.day_of(view)
+        if day not in _affected_days(event, self.agenda.tz) or not await self._claim(event):
+            return
+
+        async with self.sessionmaker() as session:
+            text = await self.agenda.view(session, event.master_id, day)
+        if text is None:
+            return
+        try:
+            await self.bot.edit_message_text(
+                text=text, chat_id=chat_id, message_id=message_id, reply_markup=master_agenda_kb(view)
+            )
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e).lower():
+                AGENDA_PUSHES.inc(result="unchanged")
+                return
+            # сообщение удалено или слишком старое для правки — больше не обновляем
+            AGENDA_PUSHES.inc(result="gone")
+            logger.info("Master %s agenda message is gone: %s", event.master_id, e)
+            await self.agenda.unpin(event.master_id)
+            return
+        AGENDA_PUSHES.inc(result="edited")
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.database.requests import list_banned_ids
+from app.metrics import Counter, Gauge
+from app.pubsub import listen
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "bans"
+
+BANNED_USERS = Gauge("banned_users", "Banned users known to this process")
+BAN_MESSAGES = Counter("ban_messages_total", "Ban list changes received via Redis pub/sub", labels=("action",))
+
+
+class BanList:
+    """
+    Множество заблокированных в памяти процесса: проверка на каждом апдейте — O(1) без запросов.
+
+    Источник правды — таблица bans (плюс статичный BANNED_IDS). Админ-команда меняет БД, затем
+    announce() правит локальное множество и рассылает изменение остальным процессам через Redis pub/sub.
+    После каждой (пере)подписки список перечитывается из БД (см. app/pubsub.py).
+    """
+
+    def __init__(
+        self,
+        sessionmaker: async_sessionmaker,
+        redis: Redis | None = None,
+        static: frozenset[int] | set[int] = frozenset(),
+        channel: str = CHANNEL,
+    ) -> None:
+        self.sessionmaker = sessionmaker
+        self.redis = redis
+        self.static = frozenset(static)
+        self.channel = channel
+        self._ids: set[int] = set(self.static)
+        # изменения, пришедшие, пока reload() читает БД: их снимок БД мог ещё не увидеть
+        self._during_reload: list[list[tuple[str, int]]] = []
+        self._task: asyncio.Task | None = None
+
+    def __contains__(self, user_id: object) -> bool:
+        return user_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(sorted(self._ids))
+
+    def _set(self, ids: set[int]) -> None:
+        self._ids = ids
+        BANNED_USERS.set(len(ids))
+
+    def _change(self, ids: set[int], action: str, user_id: int) -> None:
+        if action == "ban":
+            ids.add(user_id)
+        elif action == "unban" and user_id not in self.static:
+            ids.discard(user_id)
+
+    def _apply(self, action: str, user_id: int) -> None:
+        self._change(self._ids, action, user_id)
+        for changes in self._during_reload:
+            changes.append((action, user_id))
+        BANNED_USERS.set(len(self._ids))
+
+    async def reload(self) -> None:
+        changes: list[tuple[str, int]] = []
+        self._during_reload.append(changes)
+        try:
+            async with self.sessionmaker() as session:
+                ids = await list_banned_ids(session) | self.static
+        finally:
+            self._during_reload.remove(changes)
+        # изменения публикуются после commit: повтор поверх снимка не хуже, а бан, опоздавший к снимку, не теряется
+        for action, user_id in changes:
+            self._change(ids, action, user_id)
+        self._set(ids)
+        logger.info("Ban list loaded: %d users", len(self._ids))
+
+    async def announce(self, action: str, user_id: int) -> None:
+        """Вызывать после commit: "ban" | "unban"."""
+        self._apply(action, user_id)
+        if self.redis is not None:
+            await self.redis.publish(self.channel, f"{action}:{user_id}")
+
+    def _on_message(self, data: str) -> None:
+        action, _, raw_id = data.partition(":")
+        try:
+            user_id = int(raw_id)
+        except ValueError:
+            logger.warning("Bad ban message %r", data)
+            return
+        BAN_MESSAGES.inc(action=action)
+        self._apply(action, user_id)
+
+    async def start(self) -> None:
+        """Хук dp.startup: загрузить список и (если есть Redis) слушать изменения от других процессов."""
+        # первая загрузка — до приёма апдейтов; дальше список перечитывается после каждой подписки
+        await self.reload()
+        if self.redis is not None:
+            self._task = asyncio.create_task(listen(self.redis, self.channel, self._on_message, self.reload))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.enums import ParseMode
+from aiogram.fsm.storage.memory import MemoryStorage, SimpleEventIsolation
+from aiogram.fsm.storage.redis import RedisStorage
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.agenda import MasterAgenda
+from app.bans import BanList
+from app.config import Config
+from app.handlers.admin import router as admin_router
+from app.handlers.master import router as master_router
+from app.handlers.user import BookingStates, router as user_router
+from app.middlewares.ban import BanMiddleware
+from app.middlewares.clicks import ClickCoalescingMiddleware
+from app.middlewares.db import DbSessionMiddleware, HandlerTagMiddleware
+from app.middlewares.fsm import BufferedFSMMiddleware
+from app.middlewares.roles import RoleMiddleware
+from app.middlewares.throttling import MemoryThrottleStore, RedisThrottleStore, ThrottlingMiddleware
+from app.outbound import OutboundQueue
+from app.ratelimit import TelegramRateLimiter
+from app.roles import RoleCache
+
+
+def create_bot(config: Config, redis: Redis | None = None) -> Bot:
+    """
+    Bot с общей очередью исходящих вызовов; TELEGRAM_API_URL — свой Bot API сервер (или fake_telegram).
+    С redis глобальный лимит Telegram (30 сообщений/сек на бота) делят все процессы, которые шлют от его имени.
+    """
+    session = None
+    if config.telegram_api_url:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.telegram_api_url))
+    bot = Bot(
+        token=config.bot_token,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+    # все answer/edit_text/send_message идут через общую очередь с лимитами Telegram
+    bot.session.middleware(OutboundQueue(TelegramRateLimiter(redis=redis)))
+    return bot
+
+
+def create_dispatcher(config: Config, sessionmaker: async_sessionmaker) -> Dispatcher:
+    """Dispatcher с middlewares и роутерами. Роутеры — модульные, поэтому один Dispatcher на процесс."""
+    storage = RedisStorage.from_url(config.redis_url) if config.redis_url else MemoryStorage()
+    # апдейты одного ключа FSM идут по очереди (чтение -> хендлер -> запись): иначе второе нажатие
+    # читает состояние до записи первого. С Redis замок общий для процессов
+    isolation = storage.create_isolation() if isinstance(storage, RedisStorage) else SimpleEventIsolation()
+    # встроенный FSM middleware заменён буферизованным: одно чтение и не больше одной записи на апдейт
+    dp = Dispatcher(storage=storage, events_isolation=isolation, disable_fsm=True)
+    # дубли нажатий отсекаются до замка и чтения FSM: ждущее нажатие читает состояние после записи предыдущего
+    dp.update.outer_middleware(ClickCoalescingMiddleware())
+    dp.update.outer_middleware(BufferedFSMMiddleware(
+        dp.fsm.storage,
+        dp.fsm.events_isolation,
+        ttls={BookingStates.__full_group_name__: config.fsm_booking_ttl},
+    ))
+
+    redis = storage.redis if isinstance(storage, RedisStorage) else None
+    bans = BanList(sessionmaker, redis=redis, static=config.banned_ids)
+    roles = RoleCache(sessionmaker, redis=redis, admin_ids=config.admin_ids, ttl=config.role_cache_ttl)
+    dp["bans"], dp["roles"] = bans, roles
+    # записи мастера: кэш и открытые сообщения — в Redis, их же обновляет AgendaUpdater в процессе событий
+    dp["agenda"] = MasterAgenda(config.tz, redis=redis)
+    for hooks in (bans, roles):
+        dp.startup.register(hooks.start)
+        dp.shutdown.register(hooks.stop)
+    # бан и лимит частоты отсекаются до того, как DbSessionMiddleware откроет сессию;
+    # дубли нажатий отсечены ещё раньше, чтобы не тратить токены пользователя
+    dp.update.middleware(BanMiddleware(bans))
+    if config.throttle_backend != "off":
+        store = RedisThrottleStore(redis) if config.throttle_backend == "redis" else MemoryThrottleStore()
+        dp.update.middleware(ThrottlingMiddleware(store, exempt=config.admin_ids))
+    # роль — из кэша; промах идёт своей сессией, не через сессию хендлера
+    dp.update.middleware(RoleMiddleware(roles))
+    dp.update.middleware(DbSessionMiddleware(
+        sessionmaker,
+        max_statements=config.sql_max_statements,
+        slow_ms=config.sql_slow_ms,
+        strict_budgets=config.sql_strict_budgets,
+    ))
+    # inner middlewares: к этому моменту известен хендлер -> подписываем SQL-статистику
+    dp.message.middleware(HandlerTagMiddleware())
+    dp.callback_query.middleware(HandlerTagMiddleware())
+
+    dp.include_router(user_router)
+    # до admin: кнопку «Записи сегодня» у мастера обрабатывает его собственный вид
+    dp.include_router(master_router)
+    dp.include_router(admin_router)
+    return dp
@@ -4,6 +4,8 @@ import os
 from dataclasses import dataclass
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
+from app.reminders import DEFAULT_REMINDER_OFFSETS, ReminderKind, parse_reminder_offsets
+
 
 def _csv_ints(value: str) -> set[int]:
     value = (value or "").strip()
@@ -30,6 +32,30 @@ class Config:
     slot_minutes: int
 
     redis_url: str | None
+    fsm_booking_ttl: int = 1800
+    throttle_backend: str = "memory"
+    role_cache_ttl: float = 60.0
+
+    sql_max_statements: int = 10
+    sql_slow_ms: int = 200
+    sql_strict_budgets: bool = False
+    metrics_port: int | None = None
+
+    reminders_concurrency: int = 10
+    reminder_shards: int = 8
+    reminder_offsets: tuple[ReminderKind, ...] = parse_reminder_offsets(DEFAULT_REMINDER_OFFSETS)
+
+    bot_mode: str = "polling"
+    webhook_url: str | None = None
+    webhook_secret: str | None = None
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    webhook_workers: int = 2
+    telegram_api_url: str | None = None
+
+    payment_webhook_secret: str | None = None
+    payment_webhook_port: int = 8090
+    payment_dummy_url: str | None = None
 
 
 def load_config() -> Config:
@@ -70,6 +96,54 @@ def load_config() -> Config:
         raise RuntimeError("SLOT_MINUTES must be positive and divide 1440")
 
     redis_url = os.getenv("REDIS_URL", "").strip() or None
+    fsm_booking_ttl = int(os.getenv("FSM_BOOKING_TTL", "1800"))
+    if fsm_booking_ttl < 0:
+        raise RuntimeError("FSM_BOOKING_TTL must be >= 0 (0 disables expiry)")
+    throttle_backend = os.getenv("THROTTLE_BACKEND", "memory").strip().lower()
+    if throttle_backend not in ("memory", "redis", "off"):
+        raise RuntimeError("THROTTLE_BACKEND must be 'memory', 'redis' or 'off'")
+    if throttle_backend == "redis" and not redis_url:
+        raise RuntimeError("THROTTLE_BACKEND=redis requires REDIS_URL")
+    role_cache_ttl = float(os.getenv("ROLE_CACHE_TTL", "60"))
+    if role_cache_ttl < 0:
+        raise RuntimeError("ROLE_CACHE_TTL must be >= 0")
+
+    sql_max_statements = int(os.getenv("SQL_MAX_STATEMENTS", "10"))
+    sql_slow_ms = int(os.getenv("SQL_SLOW_MS", "200"))
+    sql_strict_budgets = os.getenv("SQL_STRICT_BUDGETS", "").strip().lower() in ("1", "true", "yes")
+    metrics_port = int(os.getenv("METRICS_PORT", "0")) or None
+
+    reminders_concurrency = int(os.getenv("REMINDERS_CONCURRENCY", "10"))
+    if reminders_concurrency <= 0:
+        raise RuntimeError("REMINDERS_CONCURRENCY must be positive")
+    reminder_shards = int(os.getenv("REMINDER_SHARDS", "8"))
+    if reminder_shards <= 0:
+        raise RuntimeError("REMINDER_SHARDS must be positive")
+    try:
+        reminder_offsets = parse_reminder_offsets(os.getenv("REMINDER_OFFSETS", DEFAULT_REMINDER_OFFSETS))
+    except ValueError as e:
+        raise RuntimeError(f"REMINDER_OFFSETS: {e}") from e
+
+    bot_mode = os.getenv("BOT_MODE", "polling").strip().lower()
+    if bot_mode not in ("polling", "webhook"):
+        raise RuntimeError("BOT_MODE must be 'polling' or 'webhook'")
+    webhook_url = os.getenv("WEBHOOK_URL", "").strip() or None
+    webhook_secret = os.getenv("WEBHOOK_SECRET", "").strip() or None
+    webhook_host = os.getenv("WEBHOOK_HOST", "0.0.0.0").strip()
+    webhook_port = int(os.getenv("WEBHOOK_PORT", "8080"))
+    webhook_workers = int(os.getenv("WEBHOOK_WORKERS", "2"))
+    if bot_mode == "webhook":
+        if not webhook_secret:
+            raise RuntimeError("WEBHOOK_SECRET is required for BOT_MODE=webhook")
+        if not redis_url:
+            raise RuntimeError("REDIS_URL is required for BOT_MODE=webhook (update queues and FSM storage)")
+        if webhook_workers <= 0:
+            raise RuntimeError("WEBHOOK_WORKERS must be positive")
+    telegram_api_url = os.getenv("TELEGRAM_API_URL", "").strip().rstrip("/") or None
+
+    payment_webhook_secret = os.getenv("PAYMENT_WEBHOOK_SECRET", "").strip() or None
+    payment_webhook_port = int(os.getenv("PAYMENT_WEBHOOK_PORT", "8090"))
+    payment_dummy_url = os.getenv("PAYMENT_DUMMY_URL", "").strip().rstrip("/") or None
 
     return Config(
         bot_token=bot_token,
@@ -81,4 +155,24 @@ def load_config() -> Config:
         work_end_hour=work_end_hour,
         slot_minutes=slot_minutes,
         redis_url=redis_url,
+        fsm_booking_ttl=fsm_booking_ttl,
+        throttle_backend=throttle_backend,
+        role_cache_ttl=role_cache_ttl,
+        sql_max_statements=sql_max_statements,
+        sql_slow_ms=sql_slow_ms,
+        sql_strict_budgets=sql_strict_budgets,
+        metrics_port=metrics_port,
+        reminders_concurrency=reminders_concurrency,
+        reminder_shards=reminder_shards,
+        reminder_offsets=reminder_offsets,
+        bot_mode=bot_mode,
+        webhook_url=webhook_url,
+        webhook_secret=webhook_secret,
+        webhook_host=webhook_host,
+        webhook_port=webhook_port,
+        webhook_workers=webhook_workers,
+        telegram_api_url=telegram_api_url,
+        payment_webhook_secret=payment_webhook_secret,
+        payment_webhook_port=payment_webhook_port,
+        payment_dummy_url=payment_dummy_url,
     )
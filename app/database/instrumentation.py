@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Сколько SQL-запросов допускается на один апдейт конкретного хендлера.
+# Используется в тестах (assert_query_budget) и в strict-режиме middleware.
+QUERY_BUDGETS: dict[str, int] = {
+    "my_appointments": 4,   # select + 3 selectinload
+    "my_appointments_page": 4,
+    "choose_date": 3,       # service + busy + master_day_schedule (без разложенной даты — +5 на правила)
+    "month_report": 3,      # только rollup'ы: по мастерам, по услугам, по дням
+    "month_report_nav": 3,
+    "master_agenda": 1,     # день и следующий одним запросом; следующий потом — из кэша, без запросов
+    "master_agenda_nav": 1,
+}
+
+SQL_STATEMENTS = Counter("bot_sql_statements_total", "SQL statements executed", labels=("handler",))
+SQL_UPDATE_STATEMENTS = Histogram(
+    "bot_sql_statements_per_update",
+    "SQL statements per update",
+    labels=("handler",),
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34),
+)
+SQL_UPDATE_SECONDS = Histogram("bot_sql_seconds_per_update", "Total DB time per update", labels=("handler",))
+SQL_BUDGET_EXCEEDED = Counter(
+    "bot_sql_budget_exceeded_total", "Updates over their query budget or thresholds", labels=("handler",)
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@dataclass
+class QueryStats:
+    handler: str | None = None
+    statements: int = 0
+    total_time: float = 0.0
+    slowest_time: float = 0.0
+    slowest_statement: str | None = None
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.statements += 1
+        self.total_time += elapsed
+        if elapsed >= self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_statement = statement
+
+
+_current_stats: contextvars.ContextVar[QueryStats | None] = contextvars.ContextVar("query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = conn.info["query_start"].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def instrument_engine(engine: Engine | AsyncEngine) -> None:
+    """Повесить хуки подсчёта запросов на engine (идемпотентно)."""
+    sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def track_queries(handler: str | None = None) -> Iterator[QueryStats]:
+    """Собирать статистику по всем запросам внутри блока (в рамках текущего контекста)."""
+    stats = QueryStats(handler=handler)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def current_query_stats() -> QueryStats | None:
+    return _current_stats.get()
+
+
+def assert_query_budget(stats: QueryStats, budget: int | None = None) -> None:
+    """Упасть, если хендлер сделал больше запросов, чем ему положено."""
+    if budget is None:
+        budget = QUERY_BUDGETS.get(stats.handler or "")
+    if budget is None:
+        return
+    if stats.statements > budget:
+        raise QueryBudgetExceeded(
+            f"{stats.handler or '<unknown>'}: {stats.statements} SQL statements, budget is {budget} "
+            f"(slowest: {stats.slowest_statement!r})"
+        )
+
+
+def report_query_stats(stats: QueryStats, max_statements: int, slow_ms: int) -> None:
+    """Отдать статистику в метрики и залогировать апдейты, вышедшие за пороги."""
+    handler = stats.handler or "unknown"
+    SQL_STATEMENTS.inc(stats.statements, handler=handler)
+    SQL_UPDATE_STATEMENTS.observe(stats.statements, handler=handler)
+    SQL_UPDATE_SECONDS.observe(stats.total_time, handler=handler)
+
+    budget = QUERY_BUDGETS.get(handler, max_statements)
+    total_ms = stats.total_time * 1000
+    if stats.statements > budget or total_ms > slow_ms:
+        SQL_BUDGET_EXCEEDED.inc(handler=handler)
+        logger.warning(
+            "SQL over threshold in %s: %d statements (budget %d), %.1f ms total, slowest %.1f ms: %s",
+            handler,
+            stats.statements,
+            budget,
+            total_ms,
+            stats.slowest_time * 1000,
+            (stats.slowest_statement or "")[:200],
+        )
@@ -3,8 +3,8 @@ from __future__ import annotations
 import datetime as dt
 
 from sqlalchemy import (
-    BigInteger, Date, DateTime, ForeignKey, Integer, String, Text, Time,
-    func
+    BigInteger, Date, DateTime, ForeignKey, Index, Integer, String, Text, Time,
+    UniqueConstraint, func, text
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import ENUM, JSONB
@@ -31,6 +31,12 @@ payment_status_enum = ENUM(
     create_type=True,
 )
 
+outbox_status_enum = ENUM(
+    "pending", "sent", "failed",
+    name="outbox_status",
+    create_type=True,
+)
+
 payment_provider_enum = ENUM(
     "dummy", "yookassa", "stripe",
     name="payment_provider",
@@ -85,6 +91,7 @@ class Service(Base):
 # ---- Schedule tables (пункт 2) ----
 class MasterWorkingHours(Base):
     __tablename__ = "master_working_hours"
+    __table_args__ = (UniqueConstraint("master_id", "weekday", name="uq_master_working_hours_master_weekday"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     master_id: Mapped[int] = mapped_column(Integer, ForeignKey("masters.id", ondelete="CASCADE"), nullable=False)
@@ -111,6 +118,7 @@ class MasterBreak(Base):
 
 class MasterDayOff(Base):
     __tablename__ = "master_days_off"
+    __table_args__ = (UniqueConstraint("master_id", "date", name="uq_master_days_off_master_date"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     master_id: Mapped[int] = mapped_column(Integer, ForeignKey("masters.id", ondelete="CASCADE"), nullable=False)
@@ -121,9 +129,64 @@ class MasterDayOff(Base):
     master: Mapped["Master"] = relationship(back_populates="days_off")
 
 
+class ScheduleTemplate(Base):
+    """
+    Повторяющийся график: цикл из len(days) дней от даты-якоря мастера. Элемент days — ["10:00", "20:00"]
+    или null (выходной): 2/2 — четыре дня, «через субботу» — четырнадцать. breaks — перерывы каждого рабочего дня.
+    """
+    __tablename__ = "schedule_templates"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(80), unique=True, nullable=False)
+    days: Mapped[list] = mapped_column(JSONB, nullable=False)
+    breaks: Mapped[list] = mapped_column(JSONB, nullable=False, server_default=text("'[]'::jsonb"))
+
+
+class MasterSchedule(Base):
+    """Мастер работает по шаблону; без строки — по master_working_hours/master_breaks (или fallback из .env)."""
+    __tablename__ = "master_schedules"
+
+    master_id: Mapped[int] = mapped_column(Integer, ForeignKey("masters.id", ondelete="CASCADE"), primary_key=True)
+    template_id: Mapped[int] = mapped_column(Integer, ForeignKey("schedule_templates.id", ondelete="CASCADE"), nullable=False)
+    anchor: Mapped[dt.date] = mapped_column(Date, nullable=False)  # первый день цикла
+
+
+class ScheduleHoliday(Base):
+    """Праздник: салон закрыт, выходной у всех мастеров."""
+    __tablename__ = "schedule_holidays"
+
+    date: Mapped[dt.date] = mapped_column(Date, primary_key=True)
+    name: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+
+class MasterDaySchedule(Base):
+    """
+    Расписание мастера на конкретную дату — всё, что нужно движку слотов, одной строкой.
+    Раскладывает app.workers.reports на горизонт вперёд; start_time IS NULL — выходной.
+    Правки правил (часы, перерывы, выходные, праздники, шаблоны) триггерами удаляют затронутые будущие строки.
+    """
+    __tablename__ = "master_day_schedule"
+
+    master_id: Mapped[int] = mapped_column(Integer, ForeignKey("masters.id", ondelete="CASCADE"), primary_key=True)
+    date: Mapped[dt.date] = mapped_column(Date, primary_key=True)
+    start_time: Mapped[dt.time | None] = mapped_column(Time, nullable=True)
+    end_time: Mapped[dt.time | None] = mapped_column(Time, nullable=True)
+    breaks: Mapped[list] = mapped_column(JSONB, nullable=False, server_default=text("'[]'::jsonb"))  # [["14:00", "15:00"]]
+
+
 # ---- Payments (пункт 5) ----
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        # по нему вебхук провайдера находит платёж
+        Index(
+            "uq_payments_provider_external_id",
+            "provider",
+            "external_id",
+            unique=True,
+            postgresql_where=text("external_id IS NOT NULL"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     provider: Mapped[str] = mapped_column(payment_provider_enum, nullable=False, server_default="dummy")
@@ -139,6 +202,27 @@ class Payment(Base):
     paid_at: Mapped[dt.datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
 
+class PaymentEvent(Base):
+    """
+    Уведомление провайдера (вебхук) в очереди на применение. Ключ — (provider, external_id, status):
+    повтор того же уведомления не создаёт строку, применённые строки хранятся — повтор после применения тоже no-op.
+    """
+    __tablename__ = "payment_events"
+    __table_args__ = (
+        Index("ix_payment_events_pending", "received_at", postgresql_where=text("processed_at IS NULL")),
+    )
+
+    provider: Mapped[str] = mapped_column(payment_provider_enum, primary_key=True)
+    external_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    status: Mapped[str] = mapped_column(payment_status_enum, primary_key=True)   # paid / failed / cancelled / refunded
+    amount_cents: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
+
+    received_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    processed_at: Mapped[dt.datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    result: Mapped[str | None] = mapped_column(String(32), nullable=True)
+
+
 # ---- Audit (пункт 1) ----
 class AuditLog(Base):
     __tablename__ = "audit_log"
@@ -160,6 +244,102 @@ class AuditLog(Base):
     )
 
 
+class Ban(Base):
+    """Заблокированный пользователь (Telegram ID). Процессы бота держат копию в памяти, см. app/bans.py."""
+    __tablename__ = "bans"
+
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    reason: Mapped[str | None] = mapped_column(Text, nullable=True)
+    banned_by: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+# ---- Reports ----
+class ReportMasterDay(Base):
+    """Дневной итог мастера. Пересчитывает app.workers.reports по report_dirty; отчёты читают только rollup'ы."""
+    __tablename__ = "report_master_days"
+
+    day: Mapped[dt.date] = mapped_column(Date, primary_key=True)  # локальная дата (TIMEZONE)
+    master_id: Mapped[int] = mapped_column(Integer, ForeignKey("masters.id", ondelete="CASCADE"), primary_key=True)
+
+    working_minutes: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")  # по расписанию
+    booked_minutes: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")   # неотменённые записи
+    appointments: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")     # неотменённые
+    cancelled: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    unpaid: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")           # так и не оплачены
+    revenue_cents: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0")
+
+    refreshed_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class ReportServiceDay(Base):
+    __tablename__ = "report_service_days"
+
+    day: Mapped[dt.date] = mapped_column(Date, primary_key=True)
+    master_id: Mapped[int] = mapped_column(Integer, ForeignKey("masters.id", ondelete="CASCADE"), primary_key=True)
+    service_id: Mapped[int] = mapped_column(Integer, ForeignKey("services.id", ondelete="CASCADE"), primary_key=True)
+
+    appointments: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    cancelled: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    revenue_cents: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0")
+
+
+class ReportDirty(Base):
+    """Что пересчитать в rollup'ах; пишут триггеры (миграция 0015). Оба поля NULL — все дни мастера с сегодня."""
+    __tablename__ = "report_dirty"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    master_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    starts_at: Mapped[dt.datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    day: Mapped[dt.date | None] = mapped_column(Date, nullable=True)
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+# ---- Reminders ----
+class ReminderWatermark(Base):
+    __tablename__ = "reminder_watermarks"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)   # e.g. "worker"
+    value: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), nullable=False)  # до какого момента всё обработано
+    updated_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class ReminderBit(Base):
+    """Бит appointments.reminded_mask, закреплённый за сроком напоминания; строки не удаляются, биты не переиспользуются."""
+    __tablename__ = "reminder_bits"
+
+    minutes: Mapped[int] = mapped_column(Integer, primary_key=True)   # срок до начала записи, 24h -> 1440
+    bit: Mapped[int] = mapped_column(Integer, nullable=False, unique=True)
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class ReminderOutbox(Base):
+    """Напоминание, которое нужно отправить. Заполняется тиком в той же транзакции, что и биты reminded_mask."""
+    __tablename__ = "reminder_outbox"
+    __table_args__ = (
+        UniqueConstraint("appointment_id", "kind", name="uq_reminder_outbox_appointment_kind"),
+        Index(
+            "ix_reminder_outbox_pending",
+            "next_attempt_at",
+            postgresql_where=text("status = 'pending'"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    appointment_id: Mapped[int] = mapped_column(Integer, ForeignKey("appointments.id", ondelete="CASCADE"), nullable=False)
+    kind: Mapped[str] = mapped_column(String(16), nullable=False)       # "24h" / "1h"
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)       # starts_at, master_name, service_name
+
+    status: Mapped[str] = mapped_column(outbox_status_enum, nullable=False, server_default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    next_attempt_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    sent_at: Mapped[dt.datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
 class Appointment(Base):
     __tablename__ = "appointments"
 
@@ -176,8 +356,8 @@ class Appointment(Base):
 
     payment_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("payments.id", ondelete="SET NULL"), nullable=True)  # NEW
 
-    reminded_24h: Mapped[bool] = mapped_column(default=False, server_default="false", nullable=False)
-    reminded_1h: Mapped[bool] = mapped_column(default=False, server_default="false", nullable=False)
+    # бит на каждый срок из REMINDER_OFFSETS (см. app.reminders.ReminderKind.bit): напоминание уже поставлено в outbox
+    reminded_mask: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
     created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
@@ -2,18 +2,29 @@ from __future__ import annotations
 
 import datetime as dt
 from dataclasses import dataclass
+from typing import AsyncIterator, Sequence
 
-from sqlalchemy import and_, select, update
+from sqlalchemy import (
+    Date, DateTime, Integer, Interval, Numeric, Row, String, and_, bindparam, column, literal, literal_column, or_,
+    select, true, tuple_, update, values
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
+from sqlalchemy.sql.expression import Values
 
-from sqlalchemy import delete
+from sqlalchemy import delete, func, text
 from app.database.models import (
-    AuditLog, MasterWorkingHours, MasterBreak, MasterDayOff, Payment
+    AuditLog, Ban, MasterDaySchedule, MasterSchedule, MasterWorkingHours, MasterBreak, MasterDayOff, Payment,
+    PaymentEvent, ReminderBit, ReminderOutbox, ReminderWatermark, ReportDirty, ReportMasterDay, ReportServiceDay, ScheduleHoliday,
+    ScheduleTemplate,
 )
 
 from app.database.models import Appointment, Master, Service, User
+from app.importer import ImportPlan
+from app.payments.base import PaymentNotice
+from app.reminders import ReminderKind, assign_reminder_bits, superseded_cutoff
 
 
 @dataclass(frozen=True)
@@ -194,8 +205,7 @@ async def create_appointment_acid(
                 starts_at=starts_at,
                 ends_at=ends_at,
                 status="active",
-                reminded_24h=False,
-                reminded_1h=False,
+                reminded_mask=0,
             )
             session.add(appt)
         return appt
@@ -205,30 +215,72 @@ async def create_appointment_acid(
         return None
 
 
-async def get_future_appointments(session: AsyncSession, user_id: int, now: dt.datetime) -> list[Appointment]:
-    res = await session.execute(
+async def get_future_appointments(
+    session: AsyncSession,
+    user_id: int,
+    now: dt.datetime,
+    after: tuple[dt.datetime, int] | None = None,
+    before: tuple[dt.datetime, int] | None = None,
+    limit: int | None = None,
+) -> list[Appointment]:
+    """
+    Будущие записи пользователя по (starts_at, id). Keyset-пагинация: after — следующая страница
+    после этой записи, before — предыдущая страница до неё. Результат всегда по возрастанию.
+    """
+    conditions = [
+        Appointment.user_id == user_id,
+        Appointment.status.in_(["active", "pending_payment"]),
+        Appointment.starts_at > now,
+    ]
+    key = tuple_(Appointment.starts_at, Appointment.id)
+    if after is not None:
+        conditions.append(key > tuple_(*after))
+    if before is not None:
+        conditions.append(key < tuple_(*before))
+
+    # страницу "назад" берём с конца и разворачиваем
+    backwards = before is not None and after is None
+    order = (Appointment.starts_at.desc(), Appointment.id.desc()) if backwards else (
+        Appointment.starts_at.asc(), Appointment.id.asc()
+    )
+    stmt = (
         select(Appointment)
         .options(
             selectinload(Appointment.master),
             selectinload(Appointment.service),
             selectinload(Appointment.payment),  # чтобы при pending показать pay_url
         )
-        .where(
-            and_(
-                Appointment.user_id == user_id,
-                Appointment.status.in_(["active", "pending_payment"]),
-                Appointment.starts_at > now,
-            )
-        )
-        .order_by(Appointment.starts_at.asc())
+        .where(and_(*conditions))
+        .order_by(*order)
     )
-    return list(res.scalars().all())
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    res = await session.execute(stmt)
+    items = list(res.scalars().all())
+    return items[::-1] if backwards else items
 
 
 
 async def cancel_appointment(session: AsyncSession, user_id: int, appointment_id: int) -> bool:
     tx = session.begin_nested() if session.in_transaction() else session.begin()
     async with tx:
+        # блокировки — как в apply_payment_events: сначала платёж, потом запись
+        pay_id = (
+            await session.execute(
+                select(Appointment.payment_id).where(and_(Appointment.id == appointment_id, Appointment.user_id == user_id))
+            )
+        ).scalar_one_or_none()
+        p = None
+        if pay_id:
+            p = (
+                await session.execute(
+                    select(Payment)
+                    .where(Payment.id == pay_id)
+                    .with_for_update()
+                    .execution_options(populate_existing=True)
+                )
+            ).scalars().first()
+
         res = await session.execute(
             update(Appointment)
             .where(and_(
@@ -237,16 +289,13 @@ async def cancel_appointment(session: AsyncSession, user_id: int, appointment_id
                 Appointment.status.in_(["active", "pending_payment"]),
             ))
             .values(status="cancelled")
-            .returning(Appointment.id, Appointment.payment_id)
+            .returning(Appointment.id)
         )
-        row = res.first()
-        if not row:
+        if not res.first():
             return False
-        _, pay_id = row
-        if pay_id:
-            p = await session.get(Payment, pay_id)
-            if p and p.status == "pending":
-                p.status = "cancelled"
+        # вебхук мог успеть перевести платёж: он уже под замком, читаем свежий статус
+        if p and p.status == "pending":
+            p.status = "cancelled"
         return True
 
 async def cancel_payment_and_cancel_appointment(
@@ -256,7 +305,15 @@ async def cancel_payment_and_cancel_appointment(
 ) -> bool:
     tx = session.begin_nested() if session.in_transaction() else session.begin()
     async with tx:
-        p = await session.get(Payment, payment_id)
+        # ЛОЧИМ платёж, потом запись — как apply_payment_events, иначе оплата из вебхука затирается отменой
+        p = (
+            await session.execute(
+                select(Payment)
+                .where(Payment.id == payment_id)
+                .with_for_update()
+                .execution_options(populate_existing=True)
+            )
+        ).scalars().first()
         if not p or p.status != "pending":
             return False
 
@@ -267,7 +324,10 @@ async def cancel_payment_and_cancel_appointment(
                     Appointment.user_id == user_id,
                     Appointment.status == "pending_payment",
                 )
-            ).limit(1)
+            )
+            .with_for_update()
+            .execution_options(populate_existing=True)
+            .limit(1)
         )
         appt = res.scalars().first()
         if not appt:
@@ -278,8 +338,8 @@ async def cancel_payment_and_cancel_appointment(
         return True
 
 
-async def get_today_appointments(session: AsyncSession, tz: dt.tzinfo, today: dt.date) -> list[Appointment]:
-    day_start, day_end = _day_bounds(today, tz)
+async def get_appointment_card(session: AsyncSession, appointment_id: int) -> Appointment | None:
+    """Запись со всем, что нужно для карточки/уведомления (мастер, услуга, клиент)."""
     res = await session.execute(
         select(Appointment)
         .options(
@@ -287,18 +347,127 @@ async def get_today_appointments(session: AsyncSession, tz: dt.tzinfo, today: dt
             selectinload(Appointment.service),
             selectinload(Appointment.user),
         )
-        .where(
-            and_(
-                Appointment.status == "active",
-                Appointment.starts_at >= day_start,
-                Appointment.starts_at < day_end,
-            )
+        .where(Appointment.id == appointment_id)
+    )
+    return res.scalars().first()
+
+
+@dataclass(frozen=True)
+class AgendaRow:
+    id: int
+    starts_at: dt.datetime
+    master_name: str | None
+    service_name: str
+    user_id: int
+    username: str | None
+
+
+async def get_day_agenda(
+    session: AsyncSession,
+    tz: dt.tzinfo,
+    day: dt.date,
+    master_id: int | None = None,
+    after: tuple[dt.datetime, int] | None = None,
+    limit: int = 50,
+) -> list[AgendaRow]:
+    """
+    Активные записи дня одним запросом и только нужными колонками (без ORM-объектов).
+    Keyset-пагинация по (starts_at, id); с фильтром по мастеру имя мастера не выбирается.
+    """
+    day_start, day_end = _day_bounds(day, tz)
+    conditions = [
+        Appointment.status == "active",
+        Appointment.starts_at >= day_start,
+        Appointment.starts_at < day_end,
+    ]
+    if master_id is not None:
+        conditions.append(Appointment.master_id == master_id)
+    if after is not None:
+        conditions.append(tuple_(Appointment.starts_at, Appointment.id) > tuple_(*after))
+
+    master_name = Master.name if master_id is None else literal(None, String)
+    stmt = (
+        select(
+            Appointment.id,
+            Appointment.starts_at,
+            master_name.label("master_name"),
+            Service.name.label("service_name"),
+            Appointment.user_id,
+            User.username,
         )
-        .order_by(Appointment.starts_at.asc())
+        .select_from(Appointment)
+        .join(Service, Service.id == Appointment.service_id)
+        .join(User, User.id == Appointment.user_id)
+        .where(and_(*conditions))
+        .order_by(Appointment.starts_at.asc(), Appointment.id.asc())
+        .limit(limit)
     )
-    return list(res.scalars().all())
+    if master_id is None:
+        stmt = stmt.join(Master, Master.id == Appointment.master_id)
+    res = await session.execute(stmt)
+    return [AgendaRow(**row._mapping) for row in res.all()]
 
 
+@dataclass(frozen=True)
+class MasterAgendaRow:
+    id: int
+    starts_at: dt.datetime
+    ends_at: dt.datetime
+    status: str
+    service_name: str
+    user_id: int
+    username: str | None
+
+
+async def get_master_agenda(
+    session: AsyncSession,
+    tz: dt.tzinfo,
+    master_id: int,
+    first: dt.date,
+    days: int = 2,
+) -> tuple[str | None, list[MasterAgendaRow]]:
+    """
+    Имя мастера и его записи (активные и ждущие оплаты) на days дней с first — одним запросом:
+    записи присоединяются к мастеру внешним join'ом, так что имя приходит и в пустой день.
+    Имя None — мастера нет.
+    """
+    since = _day_bounds(first, tz)[0]
+    until = _day_bounds(first + dt.timedelta(days=days - 1), tz)[1]
+    res = await session.execute(
+        select(
+            Master.name.label("master_name"),
+            Appointment.id,
+            Appointment.starts_at,
+            Appointment.ends_at,
+            Appointment.status,
+            Service.name.label("service_name"),
+            Appointment.user_id,
+            User.username,
+        )
+        .select_from(Master)
+        .outerjoin(
+            Appointment,
+            and_(
+                Appointment.master_id == Master.id,
+                Appointment.status.in_(("active", "pending_payment")),
+                Appointment.starts_at >= since,
+                Appointment.starts_at < until,
+            ),
+        )
+        .outerjoin(Service, Service.id == Appointment.service_id)
+        .outerjoin(User, User.id == Appointment.user_id)
+        .where(Master.id == master_id)
+        .order_by(Appointment.starts_at.asc(), Appointment.id.asc())
+    )
+    rows = res.all()
+    if not rows:
+        return None, []
+    return rows[0].master_name, [
+        MasterAgendaRow(**{k: v for k, v in row._mapping.items() if k != "master_name"})
+        for row in rows
+        if row.id is not None
+    ]
+
 
 async def add_master(session: AsyncSession, name: str, description: str | None) -> Master:
     tx = session.begin_nested() if session.in_transaction() else session.begin()
@@ -326,6 +495,39 @@ async def get_user_role(session: AsyncSession, user_id: int) -> str | None:
     u = await session.get(User, user_id)
     return u.role if u else None
 
+async def get_user_access(session: AsyncSession, user_id: int) -> tuple[str, int | None] | None:
+    """Роль пользователя и id привязанного к нему мастера — одним запросом."""
+    res = await session.execute(
+        select(User.role, Master.id)
+        .outerjoin(Master, Master.tg_user_id == User.id)
+        .where(User.id == user_id)
+    )
+    row = res.first()
+    return (row.role, row.id) if row else None
+
+async def link_master_user(session: AsyncSession, tg_user_id: int, master_id: int | None) -> tuple[bool, int | None]:
+    """
+    Привязать мастера к TG-пользователю (прежняя привязка снимается); master_id=None — только отвязать.
+    Возвращает (мастер найден, id пользователя, у которого этого мастера забрали): его роль master
+    сбрасывается в user в той же транзакции, кэш ролей сбрасывает вызывающий.
+    """
+    tx = session.begin_nested() if session.in_transaction() else session.begin()
+    async with tx:
+        await session.execute(update(Master).where(Master.tg_user_id == tg_user_id).values(tg_user_id=None))
+        if master_id is None:
+            return True, None
+        row = (
+            await session.execute(select(Master.tg_user_id).where(Master.id == master_id).with_for_update())
+        ).first()
+        if row is None:
+            return False, None
+        previous = row.tg_user_id
+        await session.execute(update(Master).where(Master.id == master_id).values(tg_user_id=tg_user_id))
+        if previous is None:
+            return True, None
+        await session.execute(update(User).where(and_(User.id == previous, User.role == "master")).values(role="user"))
+        return True, previous
+
 async def set_user_role(session: AsyncSession, user_id: int, role: str) -> None:
     tx = session.begin_nested() if session.in_transaction() else session.begin()
     async with tx:
@@ -347,6 +549,29 @@ async def audit(session: AsyncSession, actor_user_id: int | None, action: str, e
             meta=meta,
         ))
 
+# ---- Bans ----
+async def list_banned_ids(session: AsyncSession) -> set[int]:
+    res = await session.execute(select(Ban.user_id))
+    return set(res.scalars().all())
+
+
+async def ban_user(session: AsyncSession, user_id: int, banned_by: int | None, reason: str | None = None) -> bool:
+    """False — пользователь уже был заблокирован."""
+    stmt = (
+        pg_insert(Ban)
+        .values(user_id=user_id, banned_by=banned_by, reason=reason)
+        .on_conflict_do_nothing(index_elements=[Ban.user_id])
+        .returning(Ban.user_id)
+    )
+    res = await session.execute(stmt)
+    return res.scalar_one_or_none() is not None
+
+
+async def unban_user(session: AsyncSession, user_id: int) -> bool:
+    res = await session.execute(delete(Ban).where(Ban.user_id == user_id).returning(Ban.user_id))
+    return res.scalar_one_or_none() is not None
+
+
 # ---- Schedule CRUD ----
 async def upsert_working_hours(session: AsyncSession, master_id: int, weekday: int, start: dt.time, end: dt.time) -> None:
     tx = session.begin_nested() if session.in_transaction() else session.begin()
@@ -368,45 +593,199 @@ async def add_day_off(session: AsyncSession, master_id: int, date_: dt.date, rea
     async with tx:
         session.add(MasterDayOff(master_id=master_id, date=date_, reason=reason))
 
-async def get_master_schedule_for_day(
+def _minutes(t: dt.time) -> int:
+    # time.max — конец суток (WORK_END_HOUR=24)
+    return 24 * 60 if t == dt.time.max else t.hour * 60 + t.minute
+
+
+@dataclass(frozen=True)
+class DaySchedule:
+    """Расписание мастера на дату; start is None — выходной."""
+    start: dt.time | None = None
+    end: dt.time | None = None
+    breaks: tuple[tuple[dt.time, dt.time], ...] = ()
+
+    @property
+    def off(self) -> bool:
+        return self.start is None
+
+    @property
+    def working_minutes(self) -> int:
+        if self.off:
+            return 0
+        start, end = _minutes(self.start), _minutes(self.end)
+        busy = sum(max(0, min(end, _minutes(b1)) - max(start, _minutes(b0))) for b0, b1 in self.breaks)
+        return max(0, end - start - busy)
+
+    @classmethod
+    def from_row(cls, row: MasterDaySchedule) -> "DaySchedule":
+        return cls(row.start_time, row.end_time, _parse_intervals(row.breaks))
+
+
+DAY_OFF = DaySchedule()
+
+
+def _parse_intervals(items: list) -> tuple[tuple[dt.time, dt.time], ...]:
+    return tuple((dt.time.fromisoformat(a), dt.time.fromisoformat(b)) for a, b in items)
+
+
+def _dump_intervals(items: tuple[tuple[dt.time, dt.time], ...]) -> list[list[str]]:
+    return [[a.strftime("%H:%M"), b.strftime("%H:%M")] for a, b in items]
+
+
+async def compute_day_schedules(
     session: AsyncSession,
-    master_id: int,
-    date_: dt.date,
-    tz: dt.tzinfo,
+    master_ids: set[int],
+    first: dt.date,
+    last: dt.date,
     fallback_start_hour: int,
     fallback_end_hour: int,
-) -> tuple[tuple[dt.datetime, dt.datetime] | None, list[tuple[dt.datetime, dt.datetime]]]:
-    # day off?
-    off = await session.execute(
-        select(MasterDayOff.id).where(and_(MasterDayOff.master_id == master_id, MasterDayOff.date == date_)).limit(1)
+) -> dict[tuple[int, dt.date], DaySchedule]:
+    """
+    Расписание мастеров на каждую дату [first, last] по правилам — пять запросов на весь диапазон.
+    Приоритет: выходной мастера, праздник, шаблон (цикл от якоря), часы/перерывы по дню недели, fallback из .env.
+    """
+    res = await session.execute(
+        select(MasterSchedule.master_id, MasterSchedule.anchor, ScheduleTemplate.days, ScheduleTemplate.breaks)
+        .join(ScheduleTemplate, ScheduleTemplate.id == MasterSchedule.template_id)
+        .where(MasterSchedule.master_id.in_(master_ids))
     )
-    if off.first():
-        return None, []
+    templates = {
+        r.master_id: (r.anchor, [tuple(map(dt.time.fromisoformat, d)) if d else None for d in r.days], _parse_intervals(r.breaks))
+        for r in res.all()
+    }
+    hours: dict[tuple[int, int], tuple[dt.time, dt.time]] = {}
+    res = await session.execute(
+        select(MasterWorkingHours.master_id, MasterWorkingHours.weekday, MasterWorkingHours.start_time, MasterWorkingHours.end_time)
+        .where(MasterWorkingHours.master_id.in_(master_ids))
+    )
+    for master_id, weekday, start, end in res.all():
+        hours[(master_id, weekday)] = (start, end)
+    breaks: dict[tuple[int, int], list[tuple[dt.time, dt.time]]] = {}
+    res = await session.execute(
+        select(MasterBreak.master_id, MasterBreak.weekday, MasterBreak.start_time, MasterBreak.end_time)
+        .where(MasterBreak.master_id.in_(master_ids))
+        .order_by(MasterBreak.start_time)
+    )
+    for master_id, weekday, start, end in res.all():
+        breaks.setdefault((master_id, weekday), []).append((start, end))
+    res = await session.execute(
+        select(MasterDayOff.master_id, MasterDayOff.date).where(
+            and_(MasterDayOff.master_id.in_(master_ids), MasterDayOff.date.between(first, last))
+        )
+    )
+    days_off = {tuple(r) for r in res.all()}
+    res = await session.execute(select(ScheduleHoliday.date).where(ScheduleHoliday.date.between(first, last)))
+    holidays = set(res.scalars().all())
+
+    fallback = (dt.time(fallback_start_hour), dt.time(fallback_end_hour) if fallback_end_hour < 24 else dt.time.max)
+    out: dict[tuple[int, dt.date], DaySchedule] = {}
+    for day in (first + dt.timedelta(days=i) for i in range((last - first).days + 1)):
+        for master_id in master_ids:
+            if (master_id, day) in days_off or day in holidays:
+                out[(master_id, day)] = DAY_OFF
+            elif master_id in templates:
+                anchor, cycle, template_breaks = templates[master_id]
+                hours_of_day = cycle[(day - anchor).days % len(cycle)]
+                out[(master_id, day)] = DaySchedule(*hours_of_day, template_breaks) if hours_of_day else DAY_OFF
+            else:
+                start, end = hours.get((master_id, day.weekday()), fallback)
+                out[(master_id, day)] = DaySchedule(start, end, tuple(breaks.get((master_id, day.weekday()), ())))
+    return out
 
-    wd = date_.weekday()
 
-    wh = await session.execute(
-        select(MasterWorkingHours).where(and_(MasterWorkingHours.master_id == master_id, MasterWorkingHours.weekday == wd)).limit(1)
+async def load_day_schedules(
+    session: AsyncSession,
+    pairs: set[tuple[int, dt.date]],
+    fallback_start_hour: int,
+    fallback_end_hour: int,
+) -> dict[tuple[int, dt.date], DaySchedule]:
+    """Расписание из master_day_schedule; дат без строки (за горизонтом или после правки правил) — по правилам."""
+    if not pairs:
+        return {}
+    res = await session.execute(
+        select(MasterDaySchedule).where(tuple_(MasterDaySchedule.master_id, MasterDaySchedule.date).in_(list(pairs)))
     )
-    wh_row = wh.scalars().first()
+    out = {(r.master_id, r.date): DaySchedule.from_row(r) for r in res.scalars().all()}
+    missing = pairs - out.keys()
+    if missing:
+        days = [d for _, d in missing]
+        computed = await compute_day_schedules(
+            session, {m for m, _ in missing}, min(days), max(days), fallback_start_hour, fallback_end_hour
+        )
+        out.update((pair, computed[pair]) for pair in missing)
+    return out
 
-    if wh_row:
-        start_dt = dt.datetime.combine(date_, wh_row.start_time, tzinfo=tz)
-        end_dt = dt.datetime.combine(date_, wh_row.end_time, tzinfo=tz)
-    else:
-        start_dt = dt.datetime(date_.year, date_.month, date_.day, fallback_start_hour, 0, tzinfo=tz)
-        end_dt = dt.datetime(date_.year, date_.month, date_.day, fallback_end_hour, 0, tzinfo=tz)
 
-    br = await session.execute(
-        select(MasterBreak).where(and_(MasterBreak.master_id == master_id, MasterBreak.weekday == wd))
+async def materialize_day_schedules(
+    session: AsyncSession,
+    first: dt.date,
+    last: dt.date,
+    fallback_start_hour: int,
+    fallback_end_hour: int,
+    master_ids: set[int] | None = None,
+) -> int:
+    """
+    Разложить правила в master_day_schedule на [first, last] (по умолчанию — для всех мастеров).
+    Пишутся только изменившиеся даты, одним многострочным upsert'ом на пачку. Возвращает число записанных строк.
+    """
+    if master_ids is None:
+        master_ids = set((await session.execute(select(Master.id))).scalars().all())
+    if not master_ids:
+        return 0
+    desired = await compute_day_schedules(session, master_ids, first, last, fallback_start_hour, fallback_end_hour)
+    res = await session.execute(
+        select(MasterDaySchedule).where(
+            and_(MasterDaySchedule.master_id.in_(master_ids), MasterDaySchedule.date.between(first, last))
+        )
     )
-    breaks = []
-    for b in br.scalars().all():
-        b_start = dt.datetime.combine(date_, b.start_time, tzinfo=tz)
-        b_end = dt.datetime.combine(date_, b.end_time, tzinfo=tz)
-        breaks.append((b_start, b_end))
+    current = {(r.master_id, r.date): DaySchedule.from_row(r) for r in res.scalars().all()}
+    rows = [
+        {"master_id": m, "date": d, "start_time": v.start, "end_time": v.end, "breaks": _dump_intervals(v.breaks)}
+        for (m, d), v in desired.items()
+        if current.get((m, d)) != v
+    ]
+    for i in range(0, len(rows), 1000):
+        stmt = pg_insert(MasterDaySchedule).values(rows[i:i + 1000])
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[MasterDaySchedule.master_id, MasterDaySchedule.date],
+                set_={"start_time": stmt.excluded.start_time, "end_time": stmt.excluded.end_time, "breaks": stmt.excluded.breaks},
+            )
+        )
+    return len(rows)
 
-    return (start_dt, end_dt), breaks
+
+async def masters_missing_day_schedules(session: AsyncSession, first: dt.date, last: dt.date) -> set[int]:
+    """Мастера, у которых в [first, last] не разложена хотя бы одна дата (новый мастер, правка правил)."""
+    laid_out = (
+        select(func.count())
+        .where(and_(MasterDaySchedule.master_id == Master.id, MasterDaySchedule.date.between(first, last)))
+        .scalar_subquery()
+    )
+    res = await session.execute(select(Master.id).where(laid_out < (last - first).days + 1))
+    return set(res.scalars().all())
+
+
+async def get_master_schedule_for_day(
+    session: AsyncSession,
+    master_id: int,
+    date_: dt.date,
+    tz: dt.tzinfo,
+    fallback_start_hour: int,
+    fallback_end_hour: int,
+) -> tuple[tuple[dt.datetime, dt.datetime] | None, list[tuple[dt.datetime, dt.datetime]]]:
+    """Рабочее время и перерывы мастера на дату: обычно одна строка master_day_schedule по первичному ключу."""
+    day = (await load_day_schedules(session, {(master_id, date_)}, fallback_start_hour, fallback_end_hour))[(master_id, date_)]
+    if day.off:
+        return None, []
+
+    def at(t: dt.time) -> dt.datetime:
+        if t == dt.time.max:
+            return dt.datetime.combine(date_ + dt.timedelta(days=1), dt.time(), tzinfo=tz)
+        return dt.datetime.combine(date_, t, tzinfo=tz)
+
+    return (at(day.start), at(day.end)), [(at(b0), at(b1)) for b0, b1 in day.breaks]
 
 # ---- Payments ----
 async def create_payment(session: AsyncSession, provider: str, amount_cents: int, currency: str = "RUB", external_id: str | None = None, pay_url: str | None = None) -> Payment:
@@ -441,7 +820,12 @@ async def create_appointment_with_payment_acid(
     service_id: int,
     starts_at: dt.datetime,
     provider: str = "dummy",
+    pay_url_base: str | None = None,
 ) -> tuple[Appointment, Payment] | None:
+    """
+    Запись в статусе pending_payment и платёж к ней. У demo-платежа external_id — его id:
+    по нему вебхук провайдера (app.payments.webhook) находит платёж; pay_url_base — страница оплаты заглушки.
+    """
     service = await session.get(Service, service_id)
     if not service:
         return None
@@ -463,7 +847,8 @@ async def create_appointment_with_payment_acid(
             await session.flush()  # получить payment.id
 
             if not payment.pay_url and provider == "dummy":
-                payment.pay_url = f"https://example.com/pay/dummy/{payment.id}"
+                payment.external_id = str(payment.id)
+                payment.pay_url = f"{pay_url_base or 'https://example.com/pay/dummy'}/{payment.external_id}"
 
             # 2) создаём запись, но НЕ активируем
             appt = Appointment(
@@ -474,8 +859,7 @@ async def create_appointment_with_payment_acid(
                 ends_at=ends_at,
                 status="pending_payment",
                 payment_id=payment.id,
-                reminded_24h=False,
-                reminded_1h=False,
+                reminded_mask=0,
             )
             session.add(appt)
             await session.flush()  # на всякий (appt.id)
@@ -538,3 +922,727 @@ async def mark_payment_paid_and_activate_appointment(
         appt.status = "active"
         return appt
 
+
+async def get_payment_confirmation(session: AsyncSession, payment_id: int, user_id: int) -> tuple[str, Appointment] | None:
+    """Статус платежа и запись пользователя по нему — без изменений: оплату подтверждает вебхук провайдера."""
+    row = (
+        await session.execute(
+            select(Payment.status, Appointment)
+            .join(Appointment, Appointment.payment_id == Payment.id)
+            .where(and_(Payment.id == payment_id, Appointment.user_id == user_id))
+            .limit(1)
+        )
+    ).first()
+    return (row[0], row[1]) if row else None
+
+
+# ---- Payment provider webhooks ----
+async def enqueue_payment_notices(session: AsyncSession, provider: str, notices: Sequence[PaymentNotice]) -> int:
+    """Положить уведомления в очередь одним insert'ом; повторы (тот же платёж и статус) молча отбрасываются."""
+    if not notices:
+        return 0
+    stmt = (
+        pg_insert(PaymentEvent)
+        .values([
+            {
+                "provider": provider,
+                "external_id": n.external_id,
+                "status": n.status,
+                "amount_cents": n.amount_cents,
+                "payload": n.payload,
+            }
+            for n in notices
+        ])
+        .on_conflict_do_nothing(index_elements=[PaymentEvent.provider, PaymentEvent.external_id, PaymentEvent.status])
+        .returning(PaymentEvent.external_id)
+    )
+    return len((await session.execute(stmt)).all())
+
+
+def _apply_payment_event(
+    event: PaymentEvent, payment: Payment | None, appt: Appointment | None, now: dt.datetime
+) -> str:
+    """Перевести платёж (и запись) по уведомлению; возвращает итог для payment_events.result."""
+    if payment is None:
+        return "unknown"
+    if payment.status == event.status:
+        return "duplicate"
+    if event.status == "paid":
+        if event.amount_cents is not None and event.amount_cents != payment.amount_cents:
+            return "amount_mismatch"
+        # оплата пришла после отмены/ошибки — деньги у провайдера, но слот уже отпущен: разбирает админ
+        if payment.status != "pending":
+            return "conflict"
+        payment.status = "paid"
+        payment.paid_at = now
+        if appt is not None and appt.status == "pending_payment":
+            appt.status = "active"
+        return "applied"
+    if event.status in ("failed", "cancelled"):
+        if payment.status != "pending":
+            return "conflict"
+        payment.status = event.status
+        if appt is not None and appt.status == "pending_payment":
+            appt.status = "cancelled"  # слот освобождается
+        return "applied"
+    # refunded
+    if payment.status != "paid":
+        return "conflict"
+    payment.status = "refunded"
+    if appt is not None and appt.status == "active" and appt.starts_at > now:
+        appt.status = "cancelled"
+    return "applied"
+
+
+async def apply_payment_events(session: AsyncSession, limit: int = 500) -> dict[str, int]:
+    """
+    Применить пачку уведомлений из очереди: строки очереди берутся FOR UPDATE SKIP LOCKED (реплики воркера
+    не мешают друг другу), платежи и их записи — FOR UPDATE одним запросом на таблицу, в порядке id.
+    Сначала платёж, потом запись — так же блокируют mark_payment_paid_and_activate_appointment,
+    cancel_appointment и cancel_payment_and_cancel_appointment, поэтому взаимных блокировок нет,
+    а отмена из бота не затирает пришедшую оплату (и наоборот).
+    Возвращает число уведомлений по итогам.
+    """
+    tx = session.begin_nested() if session.in_transaction() else session.begin()
+    async with tx:
+        events = (
+            await session.execute(
+                select(PaymentEvent)
+                .where(PaymentEvent.processed_at.is_(None))
+                .order_by(PaymentEvent.received_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+        ).scalars().all()
+        if not events:
+            return {}
+
+        keys = {(e.provider, e.external_id) for e in events}
+        payments = (
+            await session.execute(
+                select(Payment)
+                .where(tuple_(Payment.provider, Payment.external_id).in_(keys))
+                .order_by(Payment.id)
+                .with_for_update()
+            )
+        ).scalars().all()
+        appts = []
+        if payments:
+            appts = (
+                await session.execute(
+                    select(Appointment)
+                    .where(Appointment.payment_id.in_([p.id for p in payments]))
+                    .order_by(Appointment.id)
+                    .with_for_update()
+                )
+            ).scalars().all()
+        by_key = {(p.provider, p.external_id): p for p in payments}
+        by_payment = {a.payment_id: a for a in appts}
+
+        now = dt.datetime.now(dt.timezone.utc)
+        results: dict[str, int] = {}
+        for e in events:
+            payment = by_key.get((e.provider, e.external_id))
+            e.result = _apply_payment_event(e, payment, by_payment.get(payment.id) if payment else None, now)
+            e.processed_at = now
+            results[e.result] = results.get(e.result, 0) + 1
+    return results
+
+
+async def purge_payment_events(session: AsyncSession, before: dt.datetime) -> int:
+    """Удалить применённые уведомления старше before (дальше повтор уведомления — снова no-op, но через очередь)."""
+    res = await session.execute(
+        delete(PaymentEvent).where(and_(PaymentEvent.processed_at.is_not(None), PaymentEvent.processed_at < before))
+    )
+    return res.rowcount or 0
+
+
+# ---- Reminders catch-up ----
+async def get_reminder_watermark(session: AsyncSession, name: str) -> dt.datetime | None:
+    wm = await session.get(ReminderWatermark, name)
+    return wm.value if wm else None
+
+
+async def set_reminder_watermark(session: AsyncSession, name: str, value: dt.datetime) -> None:
+    stmt = pg_insert(ReminderWatermark).values(name=name, value=value)
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[ReminderWatermark.name],
+            set_={"value": stmt.excluded.value, "updated_at": func.now()},
+        )
+    )
+
+
+async def bind_reminder_bits(session: AsyncSession, kinds: tuple[ReminderKind, ...]) -> tuple[ReminderKind, ...]:
+    """
+    Биты reminded_mask для REMINDER_OFFSETS из reminder_bits; новым срокам — новые биты (assign_reminder_bits).
+    Пустую таблицу (миграция её только создаёт) заполняет первый стартовавший воркер: биты — позиции в его списке.
+    Таблица блокируется до конца транзакции: реплики, стартующие разом, не раздадут один бит двум срокам.
+    """
+    tx = session.begin_nested() if session.in_transaction() else session.begin()
+    async with tx:
+        await session.execute(text("LOCK TABLE reminder_bits IN SHARE ROW EXCLUSIVE MODE"))
+        known = dict((await session.execute(select(ReminderBit.minutes, ReminderBit.bit))).all())
+        bound, new = assign_reminder_bits(kinds, known)
+        if new:
+            await session.execute(pg_insert(ReminderBit).values([{"minutes": m, "bit": b} for m, b in new.items()]))
+    return bound
+
+
+def _reminder_kinds_values(kinds: tuple[ReminderKind, ...]) -> Values:
+    """Виды напоминаний как VALUES-таблица, чтобы все сроки обрабатывались одним запросом."""
+    return values(
+        column("kind", String), column("flag", Integer), column("offset", Interval),
+        name="kinds",
+    ).data([(k.name, k.flag, k.offset) for k in kinds])
+
+
+async def get_missed_reminders(
+    session: AsyncSession,
+    kinds: tuple[ReminderKind, ...],
+    since: dt.datetime,
+    now: dt.datetime,
+    after: tuple[dt.datetime, int, str] | None = None,
+    limit: int = 500,
+) -> list[tuple[int, str, dt.datetime]]:
+    """
+    Пары (запись, вид напоминания) по всем срокам сразу: срок (starts_at - offset) попал в (since, now],
+    запись активна и ещё не началась, бит в reminded_mask не выставлен.
+    Keyset-пагинация по (starts_at, id, kind): after — последняя строка прошлой пачки.
+    """
+    k = _reminder_kinds_values(kinds)
+    due_at = Appointment.starts_at - k.c.offset
+    conditions = [
+        Appointment.status == "active",
+        Appointment.reminded_mask.op("&")(k.c.flag) == 0,
+        Appointment.starts_at > now,            # прошедшие записи уже не напоминаем
+        # общий диапазон по starts_at для индекса — один проход по appointments на все сроки
+        Appointment.starts_at > since + min(x.offset for x in kinds),
+        Appointment.starts_at <= now + max(x.offset for x in kinds),
+        due_at > since,
+        due_at <= now,
+    ]
+    if after is not None:
+        conditions.append(tuple_(Appointment.starts_at, Appointment.id, k.c.kind) > tuple_(*after))
+
+    res = await session.execute(
+        select(Appointment.id, k.c.kind, Appointment.starts_at)
+        .select_from(Appointment)
+        .join(k, true())
+        .where(and_(*conditions))
+        .order_by(Appointment.starts_at.asc(), Appointment.id.asc(), k.c.kind.asc())
+        .limit(limit)
+    )
+    return [(row.id, row.kind, row.starts_at) for row in res.all()]
+
+
+# ---- Reminders outbox ----
+async def enqueue_due_reminders(
+    session: AsyncSession,
+    due: list[tuple[int, str]],
+    kinds: tuple[ReminderKind, ...],
+    now: dt.datetime,
+) -> int:
+    """
+    Одним INSERT ... SELECT переложить созревшие напоминания в reminder_outbox и
+    в том же операторе выставить их биты в reminded_mask. Пропускаются отменённые/прошедшие записи,
+    уже отмеченные напоминания и "вытесненные" (за 24ч, когда уже пора за 1ч — бит ставится, письма нет).
+    Виды, которых больше нет в kinds (срок убрали из конфига), игнорируются.
+    Возвращает число добавленных в outbox строк.
+    """
+    by_name = {k.name: k for k in kinds}
+    due = [(appt_id, by_name[name]) for appt_id, name in due if name in by_name]
+    if not due:
+        return 0
+
+    due_cte = select(
+        func.unnest(bindparam("due_ids", [appt_id for appt_id, _ in due], type_=ARRAY(Integer))).label("appointment_id"),
+        func.unnest(bindparam("due_kinds", [k.name for _, k in due], type_=ARRAY(String))).label("kind"),
+        func.unnest(bindparam("due_flags", [k.flag for _, k in due], type_=ARRAY(Integer))).label("flag"),
+        func.unnest(
+            bindparam(
+                "due_cutoffs",
+                [superseded_cutoff(k, kinds, now) for _, k in due],
+                type_=ARRAY(DateTime(timezone=True)),
+            )
+        ).label("cutoff"),
+    ).cte("due")
+
+    picked = (
+        select(
+            Appointment.id.label("appointment_id"),
+            Appointment.user_id,
+            Appointment.starts_at,
+            Appointment.master_id,
+            Appointment.service_id,
+            due_cte.c.kind,
+            due_cte.c.flag,
+            and_(due_cte.c.cutoff.is_not(None), Appointment.starts_at <= due_cte.c.cutoff).label("superseded"),
+        )
+        .join_from(Appointment, due_cte, due_cte.c.appointment_id == Appointment.id)
+        .where(
+            and_(
+                Appointment.status == "active",
+                Appointment.starts_at > now,
+                Appointment.reminded_mask.op("&")(due_cte.c.flag) == 0,
+            )
+        )
+        .with_for_update(of=Appointment)
+        .cte("picked")
+    )
+
+    marked = (
+        update(Appointment)
+        .where(Appointment.id.in_(select(picked.c.appointment_id)))
+        .values(
+            reminded_mask=Appointment.reminded_mask.op("|")(
+                select(func.bit_or(picked.c.flag))
+                .where(picked.c.appointment_id == Appointment.id)
+                .scalar_subquery()
+            )
+        )
+        .returning(Appointment.id)
+        .cte("marked")
+    )
+
+    rows = (
+        select(
+            picked.c.appointment_id,
+            picked.c.kind,
+            picked.c.user_id,
+            func.jsonb_build_object(
+                "starts_at", picked.c.starts_at,
+                "master_name", Master.name,
+                "service_name", Service.name,
+            ),
+        )
+        .select_from(picked)
+        .join(Master, Master.id == picked.c.master_id)
+        .join(Service, Service.id == picked.c.service_id)
+        .where(picked.c.superseded.is_(False))
+    )
+    stmt = (
+        pg_insert(ReminderOutbox)
+        .from_select(["appointment_id", "kind", "chat_id", "payload"], rows)
+        .on_conflict_do_nothing(index_elements=["appointment_id", "kind"])
+        .returning(ReminderOutbox.id)
+        .add_cte(marked)
+    )
+    res = await session.execute(stmt)
+    return len(res.all())
+
+
+async def claim_outbox_batch(
+    session: AsyncSession,
+    now: dt.datetime,
+    limit: int = 100,
+    visibility_timeout: dt.timedelta = dt.timedelta(minutes=2),
+) -> list[ReminderOutbox]:
+    """
+    Забрать пачку готовых к отправке строк (SKIP LOCKED — параллельные диспетчеры не пересекаются)
+    и отодвинуть next_attempt_at на visibility_timeout: если диспетчер упадёт, строка вернётся сама.
+    """
+    claimable = (
+        select(ReminderOutbox.id)
+        .where(and_(ReminderOutbox.status == "pending", ReminderOutbox.next_attempt_at <= now))
+        .order_by(ReminderOutbox.next_attempt_at.asc())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    res = await session.execute(
+        update(ReminderOutbox)
+        .where(ReminderOutbox.id.in_(claimable.scalar_subquery()))
+        .values(attempts=ReminderOutbox.attempts + 1, next_attempt_at=now + visibility_timeout)
+        .returning(ReminderOutbox)
+        .execution_options(synchronize_session=False)
+    )
+    return list(res.scalars().all())
+
+
+async def mark_outbox_sent(session: AsyncSession, ids: list[int], now: dt.datetime) -> None:
+    if not ids:
+        return
+    await session.execute(
+        update(ReminderOutbox)
+        .where(ReminderOutbox.id.in_(ids))
+        .values(status="sent", sent_at=now, last_error=None)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def mark_outbox_failed(
+    session: AsyncSession,
+    outbox_id: int,
+    error: str,
+    retry_at: dt.datetime | None,
+) -> None:
+    """retry_at=None — больше не пытаться."""
+    values: dict = {"last_error": error[:1000]}
+    if retry_at is None:
+        values["status"] = "failed"
+    else:
+        values["next_attempt_at"] = retry_at
+    await session.execute(
+        update(ReminderOutbox)
+        .where(ReminderOutbox.id == outbox_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# ---- Reports ----
+def _day_ranges(days: set[dt.date], tz: dt.tzinfo) -> list[tuple[dt.datetime, dt.datetime]]:
+    """Подряд идущие даты склеиваются в один интервал [начало первого дня, конец последнего)."""
+    ranges: list[tuple[dt.datetime, dt.datetime]] = []
+    first = prev = None
+    for d in sorted(days):
+        if prev is not None and d - prev > dt.timedelta(days=1):
+            ranges.append((_day_bounds(first, tz)[0], _day_bounds(prev, tz)[1]))
+            first = None
+        first = first or d
+        prev = d
+    if first is not None:
+        ranges.append((_day_bounds(first, tz)[0], _day_bounds(prev, tz)[1]))
+    return ranges
+
+
+async def claim_report_dirty(session: AsyncSession, limit: int) -> list[tuple[int, dt.datetime | None, dt.date | None]]:
+    """Забрать пачку отметок report_dirty (удаляются сразу; откат транзакции вернёт их на место)."""
+    picked = select(ReportDirty.id).order_by(ReportDirty.id).limit(limit).with_for_update(skip_locked=True)
+    res = await session.execute(
+        delete(ReportDirty)
+        .where(ReportDirty.id.in_(picked))
+        .returning(ReportDirty.master_id, ReportDirty.starts_at, ReportDirty.day)
+    )
+    return [tuple(r) for r in res.all()]
+
+
+async def refresh_report_days(
+    session: AsyncSession,
+    pairs: set[tuple[int, dt.date]],
+    tz: dt.tzinfo,
+    fallback_start_hour: int,
+    fallback_end_hour: int,
+) -> int:
+    """
+    Пересчитать rollup'ы для пар (master_id, локальная дата): один агрегат по appointments + payments
+    только за эти дни и расписание дней (load_day_schedules), затем строки дней заменяются целиком.
+    Возвращает число пересчитанных дней мастеров.
+    """
+    if not pairs:
+        return 0
+    res = await session.execute(select(Master.id).where(Master.id.in_({m for m, _ in pairs})))
+    existing = set(res.scalars().all())
+    pairs = {(m, d) for m, d in pairs if m in existing}  # мастера могли удалить после отметки
+    if not pairs:
+        return 0
+    master_ids = {m for m, _ in pairs}
+    days = {d for _, d in pairs}
+
+    # прошлые даты — из раскладки (снимок того расписания, по которому мастер работал), остальные — по правилам
+    schedules = await load_day_schedules(session, pairs, fallback_start_hour, fallback_end_hour)
+
+    local_day = func.timezone(str(tz), Appointment.starts_at).cast(Date)
+    live = Appointment.status != "cancelled"
+    res = await session.execute(
+        select(
+            Appointment.master_id,
+            Appointment.service_id,
+            local_day.label("day"),
+            func.count().filter(live).label("appointments"),
+            func.count().filter(Appointment.status == "cancelled").label("cancelled"),
+            func.count().filter(Appointment.status == "pending_payment").label("unpaid"),
+            func.coalesce(func.sum(func.extract("epoch", Appointment.ends_at - Appointment.starts_at)).filter(live), 0).label("booked_seconds"),
+            func.coalesce(func.sum(Payment.amount_cents).filter(Payment.status == "paid"), 0).label("revenue_cents"),
+        )
+        .outerjoin(Payment, Payment.id == Appointment.payment_id)
+        .where(
+            and_(
+                Appointment.master_id.in_(master_ids),
+                or_(*(and_(Appointment.starts_at >= a, Appointment.starts_at < b) for a, b in _day_ranges(days, tz))),
+            )
+        )
+        .group_by(Appointment.master_id, Appointment.service_id, local_day)
+    )
+
+    totals = {
+        pair: {
+            "day": pair[1], "master_id": pair[0], "working_minutes": schedules[pair].working_minutes, "booked_minutes": 0,
+            "appointments": 0, "cancelled": 0, "unpaid": 0, "revenue_cents": 0,
+        }
+        for pair in pairs
+    }
+    service_rows = []
+    for r in res.all():
+        total = totals.get((r.master_id, r.day))
+        if total is None:
+            continue
+        total["booked_minutes"] += int(r.booked_seconds) // 60
+        for key in ("appointments", "cancelled", "unpaid", "revenue_cents"):
+            total[key] += getattr(r, key)
+        service_rows.append({
+            "day": r.day, "master_id": r.master_id, "service_id": r.service_id,
+            "appointments": r.appointments, "cancelled": r.cancelled, "revenue_cents": r.revenue_cents,
+        })
+
+    keys = list(pairs)
+    await session.execute(
+        delete(ReportServiceDay).where(tuple_(ReportServiceDay.master_id, ReportServiceDay.day).in_(keys))
+    )
+    await session.execute(
+        delete(ReportMasterDay).where(tuple_(ReportMasterDay.master_id, ReportMasterDay.day).in_(keys))
+    )
+    await session.execute(pg_insert(ReportMasterDay).values(list(totals.values())))
+    if service_rows:
+        await session.execute(pg_insert(ReportServiceDay).values(service_rows))
+    return len(totals)
+
+
+async def get_month_report(session: AsyncSession, first: dt.date, last: dt.date) -> tuple[list, list, list]:
+    """Отчёт за [first, last] только из rollup'ов: итоги по мастерам, по услугам и по дням."""
+    in_range = ReportMasterDay.day.between(first, last)
+    by_master = await session.execute(
+        select(
+            Master.name,
+            func.sum(ReportMasterDay.revenue_cents).label("revenue_cents"),
+            func.sum(ReportMasterDay.working_minutes).label("working_minutes"),
+            func.sum(ReportMasterDay.booked_minutes).label("booked_minutes"),
+            func.sum(ReportMasterDay.appointments).label("appointments"),
+            func.sum(ReportMasterDay.cancelled).label("cancelled"),
+            func.sum(ReportMasterDay.unpaid).label("unpaid"),
+        )
+        .join(Master, Master.id == ReportMasterDay.master_id)
+        .where(in_range)
+        .group_by(Master.id, Master.name)
+        .order_by(Master.name)
+    )
+    by_service = await session.execute(
+        select(
+            Service.name,
+            func.sum(ReportServiceDay.revenue_cents).label("revenue_cents"),
+            func.sum(ReportServiceDay.appointments).label("appointments"),
+            func.sum(ReportServiceDay.cancelled).label("cancelled"),
+        )
+        .join(Service, Service.id == ReportServiceDay.service_id)
+        .where(ReportServiceDay.day.between(first, last))
+        .group_by(Service.id, Service.name)
+        .order_by(func.sum(ReportServiceDay.revenue_cents).desc(), Service.name)
+    )
+    by_day = await session.execute(
+        select(
+            ReportMasterDay.day,
+            func.sum(ReportMasterDay.revenue_cents).label("revenue_cents"),
+            func.sum(ReportMasterDay.appointments).label("appointments"),
+        )
+        .where(in_range)
+        .group_by(ReportMasterDay.day)
+        .order_by(ReportMasterDay.day)
+    )
+    return list(by_master.all()), list(by_service.all()), list(by_day.all())
+
+
+# ---- Export ----
+EXPORT_COLUMNS = (
+    "appointment_id", "starts_at", "ends_at", "status", "created_at",
+    "user_id", "username", "phone_number", "master", "service", "price",
+    "payment_id", "provider", "payment_status", "amount", "currency", "paid_at",
+)
+
+
+async def stream_appointments_export(
+    session: AsyncSession,
+    since: dt.datetime,
+    until: dt.datetime,
+    tz: dt.tzinfo,
+    batch: int = 1000,
+) -> AsyncIterator[Sequence[Row]]:
+    """
+    Записи с пользователем, мастером, услугой и платежом за [since, until) пачками по batch строк.
+    Серверный курсор (yield_per): в памяти только текущая пачка. Время — локальное, суммы — в рублях,
+    всё форматирует Postgres, чтобы на строку не было работы в Python.
+    """
+    def local(col):
+        return func.to_char(func.timezone(str(tz), col), "YYYY-MM-DD HH24:MI")
+
+    stmt = (
+        select(
+            Appointment.id,
+            local(Appointment.starts_at),
+            local(Appointment.ends_at),
+            Appointment.status,
+            local(Appointment.created_at),
+            User.id,
+            User.username,
+            User.phone_number,
+            Master.name,
+            Service.name,
+            func.round(Service.price_cents.cast(Numeric) / 100, 2),
+            Payment.id,
+            Payment.provider,
+            Payment.status,
+            func.round(Payment.amount_cents.cast(Numeric) / 100, 2),
+            Payment.currency,
+            local(Payment.paid_at),
+        )
+        .join(User, User.id == Appointment.user_id)
+        .join(Master, Master.id == Appointment.master_id)
+        .join(Service, Service.id == Appointment.service_id)
+        .outerjoin(Payment, Payment.id == Appointment.payment_id)
+        .where(and_(Appointment.starts_at >= since, Appointment.starts_at < until))
+        .order_by(Appointment.starts_at, Appointment.id)
+        .execution_options(yield_per=batch)
+    )
+    result = await session.stream(stmt)
+    async for rows in result.partitions():
+        yield rows
+
+
+# ---- Bulk import ----
+async def missing_masters(session: AsyncSession, names: set[str]) -> set[str]:
+    if not names:
+        return set()
+    res = await session.execute(select(Master.name).where(Master.name.in_(names)))
+    return names - set(res.scalars().all())
+
+
+async def missing_templates(session: AsyncSession, names: set[str]) -> set[str]:
+    if not names:
+        return set()
+    res = await session.execute(select(ScheduleTemplate.name).where(ScheduleTemplate.name.in_(names)))
+    return names - set(res.scalars().all())
+
+
+async def apply_import(session: AsyncSession, plan: ImportPlan) -> dict[str, int]:
+    """
+    Применить проверенный план (app.importer.parse_import) одной транзакцией: по одному многострочному
+    upsert'у на таблицу. Мастера и услуги сопоставляются по имени (описание пустым не затирается),
+    рабочие часы и выходные — по (мастер, день недели/дата); перерывы заменяются целиком
+    для каждого (мастер, день недели), упомянутого в файле. Шаблоны — по имени, праздники — по дате.
+    Раскладку master_day_schedule обновлять не нужно: триггеры сбрасывают затронутые даты.
+    """
+    counts: dict[str, int] = {}
+    inserted = literal_column("xmax = 0")  # true — строка вставлена, false — обновлена
+    tx = session.begin_nested() if session.in_transaction() else session.begin()
+    async with tx:
+        ids: dict[str, int] = {}
+        if plan.masters:
+            stmt = pg_insert(Master).values([{"name": m.name, "description": m.description} for m in plan.masters])
+            res = await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[Master.name],
+                    set_={"description": func.coalesce(stmt.excluded.description, Master.description)},
+                ).returning(Master.id, Master.name, inserted)
+            )
+            rows = res.all()
+            ids.update((name, master_id) for master_id, name, _ in rows)
+            counts["masters_added"] = sum(1 for *_, new in rows if new)
+            counts["masters_updated"] = len(rows) - counts["masters_added"]
+
+        if plan.services:
+            stmt = pg_insert(Service).values([
+                {"name": s.name, "description": s.description, "duration_minutes": s.duration_minutes, "price_cents": s.price_cents}
+                for s in plan.services
+            ])
+            res = await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[Service.name],
+                    set_={
+                        "description": func.coalesce(stmt.excluded.description, Service.description),
+                        "duration_minutes": stmt.excluded.duration_minutes,
+                        "price_cents": stmt.excluded.price_cents,
+                    },
+                ).returning(inserted)
+            )
+            new = res.scalars().all()
+            counts["services_added"] = sum(1 for n in new if n)
+            counts["services_updated"] = len(new) - counts["services_added"]
+
+        referenced = plan.referenced_masters() - set(ids)
+        if referenced:
+            res = await session.execute(select(Master.id, Master.name).where(Master.name.in_(referenced)))
+            ids.update((name, master_id) for master_id, name in res.all())
+
+        if plan.templates:
+            stmt = pg_insert(ScheduleTemplate).values([
+                {
+                    "name": t.name,
+                    "days": [_dump_intervals((d,))[0] if d else None for d in t.days],
+                    "breaks": _dump_intervals(t.breaks),
+                }
+                for t in plan.templates
+            ])
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[ScheduleTemplate.name],
+                    set_={"days": stmt.excluded.days, "breaks": stmt.excluded.breaks},
+                )
+            )
+            counts["templates"] = len(plan.templates)
+
+        if plan.assignments:
+            names = {a.template for a in plan.assignments if a.template is not None}
+            res = await session.execute(select(ScheduleTemplate.id, ScheduleTemplate.name).where(ScheduleTemplate.name.in_(names)))
+            template_ids = {name: template_id for template_id, name in res.all()}
+            unassign = [ids[a.master] for a in plan.assignments if a.template is None]
+            if unassign:
+                await session.execute(delete(MasterSchedule).where(MasterSchedule.master_id.in_(unassign)))
+            assign = [
+                {"master_id": ids[a.master], "template_id": template_ids[a.template], "anchor": a.anchor}
+                for a in plan.assignments if a.template is not None
+            ]
+            if assign:
+                stmt = pg_insert(MasterSchedule).values(assign)
+                await session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[MasterSchedule.master_id],
+                        set_={"template_id": stmt.excluded.template_id, "anchor": stmt.excluded.anchor},
+                    )
+                )
+            counts["assignments"] = len(plan.assignments)
+
+        if plan.holidays:
+            stmt = pg_insert(ScheduleHoliday).values([{"date": h.date, "name": h.name} for h in plan.holidays])
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[ScheduleHoliday.date],
+                    set_={"name": func.coalesce(stmt.excluded.name, ScheduleHoliday.name)},
+                )
+            )
+            counts["holidays"] = len(plan.holidays)
+
+        if plan.hours:
+            stmt = pg_insert(MasterWorkingHours).values([
+                {"master_id": ids[h.master], "weekday": h.weekday, "start_time": h.start, "end_time": h.end}
+                for h in plan.hours
+            ])
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[MasterWorkingHours.master_id, MasterWorkingHours.weekday],
+                    set_={"start_time": stmt.excluded.start_time, "end_time": stmt.excluded.end_time},
+                )
+            )
+            counts["working_hours"] = len(plan.hours)
+
+        if plan.breaks:
+            days = {(ids[b.master], b.weekday) for b in plan.breaks}
+            await session.execute(
+                delete(MasterBreak).where(tuple_(MasterBreak.master_id, MasterBreak.weekday).in_(list(days)))
+            )
+            await session.execute(pg_insert(MasterBreak).values([
+                {"master_id": ids[b.master], "weekday": b.weekday, "start_time": b.start, "end_time": b.end}
+                for b in plan.breaks
+            ]))
+            counts["breaks"] = len(plan.breaks)
+
+        if plan.days_off:
+            stmt = pg_insert(MasterDayOff).values([
+                {"master_id": ids[d.master], "date": d.date, "reason": d.reason} for d in plan.days_off
+            ])
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[MasterDayOff.master_id, MasterDayOff.date],
+                    set_={"reason": func.coalesce(stmt.excluded.reason, MasterDayOff.reason)},
+                )
+            )
+            counts["days_off"] = len(plan.days_off)
+    return counts
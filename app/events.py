@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import json
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+from app.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "booking_events"
+
+EVENTS_RECEIVED = Counter("booking_events_total", "Booking events received via LISTEN/NOTIFY", labels=("table", "op"))
+SUBSCRIBER_ERRORS = Counter("booking_event_subscriber_errors_total", "Booking event subscriber failures")
+
+
+def _parse_ts(value: str | None) -> dt.datetime | None:
+    return dt.datetime.fromisoformat(value) if value else None
+
+
+@dataclass(frozen=True)
+class BookingEvent:
+    """Изменение записи или платежа (см. триггеры в миграции 0012_booking_notify)."""
+    table: str                     # "appointments" | "payments"
+    op: str                        # "INSERT" | "UPDATE"
+    id: int
+    status: str | None
+    old_status: str | None = None
+    appointment_id: int | None = None
+    user_id: int | None = None
+    master_id: int | None = None
+    starts_at: dt.datetime | None = None
+    old_starts_at: dt.datetime | None = None
+
+    @classmethod
+    def from_payload(cls, payload: str) -> "BookingEvent":
+        d = json.loads(payload)
+        return cls(
+            table=d["table"],
+            op=d["op"],
+            id=int(d["id"]),
+            status=d.get("status"),
+            old_status=d.get("old_status"),
+            appointment_id=d.get("appointment_id"),
+            user_id=d.get("user_id"),
+            master_id=d.get("master_id"),
+            starts_at=_parse_ts(d.get("starts_at")),
+            old_starts_at=_parse_ts(d.get("old_starts_at")),
+        )
+
+    @property
+    def status_changed(self) -> bool:
+        return self.op == "INSERT" or self.status != self.old_status
+
+
+Subscriber = Callable[[BookingEvent], Awaitable[None]]
+ResyncHook = Callable[[], Awaitable[None]]
+
+
+def asyncpg_dsn(database_url: str) -> str:
+    """postgresql+asyncpg://... (SQLAlchemy) -> postgresql://... (asyncpg)."""
+    return make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+class BookingEventListener:
+    """
+    Держит отдельное asyncpg-соединение с LISTEN и раздаёт события подписчикам внутри процесса.
+    NOTIFY не хранится: всё, что пришло, пока соединения не было, теряется — поэтому после
+    каждого (пере)подключения вызываются on_resync-хуки (подписчик досверяется с БД).
+    """
+
+    def __init__(self, dsn: str, channel: str = CHANNEL) -> None:
+        self.dsn = dsn
+        self.channel = channel
+        self._subscribers: list[Subscriber] = []
+        self._resync_hooks: list[ResyncHook] = []
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+
+    def subscribe(self, callback: Subscriber) -> None:
+        self._subscribers.append(callback)
+
+    def on_resync(self, hook: ResyncHook) -> None:
+        self._resync_hooks.append(hook)
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self._queue.put_nowait(payload)
+
+    async def _fan_out(self) -> None:
+        while True:
+            payload = await self._queue.get()
+            try:
+                event = BookingEvent.from_payload(payload)
+            except (ValueError, KeyError) as e:
+                logger.warning("Bad booking event payload %r: %s", payload, e)
+                continue
+            EVENTS_RECEIVED.inc(table=event.table, op=event.op)
+            results = await asyncio.gather(*(cb(event) for cb in self._subscribers), return_exceptions=True)
+            for r in results:
+                if isinstance(r, Exception):
+                    SUBSCRIBER_ERRORS.inc()
+                    logger.error("Booking event subscriber failed on %s: %r", event, r)
+
+    async def _resync(self) -> None:
+        for hook in self._resync_hooks:
+            try:
+                await hook()
+            except Exception as e:
+                logger.exception("Booking events resync hook failed: %s", e)
+
+    async def run(self) -> None:
+        fan_out = asyncio.create_task(self._fan_out())
+        backoff = 1.0
+        try:
+            while True:
+                conn = None
+                try:
+                    conn = await asyncpg.connect(self.dsn)
+                    lost = asyncio.Event()
+                    conn.add_termination_listener(lambda _conn: lost.set())
+                    await conn.add_listener(self.channel, self._on_notify)
+                    logger.info("Listening for %s", self.channel)
+                    backoff = 1.0
+                    await self._resync()
+                    await lost.wait()
+                    logger.warning("LISTEN connection lost, reconnecting")
+                except (OSError, asyncpg.PostgresError) as e:
+                    logger.warning("LISTEN connection failed: %s (retry in %.0fs)", e, backoff)
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                finally:
+                    if conn is not None and not conn.is_closed():
+                        await conn.close()
+        finally:
+            fan_out.cancel()
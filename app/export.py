@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import datetime as dt
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.requests import EXPORT_COLUMNS, stream_appointments_export
+
+# Bot API принимает от бота документы до 50 МБ
+DOCUMENT_LIMIT = 50 * 1024 * 1024
+
+
+async def export_appointments_csv(
+    session: AsyncSession, since: dt.datetime, until: dt.datetime, tz: dt.tzinfo
+) -> tuple[Path, int]:
+    """
+    Записи за [since, until) в CSV во временном файле. Строки идут серверным курсором пачками
+    и сразу пишутся в файл — память не зависит от размера периода. Файл удаляет вызывающий.
+    """
+    fd, name = tempfile.mkstemp(prefix="export-", suffix=".csv")
+    path = Path(name)
+    rows = 0
+    try:
+        # utf-8-sig: Excel иначе открывает кириллицу кракозябрами
+        with os.fdopen(fd, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(EXPORT_COLUMNS)
+            async for batch in stream_appointments_export(session, since, until, tz):
+                writer.writerows(batch)
+                rows += len(batch)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return path, rows
+
+
+def _zip(path: Path) -> Path:
+    target = path.with_suffix(".zip")
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        z.write(path, arcname=path.name)  # читается кусками, файл целиком в память не попадает
+    return target
+
+
+async def fit_document_limit(path: Path) -> Path | None:
+    """CSV больше лимита Bot API сжимается в zip (текст жмётся в 5–10 раз); None — не влез и так."""
+    if path.stat().st_size <= DOCUMENT_LIMIT:
+        return path
+    zipped = await asyncio.to_thread(_zip, path)
+    path.unlink(missing_ok=True)
+    if zipped.stat().st_size <= DOCUMENT_LIMIT:
+        return zipped
+    zipped.unlink(missing_ok=True)
+    return None
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from typing import Iterable, Iterator
+
+# Лимит длины текста одного сообщения Bot API (в UTF-16 code units, как считает Telegram)
+TG_MESSAGE_LIMIT = 4096
+
+
+def tg_len(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _cut(line: str, limit: int) -> int:
+    cut = min(len(line), limit)
+    while tg_len(line[:cut]) > limit:
+        cut -= 1
+    return cut
+
+
+def chunk_lines(lines: Iterable[str], limit: int = TG_MESSAGE_LIMIT) -> Iterator[str]:
+    """
+    Склеивать строки в сообщения не длиннее limit, разрезая только по границам строк
+    (строку длиннее limit режем по символам). Строки читаются по мере надобности.
+    """
+    buf: list[str] = []
+    size = 0
+    for line in lines:
+        while tg_len(line) > limit:
+            if buf:
+                yield "\n".join(buf)
+                buf, size = [], 0
+            cut = _cut(line, limit)
+            yield line[:cut]
+            line = line[cut:]
+        extra = tg_len(line) + (1 if buf else 0)
+        if size + extra > limit:
+            yield "\n".join(buf)
+            buf, size = [], 0
+            extra = tg_len(line)
+        buf.append(line)
+        size += extra
+    if buf:
+        yield "\n".join(buf)
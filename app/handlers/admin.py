@@ -1,21 +1,31 @@
 from __future__ import annotations
 
 import datetime as dt
+from html import escape
 
-from aiogram import F, Router
-from aiogram.filters import Command
+from aiogram import Bot, F, Router
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import Message
+from aiogram.types import CallbackQuery, FSInputFile, InlineKeyboardMarkup, Message
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.agenda import MasterAgenda
+from app.bans import BanList
 from app.config import Config
-from app.database.requests import add_master, get_today_appointments, list_masters
-from app.keyboards.builders import admin_menu_kb, main_menu_kb
+from app.export import export_appointments_csv, fit_document_limit
+from app.importer import parse_import
+from app.roles import ROLES, Access, RoleCache
+from app.database.requests import add_master, get_day_agenda, get_month_report, list_masters
+from app.formatting import chunk_lines
+from app.handlers.common import safe_edit_text
+from app.keyboards.builders import admin_day_kb, admin_menu_kb, admin_report_kb, main_menu_kb, master_menu_kb
 
 from app.database.requests import add_service
 
-from app.database.requests import audit
+from app.database.requests import (
+    apply_import, audit, ban_user, link_master_user, missing_masters, missing_templates, set_user_role, unban_user
+)
 
 
 router = Router(name="admin")
@@ -32,52 +42,188 @@ class AddServiceStates(StatesGroup):
     description = State()
 
 
-def _is_admin(message: Message, config: Config) -> bool:
-    return message.from_user and message.from_user.id in config.admin_ids
-
-
 @router.message(Command("admin"))
-async def admin_entry(message: Message, config: Config, state: FSMContext) -> None:
-    if not _is_admin(message, config):
+async def admin_entry(message: Message, access: Access, state: FSMContext) -> None:
+    if access.is_master:
+        # мастеру — урезанное меню: только свои записи
+        await state.clear()
+        await message.answer("Меню мастера:", reply_markup=master_menu_kb())
+        return
+    if not access.is_admin:
         await message.answer("⛔️ Доступ запрещён.")
         return
     await state.clear()
     await message.answer("Админ-меню:", reply_markup=admin_menu_kb())
 
 
+def _agenda_scope(access: Access, master_id: int | None) -> tuple[bool, int | None]:
+    """Можно ли смотреть записи и чьи: админ — любого мастера, мастер — только свои."""
+    if access.is_admin:
+        return True, master_id
+    if access.is_master and access.master_id is not None:
+        return True, access.master_id
+    return False, None
+
+
 @router.message(F.text == "⬅️ В меню")
 async def back_to_main(message: Message) -> None:
     await message.answer("Ок.", reply_markup=main_menu_kb())
 
 
+AGENDA_PAGE = 40
+
+
+async def _day_agenda(
+    session: AsyncSession,
+    config: Config,
+    day: dt.date,
+    master_id: int | None = None,
+    after: tuple[dt.datetime, int] | None = None,
+    filters: bool = True,
+) -> tuple[list[str], InlineKeyboardMarkup]:
+    """
+    Страница записей дня, нарезанная на сообщения по лимиту Telegram; клавиатура — к последнему.
+    filters=False — без переключения мастеров (вид мастера).
+    """
+    rows = await get_day_agenda(session, tz=config.tz, day=day, master_id=master_id, after=after, limit=AGENDA_PAGE + 1)
+    has_more = len(rows) > AGENDA_PAGE
+    rows = rows[:AGENDA_PAGE]
+    masters = [(m.id, m.name) for m in await list_masters(session)]
+
+    title = f"Записи на {day.strftime('%d.%m.%Y')}"
+    if master_id is not None:
+        title += f", мастер: {escape(dict(masters).get(master_id, str(master_id)))}"
+    if after is not None:
+        title += " (продолжение)"
+
+    def lines():
+        yield title + ":"
+        if not rows:
+            yield "Записей нет." if after is None else "Больше записей нет."
+        for r in rows:
+            who = f"@{r.username}" if r.username else f"user_id={r.user_id}"
+            parts = [r.starts_at.astimezone(config.tz).strftime("%H:%M")]
+            if r.master_name is not None:
+                parts.append(escape(r.master_name))
+            parts += [escape(r.service_name), who]
+            yield "• " + " — ".join(parts)
+
+    next_cursor = f"{int(rows[-1].starts_at.timestamp())}:{rows[-1].id}" if has_more else None
+    kb = admin_day_kb(day, master_id, masters if filters else [], next_cursor, filters=filters)
+    return list(chunk_lines(lines())), kb
+
+
 @router.message(F.text == "📋 Записи сегодня")
-async def today_appointments(message: Message, config: Config, session: AsyncSession) -> None:
-    if not _is_admin(message, config):
+async def today_appointments(message: Message, config: Config, access: Access, session: AsyncSession) -> None:
+    allowed, master_id = _agenda_scope(access, None)
+    if not allowed:
         await message.answer("⛔️ Доступ запрещён.")
         return
 
     today = dt.datetime.now(tz=config.tz).date()
-    appts = await get_today_appointments(session, tz=config.tz, today=today)
+    chunks, kb = await _day_agenda(session, config, today, master_id=master_id, filters=access.is_admin)
+    for chunk in chunks[:-1]:
+        await message.answer(chunk)
+    await message.answer(chunks[-1], reply_markup=kb)
+
+
+@router.callback_query(F.data.startswith("adm:day:"))
+async def day_agenda_nav(call: CallbackQuery, config: Config, access: Access, session: AsyncSession) -> None:
+    _, _, day_s, master_s, cursor = call.data.split(":", 4)
+    allowed, master_id = _agenda_scope(access, int(master_s) or None)
+    if not allowed:
+        await call.answer("⛔️ Доступ запрещён.", show_alert=True)
+        return
 
-    if not appts:
-        await message.answer("На сегодня записей нет.")
+    day = dt.datetime.now(tz=config.tz).date() if day_s == "today" else dt.date.fromisoformat(day_s)
+    after = None
+    if cursor != "-":
+        ts, appt_id = cursor.split(":")
+        after = (dt.datetime.fromtimestamp(int(ts), tz=dt.timezone.utc), int(appt_id))
+
+    chunks, kb = await _day_agenda(session, config, day, master_id=master_id, after=after, filters=access.is_admin)
+    # первая часть заменяет текущее сообщение, остальные (если день не влез) — следом, клавиатура у последней
+    await safe_edit_text(call.message, chunks[0], reply_markup=kb if len(chunks) == 1 else None)
+    for i, chunk in enumerate(chunks[1:], start=2):
+        await call.message.answer(chunk, reply_markup=kb if i == len(chunks) else None)
+    await call.answer()
+
+
+def _rub(cents: int) -> str:
+    return f"{int(cents) // 100:,}".replace(",", " ") + " ₽"
+
+
+def _pct(part: int, whole: int) -> str:
+    return f"{round(100 * part / whole)}%" if whole else "—"
+
+
+async def _month_report(session: AsyncSession, month: dt.date) -> list[str]:
+    """Отчёт за месяц из rollup'ов (app.workers.reports) — сырые appointments/payments не читаются."""
+    last = (month + dt.timedelta(days=32)).replace(day=1) - dt.timedelta(days=1)
+    by_master, by_service, by_day = await get_month_report(session, month, last)
+
+    def lines():
+        yield f"📊 <b>Отчёт за {month.strftime('%m.%Y')}</b>"
+        if not by_master:
+            yield "Данных нет (отчёты считает воркер reports_worker)."
+            return
+        revenue = sum(r.revenue_cents for r in by_master)
+        done = sum(r.appointments for r in by_master)
+        cancelled = sum(r.cancelled for r in by_master)
+        working = sum(r.working_minutes for r in by_master)
+        booked = sum(r.booked_minutes for r in by_master)
+        yield f"Выручка: {_rub(revenue)}"
+        yield f"Записей: {done}, отмен: {cancelled} ({_pct(cancelled, done + cancelled)}), не оплачено: {sum(r.unpaid for r in by_master)}"
+        yield f"Загрузка: {_pct(booked, working)} ({booked // 60} ч из {working // 60} ч)"
+        yield ""
+        yield "<b>Мастера</b>"
+        for r in by_master:
+            yield (
+                f"• {escape(r.name)} — {_rub(r.revenue_cents)}, загрузка {_pct(r.booked_minutes, r.working_minutes)}, "
+                f"записей {r.appointments}, отмен {_pct(r.cancelled, r.appointments + r.cancelled)}, не оплачено {r.unpaid}"
+            )
+        yield ""
+        yield "<b>Услуги</b>"
+        for r in by_service:
+            yield f"• {escape(r.name)} — {_rub(r.revenue_cents)}, записей {r.appointments}, отмен {_pct(r.cancelled, r.appointments + r.cancelled)}"
+        yield ""
+        yield "<b>По дням</b>"
+        for r in by_day:
+            if r.appointments or r.revenue_cents:
+                yield f"• {r.day.strftime('%d.%m')} — {_rub(r.revenue_cents)}, записей {r.appointments}"
+
+    return list(chunk_lines(lines()))
+
+
+@router.message(F.text == "📊 Отчёт")
+async def month_report(message: Message, config: Config, access: Access, session: AsyncSession) -> None:
+    if not access.is_admin:
+        await message.answer("⛔️ Доступ запрещён.")
         return
+    month = dt.datetime.now(tz=config.tz).date().replace(day=1)
+    chunks = await _month_report(session, month)
+    for chunk in chunks[:-1]:
+        await message.answer(chunk)
+    await message.answer(chunks[-1], reply_markup=admin_report_kb(month))
 
-    lines = [f"Записи на сегодня ({today.strftime('%d.%m.%Y')}):"]
-    for a in appts:
-        who = f"@{a.user.username}" if a.user and a.user.username else f"user_id={a.user_id}"
-        lines.append(
-            f"• {a.starts_at.astimezone(config.tz).strftime('%H:%M')} — "
-            f"{a.master.name if a.master else a.master_id} — "
-            f"{a.service.name if a.service else a.service_id} — {who}"
-        )
 
-    await message.answer("\n".join(lines))
+@router.callback_query(F.data.startswith("adm:rep:"))
+async def month_report_nav(call: CallbackQuery, access: Access, session: AsyncSession) -> None:
+    if not access.is_admin:
+        await call.answer("⛔️ Доступ запрещён.", show_alert=True)
+        return
+    month = dt.date.fromisoformat(call.data.removeprefix("adm:rep:") + "-01")
+    chunks = await _month_report(session, month)
+    kb = admin_report_kb(month)
+    await safe_edit_text(call.message, chunks[0], reply_markup=kb if len(chunks) == 1 else None)
+    for i, chunk in enumerate(chunks[1:], start=2):
+        await call.message.answer(chunk, reply_markup=kb if i == len(chunks) else None)
+    await call.answer()
 
 
 @router.message(F.text == "➕ Добавить мастера")
-async def add_master_start(message: Message, config: Config, state: FSMContext) -> None:
-    if not _is_admin(message, config):
+async def add_master_start(message: Message, access: Access, state: FSMContext) -> None:
+    if not access.is_admin:
         await message.answer("⛔️ Доступ запрещён.")
         return
     await state.set_state(AddMasterStates.name)
@@ -85,8 +231,8 @@ async def add_master_start(message: Message, config: Config, state: FSMContext)
 
 
 @router.message(AddMasterStates.name, F.text)
-async def add_master_name(message: Message, config: Config, state: FSMContext) -> None:
-    if not _is_admin(message, config):
+async def add_master_name(message: Message, access: Access, state: FSMContext) -> None:
+    if not access.is_admin:
         await message.answer("⛔️ Доступ запрещён.")
         return
     name = message.text.strip()
@@ -99,8 +245,8 @@ async def add_master_name(message: Message, config: Config, state: FSMContext) -
 
 
 @router.message(AddMasterStates.description, F.text)
-async def add_master_finish(message: Message, config: Config, state: FSMContext, session: AsyncSession) -> None:
-    if not _is_admin(message, config):
+async def add_master_finish(message: Message, access: Access, state: FSMContext, session: AsyncSession) -> None:
+    if not access.is_admin:
         await message.answer("⛔️ Доступ запрещён.")
         return
 
@@ -119,8 +265,8 @@ async def add_master_finish(message: Message, config: Config, state: FSMContext,
 
 
 @router.message(F.text == "➕ Добавить услугу")
-async def add_service_start(message: Message, config: Config, state: FSMContext) -> None:
-    if not _is_admin(message, config):
+async def add_service_start(message: Message, access: Access, state: FSMContext) -> None:
+    if not access.is_admin:
         await message.answer("⛔️ Доступ запрещён.")
         return
     await state.set_state(AddServiceStates.name)
@@ -128,8 +274,8 @@ async def add_service_start(message: Message, config: Config, state: FSMContext)
 
 
 @router.message(AddServiceStates.name, F.text)
-async def add_service_name(message: Message, config: Config, state: FSMContext) -> None:
-    if not _is_admin(message, config):
+async def add_service_name(message: Message, access: Access, state: FSMContext) -> None:
+    if not access.is_admin:
         await message.answer("⛔️ Доступ запрещён.")
         return
     name = message.text.strip()
@@ -142,8 +288,8 @@ async def add_service_name(message: Message, config: Config, state: FSMContext)
 
 
 @router.message(AddServiceStates.duration, F.text)
-async def add_service_duration(message: Message, config: Config, state: FSMContext) -> None:
-    if not _is_admin(message, config):
+async def add_service_duration(message: Message, access: Access, state: FSMContext) -> None:
+    if not access.is_admin:
         await message.answer("⛔️ Доступ запрещён.")
         return
     try:
@@ -160,8 +306,8 @@ async def add_service_duration(message: Message, config: Config, state: FSMConte
 
 
 @router.message(AddServiceStates.price, F.text)
-async def add_service_price(message: Message, config: Config, state: FSMContext) -> None:
-    if not _is_admin(message, config):
+async def add_service_price(message: Message, access: Access, state: FSMContext) -> None:
+    if not access.is_admin:
         await message.answer("⛔️ Доступ запрещён.")
         return
     try:
@@ -178,8 +324,8 @@ async def add_service_price(message: Message, config: Config, state: FSMContext)
 
 
 @router.message(AddServiceStates.description, F.text)
-async def add_service_finish(message: Message, config: Config, state: FSMContext, session: AsyncSession) -> None:
-    if not _is_admin(message, config):
+async def add_service_finish(message: Message, access: Access, state: FSMContext, session: AsyncSession) -> None:
+    if not access.is_admin:
         await message.answer("⛔️ Доступ запрещён.")
         return
 
@@ -199,3 +345,245 @@ async def add_service_finish(message: Message, config: Config, state: FSMContext
                 meta={"name": data["name"]})
     await state.clear()
     await message.answer("✅ Услуга добавлена.", reply_markup=admin_menu_kb())
+
+
+def _parse_ban_args(command: CommandObject) -> tuple[int, str | None] | None:
+    parts = (command.args or "").split(maxsplit=1)
+    if not parts or not parts[0].lstrip("-").isdigit():
+        return None
+    return int(parts[0]), (parts[1].strip() if len(parts) > 1 else None)
+
+
+@router.message(Command("ban"))
+async def ban_cmd(
+    message: Message, command: CommandObject, config: Config, access: Access, session: AsyncSession, bans: BanList
+) -> None:
+    if not access.is_admin:
+        await message.answer("⛔️ Доступ запрещён.")
+        return
+    parsed = _parse_ban_args(command)
+    if parsed is None:
+        await message.answer("Формат: /ban <telegram_id> [причина]")
+        return
+    user_id, reason = parsed
+    if user_id in config.admin_ids:
+        await message.answer("Админа заблокировать нельзя.")
+        return
+
+    if not await ban_user(session, user_id=user_id, banned_by=message.from_user.id, reason=reason):
+        await message.answer(f"user_id={user_id} уже заблокирован.")
+        return
+    # tg id не влезает в audit_log.entity_id (INTEGER) — кладём в meta
+    await audit(session, actor_user_id=message.from_user.id, action="ban_user", entity="User", entity_id=None,
+                meta={"user_id": user_id, "reason": reason})
+    await session.commit()
+    await bans.announce("ban", user_id)
+    await message.answer(f"⛔️ user_id={user_id} заблокирован.")
+
+
+@router.message(Command("unban"))
+async def unban_cmd(
+    message: Message, command: CommandObject, access: Access, session: AsyncSession, bans: BanList
+) -> None:
+    if not access.is_admin:
+        await message.answer("⛔️ Доступ запрещён.")
+        return
+    parsed = _parse_ban_args(command)
+    if parsed is None:
+        await message.answer("Формат: /unban <telegram_id>")
+        return
+    user_id, _ = parsed
+    if user_id in bans.static:
+        await message.answer(f"user_id={user_id} заблокирован через BANNED_IDS — убери его из .env.")
+        return
+
+    if not await unban_user(session, user_id=user_id):
+        await message.answer(f"user_id={user_id} не был заблокирован.")
+        return
+    await audit(session, actor_user_id=message.from_user.id, action="unban_user", entity="User", entity_id=None,
+                meta={"user_id": user_id})
+    await session.commit()
+    await bans.announce("unban", user_id)
+    await message.answer(f"✅ user_id={user_id} разблокирован.")
+
+
+@router.message(Command("bans"))
+async def bans_cmd(message: Message, access: Access, bans: BanList) -> None:
+    if not access.is_admin:
+        await message.answer("⛔️ Доступ запрещён.")
+        return
+    if not len(bans):
+        await message.answer("Заблокированных нет.")
+        return
+    ids = list(bans)
+    text = f"Заблокировано: {len(ids)}\n" + "\n".join(f"• <code>{i}</code>" for i in ids[:100])
+    if len(ids) > 100:
+        text += f"\n… и ещё {len(ids) - 100}"
+    await message.answer(text)
+
+
+def _parse_period(args: str | None, today: dt.date) -> tuple[dt.date, dt.date] | None:
+    """Период для /export: пусто — текущий месяц, YYYY-MM — месяц, одна или две даты YYYY-MM-DD (включительно)."""
+    parts = (args or "").split()
+    try:
+        if not parts:
+            first = today.replace(day=1)
+        elif len(parts) == 1 and len(parts[0]) == 7:
+            first = dt.date.fromisoformat(parts[0] + "-01")
+        else:
+            if len(parts) > 2:
+                return None
+            first, last = dt.date.fromisoformat(parts[0]), dt.date.fromisoformat(parts[-1])
+            return (first, last) if first <= last else None
+    except ValueError:
+        return None
+    return first, (first + dt.timedelta(days=32)).replace(day=1) - dt.timedelta(days=1)
+
+
+@router.message(Command("export"))
+async def export_cmd(
+    message: Message, command: CommandObject, config: Config, access: Access, session: AsyncSession
+) -> None:
+    if not access.is_admin:
+        await message.answer("⛔️ Доступ запрещён.")
+        return
+    period = _parse_period(command.args, dt.datetime.now(tz=config.tz).date())
+    if period is None:
+        await message.answer("Формат: /export, /export 2026-10 или /export 2026-10-01 2026-10-31")
+        return
+    first, last = period
+    since = dt.datetime.combine(first, dt.time(), tzinfo=config.tz)
+    until = dt.datetime.combine(last + dt.timedelta(days=1), dt.time(), tzinfo=config.tz)
+
+    await message.answer(f"⏳ Готовлю выгрузку за {first.strftime('%d.%m.%Y')}–{last.strftime('%d.%m.%Y')}…")
+    path, rows = await export_appointments_csv(session, since, until, config.tz)
+    try:
+        await audit(session, actor_user_id=message.from_user.id, action="export", entity="Appointment", entity_id=None,
+                    meta={"from": first.isoformat(), "to": last.isoformat(), "rows": rows})
+        # соединение с БД больше не нужно — не держим его, пока файл уходит в Telegram
+        await session.commit()
+
+        path = await fit_document_limit(path)
+        if path is None:
+            await message.answer("Выгрузка больше 50 МБ даже в zip — сузьте период.")
+            return
+        filename = f"appointments_{first.isoformat()}_{last.isoformat()}{path.suffix}"
+        await message.answer_document(FSInputFile(path, filename=filename), caption=f"Записей: {rows}")
+    finally:
+        if path is not None:
+            path.unlink(missing_ok=True)
+
+
+IMPORT_MAX_BYTES = 1024 * 1024
+IMPORT_HELP = (
+    "Импорт мастеров, услуг и расписания: пришлите CSV или JSON документом с подписью /import.\n"
+    "CSV — колонки <code>kind,name,description,duration_minutes,price,weekday,start,end,date</code>, "
+    "kind: master, service, hours, break, day_off, template, assign, holiday "
+    "(для расписания name — имя мастера, weekday 0=пн…6=вс).\n"
+    "JSON — <code>{\"masters\": [{\"name\", \"working_hours\": [{\"weekday\", \"start\", \"end\"}], "
+    "\"breaks\": [...], \"days_off\": [{\"date\", \"reason\"}]}], "
+    "\"services\": [{\"name\", \"duration_minutes\", \"price\"}]}</code>.\n"
+    "Графики: <code>\"templates\": [{\"name\": \"2/2\", \"days\": [\"10:00-20:00\", \"10:00-20:00\", null, null], "
+    "\"breaks\": [\"14:00-15:00\"]}]</code>, у мастера — <code>\"template\", \"anchor\"</code> (первый день цикла); "
+    "праздники — <code>\"holidays\": [{\"date\", \"name\"}]</code>.\n"
+    "Сначала проверяется весь файл; при любой ошибке ничего не меняется."
+)
+IMPORT_LABELS = {
+    "masters_added": "мастеров добавлено",
+    "masters_updated": "мастеров обновлено",
+    "services_added": "услуг добавлено",
+    "services_updated": "услуг обновлено",
+    "working_hours": "рабочих часов",
+    "breaks": "перерывов",
+    "days_off": "выходных",
+    "templates": "шаблонов графика",
+    "assignments": "назначений шаблонов",
+    "holidays": "праздников",
+}
+
+
+@router.message(Command("import"))
+async def import_cmd(message: Message, bot: Bot, access: Access, session: AsyncSession) -> None:
+    if not access.is_admin:
+        await message.answer("⛔️ Доступ запрещён.")
+        return
+    doc = message.document
+    if doc is None:
+        await message.answer(IMPORT_HELP)
+        return
+    if doc.file_size and doc.file_size > IMPORT_MAX_BYTES:
+        await message.answer("Файл больше 1 МБ — разбейте его на части.")
+        return
+
+    content = await bot.download(doc)
+    plan, errors = parse_import(content.read(), doc.file_name or "")
+    if not errors:
+        errors = [f"мастер «{name}» не найден" for name in sorted(await missing_masters(session, plan.referenced_masters()))]
+        errors += [f"шаблон «{name}» не найден" for name in sorted(await missing_templates(session, plan.referenced_templates()))]
+    if errors:
+        def lines():
+            yield f"❌ Импорт не выполнен, ошибок: {len(errors)}"
+            yield from (f"• {escape(e)}" for e in errors[:50])
+            if len(errors) > 50:
+                yield f"… и ещё {len(errors) - 50}"
+        for chunk in chunk_lines(lines()):
+            await message.answer(chunk)
+        return
+
+    counts = await apply_import(session, plan)
+    await audit(session, actor_user_id=message.from_user.id, action="import", entity="Master", entity_id=None,
+                meta={"file": doc.file_name, **counts})
+    await message.answer(
+        "✅ Импорт выполнен:\n" + "\n".join(f"• {IMPORT_LABELS[k]}: {n}" for k, n in counts.items()),
+        reply_markup=admin_menu_kb(),
+    )
+
+
+@router.message(Command("role"))
+async def role_cmd(
+    message: Message,
+    command: CommandObject,
+    config: Config,
+    access: Access,
+    session: AsyncSession,
+    roles: RoleCache,
+    agenda: MasterAgenda,
+) -> None:
+    if not access.is_admin:
+        await message.answer("⛔️ Доступ запрещён.")
+        return
+    parts = (command.args or "").split()
+    usage = "Формат: /role <telegram_id> user|admin или /role <telegram_id> master <master_id>"
+    if len(parts) not in (2, 3) or not parts[0].isdigit() or parts[1] not in ROLES:
+        await message.answer(usage)
+        return
+    user_id, role = int(parts[0]), parts[1]
+    master_id = None
+    if role == "master":
+        if len(parts) != 3 or not parts[2].isdigit():
+            await message.answer(usage)
+            return
+        master_id = int(parts[2])
+    if user_id in config.admin_ids:
+        await message.answer("Этот пользователь — админ из ADMIN_IDS, его роль задаётся в .env.")
+        return
+
+    if master_id is not None and master_id not in {m.id for m in await list_masters(session)}:
+        await message.answer(f"Мастер #{master_id} не найден.")
+        return
+
+    await set_user_role(session, user_id=user_id, role=role)
+    _, previous = await link_master_user(session, tg_user_id=user_id, master_id=master_id)
+    await audit(session, actor_user_id=message.from_user.id, action="set_role", entity="User", entity_id=None,
+                meta={"user_id": user_id, "role": role, "master_id": master_id, "unlinked_user_id": previous})
+    await session.commit()
+    await roles.invalidate(user_id)
+    suffix = f" (мастер #{master_id})" if master_id else ""
+    if previous is not None:
+        # прежний пользователь мастера стал обычным: без меню мастера и без обновлений его записей
+        await roles.invalidate(previous)
+        pin = await agenda.pinned(master_id)
+        if pin is not None and pin[0] == previous:
+            await agenda.unpin(master_id)
+        suffix += f"; user_id={previous} больше не мастер"
+    await message.answer(f"✅ user_id={user_id}: роль {role}{suffix}.")
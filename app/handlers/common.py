@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, Message
+
+from app.metrics import Counter
+
+EDITS_SKIPPED = Counter("tg_edit_skipped_total", "Message edits skipped because nothing changed", labels=("source",))
+
+# что бот последний раз положил в сообщение: (chat_id, message_id) -> отпечаток текста и разметки
+_RENDERED_MAX = 10_000
+_rendered: OrderedDict[tuple[int, int], int] = OrderedDict()
+
+
+def _fingerprint(text: str, kwargs: dict[str, Any]) -> int:
+    markup = kwargs.get("reply_markup")
+    rest = tuple(sorted((k, repr(v)) for k, v in kwargs.items() if k != "reply_markup"))
+    return hash((text, markup.model_dump_json(exclude_none=True) if markup is not None else None, rest))
+
+
+def _shows(message: Message, text: str, kwargs: dict[str, Any]) -> bool:
+    """Сообщение из апдейта уже выглядит так (снимок на момент нажатия кнопки)."""
+    if set(kwargs) - {"reply_markup"}:
+        return False
+    markup = kwargs.get("reply_markup")
+    if markup is not None and not isinstance(markup, InlineKeyboardMarkup):
+        return False
+    try:
+        shown = message.html_text
+    except (AttributeError, TypeError):
+        return False
+    return shown == text and message.reply_markup == markup
+
+
+async def safe_edit_text(message: Message | None, text: str, **kwargs) -> None:
+    """
+    edit_text без лишних вызовов Bot API: если сообщение уже показывает этот текст и эту клавиатуру
+    (по записи последней правки или по самому сообщению из апдейта), правка пропускается.
+    "message is not modified" от Telegram по-прежнему глушится — на случай правок в обход этой функции.
+    """
+    if message is None:
+        return
+    key = (message.chat.id, message.message_id)
+    fingerprint = _fingerprint(text, kwargs)
+    if _rendered.get(key) == fingerprint:
+        EDITS_SKIPPED.inc(source="rendered")
+        _rendered.move_to_end(key)
+        return
+    if key not in _rendered and _shows(message, text, kwargs):
+        EDITS_SKIPPED.inc(source="message")
+        return
+    try:
+        await message.edit_text(text, **kwargs)
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e).lower():
+            raise
+    _rendered[key] = fingerprint
+    _rendered.move_to_end(key)
+    if len(_rendered) > _RENDERED_MAX:
+        _rendered.popitem(last=False)
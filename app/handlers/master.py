@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from aiogram import F, Router
+from aiogram.filters import Command
+from aiogram.types import CallbackQuery, Message
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.agenda import VIEWS, MasterAgenda
+from app.handlers.common import safe_edit_text
+from app.keyboards.builders import master_agenda_kb
+from app.roles import Access
+
+router = Router(name="master")
+
+
+def _is_master(_: Message, access: Access) -> bool:
+    return access.is_master and access.master_id is not None
+
+
+# кнопка меню мастера; админу та же кнопка открывает общий список дня (handlers.admin)
+@router.message(Command("agenda"))
+@router.message(F.text == "📋 Записи сегодня", _is_master)
+async def master_agenda(message: Message, access: Access, agenda: MasterAgenda, session: AsyncSession) -> None:
+    if not _is_master(message, access):
+        await message.answer("⛔️ Команда для мастеров (привязку делает админ: /role).")
+        return
+
+    text = await agenda.view(session, access.master_id, agenda.today())
+    if text is None:
+        await message.answer("Мастер не найден.")
+        return
+    sent = await message.answer(text, reply_markup=master_agenda_kb("today"))
+    # последнее открытое сообщение обновляется само при новых, оплаченных и отменённых записях
+    await agenda.pin(access.master_id, sent.chat.id, sent.message_id, "today")
+
+
+@router.callback_query(F.data.startswith("mst:ag:"))
+async def master_agenda_nav(call: CallbackQuery, access: Access, agenda: MasterAgenda, session: AsyncSession) -> None:
+    view = call.data.split(":", 2)[2]
+    if not (access.is_master and access.master_id is not None) or view not in VIEWS:
+        await call.answer("⛔️ Доступ запрещён.", show_alert=True)
+        return
+
+    text = await agenda.view(session, access.master_id, agenda.day_of(view))
+    if text is None:
+        await call.answer("Мастер не найден.", show_alert=True)
+        return
+    await safe_edit_text(call.message, text, reply_markup=master_agenda_kb(view))
+    await agenda.pin(access.master_id, call.message.chat.id, call.message.message_id, view)
+    await call.answer()
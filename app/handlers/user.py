@@ -6,12 +6,12 @@ from aiogram import F, Router
 from aiogram.filters import CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import CallbackQuery, Message
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import Config
+from app.handlers.common import safe_edit_text
 from app.database.requests import (
     SlotSettings,
     add_user,
@@ -20,6 +20,19 @@ from app.database.requests import (
     list_masters,
     cancel_appointment,
 )
+from app.keyboards.callbacks import (
+    LEGACY_PREFIXES,
+    BookingAction,
+    BookingNav,
+    CancelAppt,
+    DatePick,
+    MasterPick,
+    MyPage,
+    PayAction,
+    PayCb,
+    ServicePick,
+    TimePick,
+)
 from app.keyboards.builders import (
     confirm_kb,
     main_menu_kb,
@@ -31,22 +44,13 @@ from app.keyboards.builders import (
 from app.database.requests import list_services
 from app.keyboards.builders import services_kb, calendar_14d_kb
 
-from app.database.requests import create_appointment_with_payment_acid, mark_payment_paid_and_activate_appointment
+from app.database.requests import (
+    create_appointment_with_payment_acid, get_payment_confirmation, mark_payment_paid_and_activate_appointment
+)
 from app.keyboards.builders import pay_kb
 
 router = Router(name="user")
 
-async def _safe_edit_text(message: Message | None, text: str, **kwargs) -> None:
-    """edit_text без падения на повторных кликах (message is not modified)."""
-    if message is None:
-        return
-    try:
-        await message.edit_text(text, **kwargs)
-    except TelegramBadRequest as e:
-        if "message is not modified" in str(e).lower():
-            return
-        raise
-
 class BookingStates(StatesGroup):
     choosing_master = State()
     choosing_service = State()
@@ -92,65 +96,67 @@ async def book_start(message: Message, state: FSMContext, session: AsyncSession)
     await message.answer("Шаг 1/4: выбери мастера:", reply_markup=masters_kb(items))
 
 
-@router.callback_query(F.data == "bk:cancel")
+@router.callback_query(BookingNav.filter(F.action == BookingAction.cancel))
 async def booking_cancel(call: CallbackQuery, state: FSMContext) -> None:
     await state.clear()
-    await _safe_edit_text(call.message, "Ок, отменено.")
+    await safe_edit_text(call.message, "Ок, отменено.")
     await call.answer()
 
 
-@router.callback_query(F.data.startswith("bk:master:"))
-async def choose_master(call: CallbackQuery, state: FSMContext, session: AsyncSession) -> None:
-    master_id = int(call.data.split(":")[-1])
-    await state.update_data(master_id=master_id)
+@router.callback_query(MasterPick.filter())
+async def choose_master(
+    call: CallbackQuery, callback_data: MasterPick, state: FSMContext, session: AsyncSession
+) -> None:
+    await state.update_data(master_id=callback_data.master_id)
 
     services = await list_services(session)
     if not services:
-        await _safe_edit_text(call.message, "Нет услуг. Админ должен добавить услуги через /admin.")
+        await safe_edit_text(call.message, "Нет услуг. Админ должен добавить услуги через /admin.")
         await call.answer()
         return
 
     await state.set_state(BookingStates.choosing_service)
     items = [(s.id, s.name) for s in services]
-    await _safe_edit_text(call.message, "Шаг 2/5: выбери услугу:", reply_markup=services_kb(items))
+    await safe_edit_text(call.message, "Шаг 2/5: выбери услугу:", reply_markup=services_kb(items))
     await call.answer()
 
-@router.callback_query(F.data == "bk:back:services")
+@router.callback_query(BookingNav.filter(F.action == BookingAction.back_services))
 async def back_to_services(call: CallbackQuery, state: FSMContext, session: AsyncSession) -> None:
     services = await list_services(session)
     items = [(s.id, s.name) for s in services]
     await state.set_state(BookingStates.choosing_service)
-    await _safe_edit_text(call.message, "Шаг 2/5: выбери услугу:", reply_markup=services_kb(items))
+    await safe_edit_text(call.message, "Шаг 2/5: выбери услугу:", reply_markup=services_kb(items))
     await call.answer()
 
 
-@router.callback_query(F.data.startswith("bk:service:"))
-async def choose_service(call: CallbackQuery, state: FSMContext, config: Config) -> None:
-    service_id = int(call.data.split(":")[-1])
-    await state.update_data(service_id=service_id)
+@router.callback_query(ServicePick.filter())
+async def choose_service(call: CallbackQuery, callback_data: ServicePick, state: FSMContext, config: Config) -> None:
+    await state.update_data(service_id=callback_data.service_id)
 
     today = dt.datetime.now(tz=config.tz).date()
     await state.set_state(BookingStates.choosing_date)
-    await _safe_edit_text(call.message, "Шаг 3/5: выбери дату:", reply_markup=calendar_14d_kb(today))
+    await safe_edit_text(call.message, "Шаг 3/5: выбери дату:", reply_markup=calendar_14d_kb(today))
     await call.answer()
 
 
-@router.callback_query(F.data == "bk:back:masters")
+@router.callback_query(BookingNav.filter(F.action == BookingAction.back_masters))
 async def back_to_masters(call: CallbackQuery, state: FSMContext, session: AsyncSession) -> None:
     masters = await list_masters(session)
     items = [(m.id, m.name) for m in masters]
     await state.set_state(BookingStates.choosing_master)
-    await _safe_edit_text(call.message, "Шаг 1/4: выбери мастера:", reply_markup=masters_kb(items))
+    await safe_edit_text(call.message, "Шаг 1/4: выбери мастера:", reply_markup=masters_kb(items))
     await call.answer()
 
 
-@router.callback_query(F.data.startswith("bk:date:"))
-async def choose_date(call: CallbackQuery, state: FSMContext, config: Config, session: AsyncSession) -> None:
+@router.callback_query(DatePick.filter())
+async def choose_date(
+    call: CallbackQuery, callback_data: DatePick, state: FSMContext, config: Config, session: AsyncSession
+) -> None:
     data = await state.get_data()
     master_id = int(data["master_id"])
     service_id = int(data["service_id"])
 
-    date_ = dt.date.fromisoformat(call.data.split(":")[-1])
+    date_ = callback_data.date
 
     slot_settings = SlotSettings(
         tz=config.tz,
@@ -165,7 +171,7 @@ async def choose_date(call: CallbackQuery, state: FSMContext, config: Config, se
     except ValueError as e:
         today = dt.datetime.now(tz=config.tz).date()
         await state.set_state(BookingStates.choosing_date)
-        await _safe_edit_text(call.message, f"⚠️ {e}\n\nВыбери другую дату:", reply_markup=calendar_14d_kb(today))
+        await safe_edit_text(call.message, f"⚠️ {e}\n\nВыбери другую дату:", reply_markup=calendar_14d_kb(today))
         await call.answer()
         return
     await state.update_data(date=date_.isoformat())
@@ -173,26 +179,27 @@ async def choose_date(call: CallbackQuery, state: FSMContext, config: Config, se
 
     if not free:
         today = dt.datetime.now(tz=config.tz).date()
-        await _safe_edit_text(call.message, "Свободных окон нет. Выбери другую дату:", reply_markup=calendar_14d_kb(today))
+        await safe_edit_text(call.message, "Свободных окон нет. Выбери другую дату:", reply_markup=calendar_14d_kb(today))
         await call.answer()
         return
 
-    await _safe_edit_text(call.message, "Шаг 4/5: выбери время:", reply_markup=time_slots_kb(free, config.tz))
+    await safe_edit_text(call.message, "Шаг 4/5: выбери время:", reply_markup=time_slots_kb(free, config.tz))
     await call.answer()
 
 
-@router.callback_query(F.data == "bk:back:dates")
+@router.callback_query(BookingNav.filter(F.action == BookingAction.back_dates))
 async def back_to_dates(call: CallbackQuery, state: FSMContext, config: Config) -> None:
     await state.set_state(BookingStates.choosing_date)
     today = dt.datetime.now(tz=config.tz).date()
-    await _safe_edit_text(call.message, "Шаг 3/5: выбери дату:", reply_markup=calendar_14d_kb(today))
+    await safe_edit_text(call.message, "Шаг 3/5: выбери дату:", reply_markup=calendar_14d_kb(today))
     await call.answer()
 
 
-@router.callback_query(F.data.startswith("bk:time:"))
-async def choose_time(call: CallbackQuery, state: FSMContext, config: Config, session: AsyncSession) -> None:
-    iso = call.data.split("bk:time:", 1)[1]
-    when = dt.datetime.fromisoformat(iso)
+@router.callback_query(TimePick.filter())
+async def choose_time(
+    call: CallbackQuery, callback_data: TimePick, state: FSMContext, config: Config, session: AsyncSession
+) -> None:
+    when = callback_data.when
 
     data = await state.get_data()
     master_id = int(data["master_id"])
@@ -209,11 +216,11 @@ async def choose_time(call: CallbackQuery, state: FSMContext, config: Config, se
         f"Мастер: {master_name}\n"
         f"Дата/время: {when.astimezone(config.tz).strftime('%d.%m.%Y %H:%M')}"
     )
-    await _safe_edit_text(call.message, text, reply_markup=confirm_kb())
+    await safe_edit_text(call.message, text, reply_markup=confirm_kb())
     await call.answer()
 
 
-@router.callback_query(F.data == "bk:back:times")
+@router.callback_query(BookingNav.filter(F.action == BookingAction.back_times))
 async def back_to_times(call: CallbackQuery, state: FSMContext, config: Config, session: AsyncSession) -> None:
     data = await state.get_data()
     master_id = int(data["master_id"])
@@ -233,16 +240,16 @@ async def back_to_times(call: CallbackQuery, state: FSMContext, config: Config,
     except ValueError as e:
         today = dt.datetime.now(tz=config.tz).date()
         await state.set_state(BookingStates.choosing_date)
-        await _safe_edit_text(call.message, f"⚠️ {e}\n\nВыбери дату:", reply_markup=calendar_14d_kb(today))
+        await safe_edit_text(call.message, f"⚠️ {e}\n\nВыбери дату:", reply_markup=calendar_14d_kb(today))
         await call.answer()
         return
 
     await state.set_state(BookingStates.choosing_time)
-    await _safe_edit_text(call.message, "Шаг 3/4: выбери время:", reply_markup=time_slots_kb(free, config.tz))
+    await safe_edit_text(call.message, "Шаг 3/4: выбери время:", reply_markup=time_slots_kb(free, config.tz))
     await call.answer()
 
 
-@router.callback_query(F.data == "bk:confirm")
+@router.callback_query(BookingNav.filter(F.action == BookingAction.confirm))
 async def confirm(call: CallbackQuery, state: FSMContext, config: Config, session: AsyncSession) -> None:
     # Если пользователь пришёл без /start, FK на appointments упадёт.
     await add_user(session, tg_id=call.from_user.id, username=call.from_user.username)
@@ -258,6 +265,7 @@ async def confirm(call: CallbackQuery, state: FSMContext, config: Config, sessio
         master_id = master_id,
         service_id = service_id,
         starts_at = starts_at,
+        pay_url_base = config.payment_dummy_url,
     )
     if not created:
         # await call.message.edit_text("⚠️ Слот пересекается с другой записью (ACID/EXCLUDE). Выбери другое время.")
@@ -285,7 +293,7 @@ async def confirm(call: CallbackQuery, state: FSMContext, config: Config, sessio
         if not free:
             today = dt.datetime.now(tz=config.tz).date()
             await state.set_state(BookingStates.choosing_date)
-            await _safe_edit_text(call.message,
+            await safe_edit_text(call.message,
                 "⚠️ Этот слот уже занят.\n"
                 "На выбранную дату свободных окон больше нет.\n\n"
                 "Выбери другую дату:",
@@ -293,7 +301,7 @@ async def confirm(call: CallbackQuery, state: FSMContext, config: Config, sessio
             )
         else:
             await state.set_state(BookingStates.choosing_time)
-            await _safe_edit_text(call.message,
+            await safe_edit_text(call.message,
                 "⚠️ Этот слот уже занят (или зарезервирован). Выбери другое время:",
                 reply_markup=time_slots_kb(free, config.tz),
             )
@@ -303,7 +311,7 @@ async def confirm(call: CallbackQuery, state: FSMContext, config: Config, sessio
     appt, payment = created
     await session.commit()
     await state.clear()
-    await _safe_edit_text(call.message,
+    await safe_edit_text(call.message,
         "✅ Почти готово!\n"
         "Оплати, чтобы подтвердить запись.\n\n"
         f"{starts_at.astimezone(config.tz).strftime('%d.%m.%Y %H:%M')}",
@@ -312,77 +320,145 @@ async def confirm(call: CallbackQuery, state: FSMContext, config: Config, sessio
 
     await call.answer()
 
-@router.callback_query(F.data.startswith("pay:done:"))
-async def pay_done(call: CallbackQuery, config: Config, session: AsyncSession) -> None:
-    payment_id = int(call.data.split(":")[-1])
+@router.callback_query(PayCb.filter(F.action == PayAction.done))
+async def pay_done(call: CallbackQuery, callback_data: PayCb, config: Config, session: AsyncSession) -> None:
+    payment_id = callback_data.payment_id
 
-    appt = await mark_payment_paid_and_activate_appointment(
-        session=session,
-        payment_id=payment_id,
-        user_id=call.from_user.id,
-    )
-    if not appt:
-        await call.answer("Не удалось подтвердить оплату.", show_alert=True)
-        return
-
-    await session.commit()
+    if config.payment_webhook_secret:
+        # оплату подтверждает вебхук провайдера (app.workers.payments) — кнопка только проверяет статус
+        state = await get_payment_confirmation(session, payment_id=payment_id, user_id=call.from_user.id)
+        if state is None:
+            await call.answer("Не удалось подтвердить оплату.", show_alert=True)
+            return
+        status, appt = state
+        if status == "pending":
+            await call.answer("Оплата ещё не поступила — проверь через минуту.", show_alert=True)
+            return
+        if status != "paid" or appt.status != "active":
+            await call.answer("Оплата не прошла, запись не подтверждена.", show_alert=True)
+            return
+    else:
+        appt = await mark_payment_paid_and_activate_appointment(
+            session=session,
+            payment_id=payment_id,
+            user_id=call.from_user.id,
+        )
+        if not appt:
+            await call.answer("Не удалось подтвердить оплату.", show_alert=True)
+            return
+        await session.commit()
 
-    await _safe_edit_text(call.message,
+    await call.answer(
         "✅ Оплата принята, запись подтверждена!\n"
-        f"{appt.starts_at.astimezone(config.tz).strftime('%d.%m.%Y %H:%M')}"
+        f"{appt.starts_at.astimezone(config.tz).strftime('%d.%m.%Y %H:%M')}",
+        show_alert=True,
     )
-    await call.answer()
+    # кнопка — в списке "Мои записи" (или под только что созданной записью): показываем список с ней
+    text, kb = await _render_my_appointments(session, call.from_user.id, config)
+    await safe_edit_text(call.message, text, reply_markup=kb)
 
 
-@router.message(F.text == "👤 Мои записи")
-async def my_appointments(message: Message, config: Config, session: AsyncSession) -> None:
-    now = dt.datetime.now(tz=config.tz)
-    appts = await get_future_appointments(session, user_id=message.from_user.id, now=now)
+MY_APPOINTMENTS_PAGE = 5
 
-    if not appts:
-        await message.answer("У тебя нет будущих записей.")
-        return
 
-    await message.answer("Твои будущие записи:")
+def _cursor(a) -> tuple[int, int]:
+    return int(a.starts_at.timestamp()), a.id
+
 
-    for a in appts:
+async def _render_my_appointments(
+    session: AsyncSession,
+    user_id: int,
+    config: Config,
+    page: int = 1,
+    after: tuple[dt.datetime, int] | None = None,
+    before: tuple[dt.datetime, int] | None = None,
+) -> tuple[str, InlineKeyboardMarkup | None]:
+    """Одна страница "Мои записи": текст списка + кнопки по каждой записи и листание."""
+    now = dt.datetime.now(tz=config.tz)
+    appts = await get_future_appointments(
+        session, user_id=user_id, now=now, after=after, before=before, limit=MY_APPOINTMENTS_PAGE + 1
+    )
+    # лишняя запись показывает, есть ли ещё страница в направлении листания
+    if before is not None:
+        has_prev, has_next = len(appts) > MY_APPOINTMENTS_PAGE, True
+        appts = appts[-MY_APPOINTMENTS_PAGE:]
+    else:
+        has_prev, has_next = after is not None, len(appts) > MY_APPOINTMENTS_PAGE
+        appts = appts[:MY_APPOINTMENTS_PAGE]
+    if not has_prev:
+        page = 1
+
+    if not appts:
+        if page > 1 or has_prev:
+            # страница опустела (записи отменили) — начинаем сначала
+            return await _render_my_appointments(session, user_id, config)
+        return "У тебя нет будущих записей.", None
+
+    first = (page - 1) * MY_APPOINTMENTS_PAGE + 1
+    lines = ["Твои будущие записи:", ""]
+    items = []
+    for n, a in enumerate(appts, start=first):
         when = a.starts_at.astimezone(config.tz).strftime("%d.%m %H:%M")
         master = a.master.name if a.master else str(a.master_id)
         service = a.service.name if a.service else str(a.service_id)
-
         if a.status == "pending_payment":
-            pay_url = a.payment.pay_url if a.payment else None
-            pay_id = a.payment_id
-            text = f"🕒 {when} — {master} — {service}\n⚠️ Ожидает оплаты"
-            if pay_id is None:
-                # на всякий случай, чтобы не падать
-                await message.answer(text)
-            else:
-                await message.answer(text, reply_markup=pay_kb(pay_url, pay_id))
+            lines.append(f"{n}. 🕒 {when} — {master} — {service}\n    ⚠️ Ожидает оплаты")
         else:
-            label = f"{when} — {master} — {service}"
-            await message.answer(
-                f"✅ {label}",
-                reply_markup=my_appointments_kb([(a.id, label)]),
-            )
+            lines.append(f"{n}. ✅ {when} — {master} — {service}")
+        if a.status == "pending_payment" and a.payment_id is not None:
+            items.append((n, a.id, a.payment_id, a.payment.pay_url if a.payment else None))
+        else:
+            items.append((n, a.id, None, None))
 
+    kb = my_appointments_kb(
+        items,
+        page=page,
+        prev_cursor=_cursor(appts[0]) if has_prev else None,
+        next_cursor=_cursor(appts[-1]) if has_next else None,
+    )
+    return "\n".join(lines), kb
 
 
+@router.message(F.text == "👤 Мои записи")
+async def my_appointments(message: Message, config: Config, session: AsyncSession) -> None:
+    # весь список — одно сообщение; листание и отмена правят его на месте
+    text, kb = await _render_my_appointments(session, message.from_user.id, config)
+    await message.answer(text, reply_markup=kb)
+
+
+@router.callback_query(MyPage.filter())
+async def my_appointments_page(
+    call: CallbackQuery, callback_data: MyPage, config: Config, session: AsyncSession
+) -> None:
+    key = callback_data.key
+    text, kb = await _render_my_appointments(
+        session,
+        call.from_user.id,
+        config,
+        page=callback_data.page,
+        after=key if callback_data.forward else None,
+        before=None if callback_data.forward else key,
+    )
+    await safe_edit_text(call.message, text, reply_markup=kb)
+    await call.answer()
+
 
-@router.callback_query(F.data.startswith("bk:cancel_appt:"))
-async def cancel_appt(call: CallbackQuery, session: AsyncSession) -> None:
-    appt_id = int(call.data.split(":")[-1])
+@router.callback_query(CancelAppt.filter())
+async def cancel_appt(call: CallbackQuery, callback_data: CancelAppt, config: Config, session: AsyncSession) -> None:
+    appt_id = callback_data.appt_id
     ok = await cancel_appointment(session, user_id=call.from_user.id, appointment_id=appt_id)
     if ok:
         await session.commit()
         await call.answer("Отменено ✅", show_alert=True)
-        await _safe_edit_text(call.message, "✅ Запись отменена.")
+        # кнопка живёт в списке "Мои записи" — обновляем его на месте
+        text, kb = await _render_my_appointments(session, call.from_user.id, config)
+        await safe_edit_text(call.message, text, reply_markup=kb)
     else:
         await call.answer("Не получилось отменить (возможно уже отменено).", show_alert=True)
 
-@router.callback_query(F.data.startswith("pay:cancel:"))
-async def pay_cancel(call: CallbackQuery, session: AsyncSession) -> None:
-    payment_id = int(call.data.split(":")[-1])
+@router.callback_query(PayCb.filter(F.action == PayAction.cancel))
+async def pay_cancel(call: CallbackQuery, callback_data: PayCb, config: Config, session: AsyncSession) -> None:
+    payment_id = callback_data.payment_id
 
     from app.database.requests import cancel_payment_and_cancel_appointment
     ok = await cancel_payment_and_cancel_appointment(
@@ -395,5 +471,13 @@ async def pay_cancel(call: CallbackQuery, session: AsyncSession) -> None:
         return
 
     await session.commit()
-    await _safe_edit_text(call.message, "❌ Оплата отменена, бронь снята.")
-    await call.answer()
+    await call.answer("❌ Оплата отменена, бронь снята.", show_alert=True)
+    # как cancel_appt: список "Мои записи" обновляется на месте, а не затирается одной строкой
+    text, kb = await _render_my_appointments(session, call.from_user.id, config)
+    await safe_edit_text(call.message, text, reply_markup=kb)
+
+
+@router.callback_query(F.data.startswith(LEGACY_PREFIXES))
+async def stale_button(call: CallbackQuery) -> None:
+    # кнопки сообщений, отправленных до смены формата callback_data
+    await call.answer("Кнопка устарела — открой меню заново.", show_alert=True)
@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import io
+import json
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Any
+
+# CSV: одна таблица, вид строки — в колонке kind; для hours/break/day_off/assign name — имя мастера,
+# у day_off description — причина, у holiday — название. template: description — дни цикла через пробел
+# ("10:00-20:00 10:00-20:00 - -"), start/end — перерыв; assign: description — шаблон ("-" — снять), date — якорь
+CSV_COLUMNS = ("kind", "name", "description", "duration_minutes", "price", "weekday", "start", "end", "date")
+NAME_MAX = 80  # masters.name / services.name — String(80)
+PRICE_MAX = 10_000_000  # рублей; services.price_cents — INTEGER
+CYCLE_MAX = 62
+# якорь по умолчанию — понедельник: у 7-дневного шаблона день 0 — пн, у 14-дневного — пн нечётной недели
+DEFAULT_ANCHOR = dt.date(2024, 1, 1)
+
+
+@dataclass(frozen=True)
+class MasterRow:
+    name: str
+    description: str | None
+
+
+@dataclass(frozen=True)
+class ServiceRow:
+    name: str
+    description: str | None
+    duration_minutes: int
+    price_cents: int
+
+
+@dataclass(frozen=True)
+class IntervalRow:
+    """Рабочие часы или перерыв мастера в день недели (0=пн ... 6=вс)."""
+    master: str
+    weekday: int
+    start: dt.time
+    end: dt.time
+
+
+@dataclass(frozen=True)
+class DayOffRow:
+    master: str
+    date: dt.date
+    reason: str | None
+
+
+@dataclass(frozen=True)
+class TemplateRow:
+    """Цикл дней: элемент — (начало, конец) или None (выходной)."""
+    name: str
+    days: tuple[tuple[dt.time, dt.time] | None, ...]
+    breaks: tuple[tuple[dt.time, dt.time], ...]
+
+
+@dataclass(frozen=True)
+class AssignRow:
+    """Мастер работает по шаблону с даты-якоря; template=None — снять шаблон (снова часы по дням недели)."""
+    master: str
+    template: str | None
+    anchor: dt.date
+
+
+@dataclass(frozen=True)
+class HolidayRow:
+    date: dt.date
+    name: str | None
+
+
+@dataclass
+class ImportPlan:
+    masters: list[MasterRow] = field(default_factory=list)
+    services: list[ServiceRow] = field(default_factory=list)
+    hours: list[IntervalRow] = field(default_factory=list)
+    breaks: list[IntervalRow] = field(default_factory=list)
+    days_off: list[DayOffRow] = field(default_factory=list)
+    templates: list[TemplateRow] = field(default_factory=list)
+    assignments: list[AssignRow] = field(default_factory=list)
+    holidays: list[HolidayRow] = field(default_factory=list)
+
+    def referenced_masters(self) -> set[str]:
+        """Мастера из расписания, которых нет в самом файле — они должны уже быть в БД."""
+        named = {m.name for m in self.masters}
+        rows = [*self.hours, *self.breaks, *self.days_off, *self.assignments]
+        return {r.master for r in rows} - named
+
+    def referenced_templates(self) -> set[str]:
+        """Шаблоны, назначенные мастерам, но не описанные в файле — они должны уже быть в БД."""
+        named = {t.name for t in self.templates}
+        return {a.template for a in self.assignments if a.template is not None} - named
+
+
+class _Rows:
+    """Накопитель: ошибки копятся с указанием строки, а не обрывают разбор — админ видит все сразу."""
+
+    def __init__(self) -> None:
+        self.plan = ImportPlan()
+        self.errors: list[str] = []
+        self._seen: set[tuple] = set()
+
+    def error(self, where: str, msg: str) -> None:
+        self.errors.append(f"{where}: {msg}")
+
+    def unique(self, where: str, key: tuple, what: str) -> bool:
+        if key in self._seen:
+            self.error(where, f"{what} повторяется")
+            return False
+        self._seen.add(key)
+        return True
+
+    @staticmethod
+    def _text(value: Any) -> str | None:
+        value = "" if value is None else str(value).strip()
+        return value or None
+
+    def _name(self, where: str, value: Any) -> str | None:
+        name = self._text(value)
+        if name is None:
+            self.error(where, "не указано имя")
+        elif len(name) > NAME_MAX:
+            self.error(where, f"имя длиннее {NAME_MAX} символов")
+        else:
+            return name
+        return None
+
+    def _int(self, where: str, value: Any, what: str, lo: int, hi: int | None = None) -> int | None:
+        try:
+            n = int(str(value).strip())
+        except (TypeError, ValueError):
+            self.error(where, f"{what}: ожидается целое число")
+            return None
+        if n < lo or (hi is not None and n > hi):
+            self.error(where, f"{what}: {n} вне диапазона")
+            return None
+        return n
+
+    def _time(self, where: str, value: Any, what: str) -> dt.time | None:
+        try:
+            return dt.time.fromisoformat(str(value).strip())
+        except (TypeError, ValueError):
+            self.error(where, f"{what}: ожидается время ЧЧ:ММ")
+            return None
+
+    def _span(self, where: str, value: Any, what: str) -> tuple[dt.time, dt.time] | None:
+        start, sep, end = str(value).partition("-")
+        try:
+            span = dt.time.fromisoformat(start.strip()), dt.time.fromisoformat(end.strip())
+        except ValueError:
+            self.error(where, f"{what}: ожидается интервал ЧЧ:ММ-ЧЧ:ММ")
+            return None
+        if span[0] >= span[1]:
+            self.error(where, f"{what}: начало должно быть раньше конца")
+            return None
+        return span
+
+    def _date(self, where: str, value: Any, what: str) -> dt.date | None:
+        try:
+            return dt.date.fromisoformat(str(value).strip())
+        except ValueError:
+            self.error(where, f"{what}: ожидается дата ГГГГ-ММ-ДД")
+            return None
+
+    def template(self, where: str, name: Any, days: list, breaks: list) -> None:
+        errors = len(self.errors)
+        name = self._name(where, name)
+        if not days or len(days) > CYCLE_MAX:
+            self.error(where, f"days: от 1 до {CYCLE_MAX} дней цикла")
+            return
+        cycle = [None if d in (None, "", "-") else self._span(where, d, f"days[{i}]") for i, d in enumerate(days)]
+        spans = [self._span(where, b, "breaks") for b in breaks]
+        if len(self.errors) > errors:
+            return
+        if all(d is None for d in cycle):
+            self.error(where, "в цикле нет ни одного рабочего дня")
+        elif self.unique(where, ("template", name), f"шаблон «{name}»"):
+            self.plan.templates.append(TemplateRow(name, tuple(cycle), tuple(spans)))
+
+    def assign(self, where: str, master: Any, template: Any, anchor: Any) -> None:
+        master = self._name(where, master)
+        template = self._text(template)
+        template = None if template == "-" else template
+        anchor = self._date(where, anchor, "anchor") if self._text(anchor) else DEFAULT_ANCHOR
+        if master and anchor and self.unique(where, ("assign", master), f"шаблон мастера «{master}»"):
+            self.plan.assignments.append(AssignRow(master, template, anchor))
+
+    def holiday(self, where: str, date_: Any, name: Any) -> None:
+        date_ = self._date(where, date_, "date")
+        if date_ and self.unique(where, ("holiday", date_), f"праздник {date_}"):
+            self.plan.holidays.append(HolidayRow(date_, self._text(name)))
+
+    def master(self, where: str, row: dict) -> None:
+        name = self._name(where, row.get("name"))
+        if name and self.unique(where, ("master", name), f"мастер «{name}»"):
+            self.plan.masters.append(MasterRow(name, self._text(row.get("description"))))
+
+    def service(self, where: str, row: dict) -> None:
+        name = self._name(where, row.get("name"))
+        duration = self._int(where, row.get("duration_minutes"), "duration_minutes", 1, 24 * 60)
+        try:
+            price = Decimal(str(row.get("price")).strip().replace(",", "."))
+            if not price.is_finite() or price < 0 or price > PRICE_MAX:
+                raise InvalidOperation
+        except InvalidOperation:
+            self.error(where, "price: ожидается цена в рублях")
+            price = None
+        if name and duration is not None and price is not None and self.unique(where, ("service", name), f"услуга «{name}»"):
+            self.plan.services.append(ServiceRow(name, self._text(row.get("description")), duration, int(price * 100)))
+
+    def interval(self, where: str, row: dict, kind: str) -> None:
+        master = self._name(where, row.get("master", row.get("name")))
+        weekday = self._int(where, row.get("weekday"), "weekday", 0, 6)
+        start = self._time(where, row.get("start"), "start")
+        end = self._time(where, row.get("end"), "end")
+        if None in (master, weekday, start, end):
+            return
+        if start >= end:
+            self.error(where, "start должен быть раньше end")
+            return
+        item = IntervalRow(master, weekday, start, end)
+        if kind == "hours":
+            if self.unique(where, ("hours", master, weekday), f"рабочие часы «{master}» в день {weekday}"):
+                self.plan.hours.append(item)
+        elif self.unique(where, ("break", master, weekday, start, end), "перерыв"):
+            self.plan.breaks.append(item)
+
+    def day_off(self, where: str, row: dict) -> None:
+        master = self._name(where, row.get("master", row.get("name")))
+        date_ = self._date(where, row.get("date"), "date")
+        if master and date_ and self.unique(where, ("day_off", master, date_), f"выходной «{master}» {date_}"):
+            self.plan.days_off.append(DayOffRow(master, date_, self._text(row.get("reason", row.get("description")))))
+
+    def add(self, where: str, kind: str, row: dict) -> None:
+        if kind == "master":
+            self.master(where, row)
+        elif kind == "service":
+            self.service(where, row)
+        elif kind in ("hours", "break"):
+            self.interval(where, row, kind)
+        elif kind == "day_off":
+            self.day_off(where, row)
+        elif kind == "template":
+            brk = [f"{row['start']}-{row['end']}"] if self._text(row.get("start")) or self._text(row.get("end")) else []
+            self.template(where, row.get("name"), (row.get("description") or "").split(), brk)
+        elif kind == "assign":
+            self.assign(where, row.get("name"), row.get("description"), row.get("date"))
+        elif kind == "holiday":
+            self.holiday(where, row.get("date"), row.get("description"))
+        else:
+            self.error(
+                where,
+                f"неизвестный вид строки {kind!r} (master, service, hours, break, day_off, template, assign, holiday)",
+            )
+
+
+def _from_json(data: Any, rows: _Rows) -> None:
+    """
+    {"masters": [{"name", "description", "working_hours": [{"weekday", "start", "end"}],
+                  "breaks": [...], "days_off": [{"date", "reason"}], "template", "anchor"}],
+     "services": [{"name", "description", "duration_minutes", "price"}],
+     "templates": [{"name", "days": ["10:00-20:00", null, ...], "breaks": ["14:00-15:00"]}],
+     "holidays": [{"date", "name"}]}
+    """
+    if not isinstance(data, dict):
+        rows.error("JSON", "ожидается объект с ключами masters, services, templates, holidays")
+        return
+    for i, t in enumerate(data.get("templates") or [], start=1):
+        if isinstance(t, dict) and isinstance(t.get("days"), list) and isinstance(t.get("breaks", []), list):
+            rows.template(f"templates[{i}]", t.get("name"), t["days"], t.get("breaks", []))
+        else:
+            rows.error(f"templates[{i}]", "ожидается объект со списками days и breaks")
+    for i, m in enumerate(data.get("masters") or [], start=1):
+        where = f"masters[{i}]"
+        if not isinstance(m, dict):
+            rows.error(where, "ожидается объект")
+            continue
+        rows.master(where, m)
+        name = rows._text(m.get("name"))
+        if "template" in m:
+            rows.assign(where, name, m["template"] or "-", m.get("anchor"))
+        for section, kind in (("working_hours", "hours"), ("breaks", "break"), ("days_off", "day_off")):
+            for j, item in enumerate(m.get(section) or [], start=1):
+                if isinstance(item, dict):
+                    rows.add(f"{where}.{section}[{j}]", kind, {**item, "master": name})
+                else:
+                    rows.error(f"{where}.{section}[{j}]", "ожидается объект")
+    for i, s in enumerate(data.get("services") or [], start=1):
+        if isinstance(s, dict):
+            rows.service(f"services[{i}]", s)
+        else:
+            rows.error(f"services[{i}]", "ожидается объект")
+    for i, h in enumerate(data.get("holidays") or [], start=1):
+        if isinstance(h, dict):
+            rows.holiday(f"holidays[{i}]", h.get("date"), h.get("name"))
+        else:
+            rows.error(f"holidays[{i}]", "ожидается объект")
+
+
+def _from_csv(text: str, rows: _Rows) -> None:
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(io.StringIO(text), dialect=dialect)
+    unknown = set(reader.fieldnames or ()) - set(CSV_COLUMNS)
+    if "kind" not in (reader.fieldnames or ()) or unknown:
+        rows.error("CSV", "ожидаются колонки " + ",".join(CSV_COLUMNS))
+        return
+    for row in reader:
+        rows.add(f"строка {reader.line_num}", (row.get("kind") or "").strip().lower(), row)
+
+
+def parse_import(content: bytes, filename: str = "") -> tuple[ImportPlan, list[str]]:
+    """Разобрать и проверить файл импорта (JSON или CSV) целиком; в БД ничего не пишется."""
+    rows = _Rows()
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return rows.plan, ["файл не в UTF-8"]
+    if filename.lower().endswith(".json") or text.lstrip().startswith("{"):
+        try:
+            _from_json(json.loads(text), rows)
+        except json.JSONDecodeError as e:
+            rows.error("JSON", str(e))
+    else:
+        _from_csv(text, rows)
+    plan = rows.plan
+    sections = (plan.masters, plan.services, plan.hours, plan.breaks, plan.days_off, plan.templates, plan.assignments, plan.holidays)
+    if not rows.errors and not any(sections):
+        rows.error("файл", "нечего импортировать")
+    return plan, rows.errors
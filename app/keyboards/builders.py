@@ -10,7 +10,30 @@ from aiogram.types import (
 )
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 
+from app.keyboards.cache import cached_keyboard
+from app.keyboards.callbacks import (
+    BookingAction,
+    BookingNav,
+    CancelAppt,
+    DatePick,
+    MasterPick,
+    MyPage,
+    PayAction,
+    PayCb,
+    ServicePick,
+    TimePick,
+    to_epoch_day,
+    to_epoch_minute,
+)
+
+_CANCEL = BookingNav(action=BookingAction.cancel).pack()
+
+# Статичные и полу-статичные клавиатуры строятся один раз на набор входов (см. keyboards.cache):
+# меню — навсегда, мастера/услуги — пока не поменялся каталог, календарь — пока не сменился день,
+# слоты — по (слоты, tz). Персональные (мои записи, оплата, админ-день) не кэшируются.
+
 
+@cached_keyboard(maxsize=1)
 def main_menu_kb() -> ReplyKeyboardMarkup:
     kb = ReplyKeyboardBuilder()
     kb.add(KeyboardButton(text="📅 Записаться"))
@@ -19,83 +42,184 @@ def main_menu_kb() -> ReplyKeyboardMarkup:
     return kb.as_markup(resize_keyboard=True)
 
 
+@cached_keyboard(maxsize=1)
 def admin_menu_kb() -> ReplyKeyboardMarkup:
     kb = ReplyKeyboardBuilder()
     kb.add(KeyboardButton(text="📋 Записи сегодня"))
+    kb.add(KeyboardButton(text="📊 Отчёт"))
     kb.add(KeyboardButton(text="➕ Добавить мастера"))
     kb.add(KeyboardButton(text="➕ Добавить услугу"))
     kb.add(KeyboardButton(text="⬅️ В меню"))
-    kb.adjust(2, 1)
+    kb.adjust(2, 2, 1)
     return kb.as_markup(resize_keyboard=True)
 
 
+@cached_keyboard(maxsize=1)
+def master_menu_kb() -> ReplyKeyboardMarkup:
+    kb = ReplyKeyboardBuilder()
+    kb.add(KeyboardButton(text="📋 Записи сегодня"))
+    kb.add(KeyboardButton(text="⬅️ В меню"))
+    kb.adjust(2)
+    return kb.as_markup(resize_keyboard=True)
+
+
+def admin_day_kb(
+    day: dt.date,
+    master_id: int | None,
+    masters: list[tuple[int, str]],
+    next_cursor: str | None = None,
+    filters: bool = True,
+) -> InlineKeyboardMarkup:
+    """
+    Навигация по дням, фильтр по мастеру и следующая страница дня (adm:day:<дата>:<master_id|0>:<курсор|->).
+    filters=False — без кнопок выбора мастера (мастер видит только свои записи).
+    """
+    mid = master_id or 0
+    prev_day, next_day = day - dt.timedelta(days=1), day + dt.timedelta(days=1)
+
+    b = InlineKeyboardBuilder()
+    b.row(
+        InlineKeyboardButton(text=f"◀️ {prev_day.strftime('%d.%m')}", callback_data=f"adm:day:{prev_day.isoformat()}:{mid}:-"),
+        InlineKeyboardButton(text="Сегодня", callback_data=f"adm:day:today:{mid}:-"),
+        InlineKeyboardButton(text=f"{next_day.strftime('%d.%m')} ▶️", callback_data=f"adm:day:{next_day.isoformat()}:{mid}:-"),
+    )
+    options = [(0, "Все мастера")] + masters if filters else []
+    buttons = [
+        InlineKeyboardButton(
+            text=f"• {name}" if option_id == mid else name,
+            callback_data=f"adm:day:{day.isoformat()}:{option_id}:-",
+        )
+        for option_id, name in options
+    ]
+    for i in range(0, len(buttons), 3):
+        b.row(*buttons[i:i + 3])
+    if next_cursor:
+        b.row(InlineKeyboardButton(
+            text="Дальше ➡️", callback_data=f"adm:day:{day.isoformat()}:{mid}:{next_cursor}"
+        ))
+    return b.as_markup()
+
+
+@cached_keyboard(maxsize=8)
+def admin_report_kb(month: dt.date) -> InlineKeyboardMarkup:
+    """Листание отчёта по месяцам (adm:rep:<YYYY-MM>); month — первое число месяца."""
+    prev_month = (month - dt.timedelta(days=1)).replace(day=1)
+    next_month = (month + dt.timedelta(days=32)).replace(day=1)
+    b = InlineKeyboardBuilder()
+    b.row(
+        InlineKeyboardButton(text=f"◀️ {prev_month.strftime('%m.%Y')}", callback_data=f"adm:rep:{prev_month:%Y-%m}"),
+        InlineKeyboardButton(text=f"{next_month.strftime('%m.%Y')} ▶️", callback_data=f"adm:rep:{next_month:%Y-%m}"),
+    )
+    return b.as_markup()
+
+
+@cached_keyboard(maxsize=2)
+def master_agenda_kb(view: str) -> InlineKeyboardMarkup:
+    """Записи мастера: сегодня / завтра (mst:ag:<today|tomorrow>); повторное нажатие обновляет вид."""
+    b = InlineKeyboardBuilder()
+    b.row(*(
+        InlineKeyboardButton(text=f"• {label}" if key == view else label, callback_data=f"mst:ag:{key}")
+        for key, label in (("today", "Сегодня"), ("tomorrow", "Завтра"))
+    ))
+    return b.as_markup()
+
+
+@cached_keyboard(maxsize=16)
 def masters_kb(masters: list[tuple[int, str]]) -> InlineKeyboardMarkup:
     b = InlineKeyboardBuilder()
     for master_id, name in masters:
-        b.add(InlineKeyboardButton(text=name, callback_data=f"bk:master:{master_id}"))
+        b.add(InlineKeyboardButton(text=name, callback_data=MasterPick(master_id=master_id).pack()))
     b.adjust(1)
-    b.row(InlineKeyboardButton(text="❌ Отмена", callback_data="bk:cancel"))
+    b.row(InlineKeyboardButton(text="❌ Отмена", callback_data=_CANCEL))
     return b.as_markup()
 
 
-def date_choice_kb() -> InlineKeyboardMarkup:
+@cached_keyboard(maxsize=4)
+def date_choice_kb(today: dt.date) -> InlineKeyboardMarkup:
     b = InlineKeyboardBuilder()
-    b.add(InlineKeyboardButton(text="Сегодня", callback_data="bk:date:today"))
-    b.add(InlineKeyboardButton(text="Завтра", callback_data="bk:date:tomorrow"))
+    b.add(InlineKeyboardButton(text="Сегодня", callback_data=DatePick(day=to_epoch_day(today)).pack()))
+    b.add(InlineKeyboardButton(text="Завтра", callback_data=DatePick(day=to_epoch_day(today) + 1).pack()))
     b.adjust(2)
-    b.row(InlineKeyboardButton(text="↩️ Назад", callback_data="bk:back:masters"))
-    b.row(InlineKeyboardButton(text="❌ Отмена", callback_data="bk:cancel"))
+    b.row(InlineKeyboardButton(text="↩️ Назад", callback_data=BookingNav(action=BookingAction.back_masters).pack()))
+    b.row(InlineKeyboardButton(text="❌ Отмена", callback_data=_CANCEL))
     return b.as_markup()
 
 
+@cached_keyboard(maxsize=256)
 def time_slots_kb(slots: list[dt.datetime], tz: dt.tzinfo) -> InlineKeyboardMarkup:
     b = InlineKeyboardBuilder()
     for when in slots[:48]:
         label = when.astimezone(tz).strftime("%H:%M")
-        payload = when.isoformat()
-        b.add(InlineKeyboardButton(text=label, callback_data=f"bk:time:{payload}"))
+        b.add(InlineKeyboardButton(text=label, callback_data=TimePick(minute=to_epoch_minute(when)).pack()))
     b.adjust(4)
-    b.row(InlineKeyboardButton(text="↩️ Назад", callback_data="bk:back:dates"))
-    b.row(InlineKeyboardButton(text="❌ Отмена", callback_data="bk:cancel"))
+    b.row(InlineKeyboardButton(text="↩️ Назад", callback_data=BookingNav(action=BookingAction.back_dates).pack()))
+    b.row(InlineKeyboardButton(text="❌ Отмена", callback_data=_CANCEL))
     return b.as_markup()
 
 
+@cached_keyboard(maxsize=1)
 def confirm_kb() -> InlineKeyboardMarkup:
     b = InlineKeyboardBuilder()
-    b.add(InlineKeyboardButton(text="✅ Подтвердить", callback_data="bk:confirm"))
-    b.add(InlineKeyboardButton(text="↩️ Назад", callback_data="bk:back:times"))
+    b.add(InlineKeyboardButton(text="✅ Подтвердить", callback_data=BookingNav(action=BookingAction.confirm).pack()))
+    b.add(InlineKeyboardButton(text="↩️ Назад", callback_data=BookingNav(action=BookingAction.back_times).pack()))
     b.adjust(2)
-    b.row(InlineKeyboardButton(text="❌ Отмена", callback_data="bk:cancel"))
+    b.row(InlineKeyboardButton(text="❌ Отмена", callback_data=_CANCEL))
     return b.as_markup()
 
 
-def my_appointments_kb(appts: list[tuple[int, str]]) -> InlineKeyboardMarkup:
+def my_appointments_kb(
+    items: list[tuple[int, int, int | None, str | None]],
+    page: int,
+    prev_cursor: tuple[int, int] | None = None,
+    next_cursor: tuple[int, int] | None = None,
+) -> InlineKeyboardMarkup:
+    """
+    items: (номер в списке, appointment_id, payment_id если ждёт оплаты, pay_url).
+    Курсоры (unix starts_at, id) крайних записей страницы — для листания без OFFSET.
+    """
     b = InlineKeyboardBuilder()
-    for appt_id, label in appts:
-        b.add(InlineKeyboardButton(text=f"❌ Отменить: {label}", callback_data=f"bk:cancel_appt:{appt_id}"))
-    b.adjust(1)
+    for n, appt_id, payment_id, pay_url in items:
+        if payment_id is None:
+            b.row(InlineKeyboardButton(text=f"❌ {n}. Отменить", callback_data=CancelAppt(appt_id=appt_id).pack()))
+            continue
+        row = []
+        if pay_url:
+            row.append(InlineKeyboardButton(text=f"💳 {n}. Оплатить", url=pay_url))
+        row.append(InlineKeyboardButton(text=f"✅ {n}. Я оплатил", callback_data=PayCb(action=PayAction.done, payment_id=payment_id).pack()))
+        row.append(InlineKeyboardButton(text=f"❌ {n}. Отменить", callback_data=PayCb(action=PayAction.cancel, payment_id=payment_id).pack()))
+        b.row(*row)
+
+    nav = []
+    if prev_cursor:
+        nav.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=MyPage(page=page - 1, forward=False, at=prev_cursor[0], appt_id=prev_cursor[1]).pack()))
+    if next_cursor:
+        nav.append(InlineKeyboardButton(text="Дальше ➡️", callback_data=MyPage(page=page + 1, forward=True, at=next_cursor[0], appt_id=next_cursor[1]).pack()))
+    if nav:
+        b.row(*nav)
     return b.as_markup()
 
 
+@cached_keyboard(maxsize=16)
 def services_kb(services: list[tuple[int, str]]) -> InlineKeyboardMarkup:
     b = InlineKeyboardBuilder()
     for service_id, name in services:
-        b.add(InlineKeyboardButton(text=name, callback_data=f"bk:service:{service_id}"))
+        b.add(InlineKeyboardButton(text=name, callback_data=ServicePick(service_id=service_id).pack()))
     b.adjust(1)
-    b.row(InlineKeyboardButton(text="↩️ Назад", callback_data="bk:back:masters"))
-    b.row(InlineKeyboardButton(text="❌ Отмена", callback_data="bk:cancel"))
+    b.row(InlineKeyboardButton(text="↩️ Назад", callback_data=BookingNav(action=BookingAction.back_masters).pack()))
+    b.row(InlineKeyboardButton(text="❌ Отмена", callback_data=_CANCEL))
     return b.as_markup()
 
 
+@cached_keyboard(maxsize=4)
 def calendar_14d_kb(today: dt.date) -> InlineKeyboardMarkup:
     b = InlineKeyboardBuilder()
     for i in range(14):
         d = today + dt.timedelta(days=i)
         label = d.strftime("%d.%m (%a)")
-        b.add(InlineKeyboardButton(text=label, callback_data=f"bk:date:{d.isoformat()}"))
+        b.add(InlineKeyboardButton(text=label, callback_data=DatePick(day=to_epoch_day(d)).pack()))
     b.adjust(3)
-    b.row(InlineKeyboardButton(text="↩️ Назад", callback_data="bk:back:services"))
-    b.row(InlineKeyboardButton(text="❌ Отмена", callback_data="bk:cancel"))
+    b.row(InlineKeyboardButton(text="↩️ Назад", callback_data=BookingNav(action=BookingAction.back_services).pack()))
+    b.row(InlineKeyboardButton(text="❌ Отмена", callback_data=_CANCEL))
     return b.as_markup()
 
 
@@ -103,8 +227,8 @@ def pay_kb(pay_url: str | None, payment_id: int) -> InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
     if pay_url:
         kb.button(text="💳 Оплатить", url=pay_url)
-    kb.button(text="✅ Я оплатил", callback_data=f"pay:done:{payment_id}")
-    kb.button(text="❌ Отмена", callback_data=f"pay:cancel:{payment_id}")
+    kb.button(text="✅ Я оплатил", callback_data=PayCb(action=PayAction.done, payment_id=payment_id).pack())
+    kb.button(text="❌ Отмена", callback_data=PayCb(action=PayAction.cancel, payment_id=payment_id).pack())
     kb.adjust(1)
     return kb.as_markup()
 
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import functools
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, TypeVar
+
+from app.metrics import Counter
+
+T = TypeVar("T")
+
+CACHE_LOOKUPS = Counter("keyboard_cache_total", "Keyboard builder cache lookups", labels=("builder", "result"))
+
+
+def _freeze(value: Any) -> Hashable:
+    # списки (мастера/услуги/слоты) -> кортежи: ключом служит само содержимое каталога,
+    # так что после добавления мастера/услуги ключ меняется и инвалидировать ничего не нужно
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def cached_keyboard(maxsize: int = 128) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """
+    LRU-кэш разметки по аргументам билдера. Возвращается один и тот же объект разметки —
+    вызывающий не должен его менять (aiogram только сериализует её в запрос).
+    """
+
+    def decorator(fn: Callable[..., T]) -> Callable[..., T]:
+        cache: OrderedDict[Hashable, T] = OrderedDict()
+        name = fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            key = (_freeze(args), _freeze(tuple(sorted(kwargs.items()))))
+            try:
+                markup = cache[key]
+            except KeyError:
+                CACHE_LOOKUPS.inc(builder=name, result="miss")
+                markup = cache[key] = fn(*args, **kwargs)
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+                return markup
+            CACHE_LOOKUPS.inc(builder=name, result="hit")
+            cache.move_to_end(key)
+            return markup
+
+        wrapper.cache_clear = cache.clear  # type: ignore[attr-defined]
+        wrapper.cache_len = cache.__len__  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
@@ -0,0 +1,103 @@
+"""
+Компактные callback_data для записи (bk) и оплаты (pay).
+
+Telegram ограничивает callback_data 64 байтами, поэтому всё передаётся целыми числами:
+время слота — минуты от эпохи (UTC), дата — дни от эпохи, ид — как есть.
+Версия формата зашита в префикс ("b1…", "p1"): при смене набора полей префикс меняется
+на следующую версию, а кнопки старых сообщений попадают в обработчик устаревших кнопок,
+а не в разбор чужого формата.
+"""
+from __future__ import annotations
+
+import datetime as dt
+from enum import Enum
+
+from aiogram.filters.callback_data import CallbackData
+
+# старые текстовые форматы ("bk:time:<iso>", "pay:done:<id>" ...) — только чтобы ответить на такие кнопки
+LEGACY_PREFIXES = ("bk:", "pay:")
+
+_EPOCH = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+_EPOCH_DAY = _EPOCH.date()
+
+
+def to_epoch_minute(when: dt.datetime) -> int:
+    return int((when - _EPOCH).total_seconds()) // 60
+
+
+def from_epoch_minute(value: int) -> dt.datetime:
+    return _EPOCH + dt.timedelta(minutes=value)
+
+
+def to_epoch_day(day: dt.date) -> int:
+    return (day - _EPOCH_DAY).days
+
+
+def from_epoch_day(value: int) -> dt.date:
+    return _EPOCH_DAY + dt.timedelta(days=value)
+
+
+class BookingAction(str, Enum):
+    cancel = "x"
+    confirm = "ok"
+    back_masters = "m"
+    back_services = "s"
+    back_dates = "d"
+    back_times = "t"
+
+
+class BookingNav(CallbackData, prefix="b1"):
+    """Кнопки шагов записи без данных: отмена, подтверждение, "назад"."""
+
+    action: BookingAction
+
+
+class MasterPick(CallbackData, prefix="b1m"):
+    master_id: int
+
+
+class ServicePick(CallbackData, prefix="b1s"):
+    service_id: int
+
+
+class DatePick(CallbackData, prefix="b1d"):
+    day: int  # дни от эпохи
+
+    @property
+    def date(self) -> dt.date:
+        return from_epoch_day(self.day)
+
+
+class TimePick(CallbackData, prefix="b1t"):
+    minute: int  # минуты от эпохи, UTC
+
+    @property
+    def when(self) -> dt.datetime:
+        return from_epoch_minute(self.minute)
+
+
+class MyPage(CallbackData, prefix="b1p"):
+    """Листание "Мои записи": номер страницы, направление и ключ (starts_at, id) крайней записи."""
+
+    page: int
+    forward: bool
+    at: int  # unix-время starts_at
+    appt_id: int
+
+    @property
+    def key(self) -> tuple[dt.datetime, int]:
+        return dt.datetime.fromtimestamp(self.at, tz=dt.timezone.utc), self.appt_id
+
+
+class CancelAppt(CallbackData, prefix="b1c"):
+    appt_id: int
+
+
+class PayAction(str, Enum):
+    done = "d"
+    cancel = "c"
+
+
+class PayCb(CallbackData, prefix="p1"):
+    action: PayAction
+    payment_id: int
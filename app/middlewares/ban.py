@@ -1,13 +1,14 @@
 from __future__ import annotations
 
-from typing import Any, Awaitable, Callable
+from typing import Any, Awaitable, Callable, Container
 
 from aiogram import BaseMiddleware
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import CallbackQuery, Message, Update
 
 
 class BanMiddleware(BaseMiddleware):
-    def __init__(self, banned_ids: set[int]):
+    def __init__(self, banned_ids: Container[int]):
+        # обычно app.bans.BanList — живое множество, которое обновляется через Redis pub/sub
         self._banned = banned_ids
 
     async def __call__(
@@ -16,17 +17,16 @@ class BanMiddleware(BaseMiddleware):
         event: Any,
         data: dict[str, Any],
     ) -> Any:
-        user_id = None
-        if isinstance(event, Message) and event.from_user:
-            user_id = event.from_user.id
-        elif isinstance(event, CallbackQuery) and event.from_user:
-            user_id = event.from_user.id
+        # middleware висит на dp.update: event — Update, сам Message/CallbackQuery лежит внутри
+        inner = event.event if isinstance(event, Update) else event
+        user = data.get("event_from_user")
+        user_id = user.id if user else None
 
         if user_id is not None and user_id in self._banned:
-            if isinstance(event, Message):
-                await event.answer("⛔️ Вы заблокированы.")
-            elif isinstance(event, CallbackQuery):
-                await event.answer("⛔️ Вы заблокированы.", show_alert=True)
+            if isinstance(inner, Message):
+                await inner.answer("⛔️ Вы заблокированы.")
+            elif isinstance(inner, CallbackQuery):
+                await inner.answer("⛔️ Вы заблокированы.", show_alert=True)
             return
 
         return await handler(event, data)
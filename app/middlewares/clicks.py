@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject, Update
+
+from app.metrics import Counter
+
+CLICKS_COALESCED = Counter(
+    "callback_clicks_coalesced_total", "Callback updates dropped while the same message was busy", labels=("reason",)
+)
+
+
+@dataclass
+class _Busy:
+    data: str | None                       # callback, который сейчас обрабатывается
+    next: asyncio.Future | None = None     # следующий (другой) callback этого сообщения ждёт здесь
+    next_data: str | None = None
+
+
+class ClickCoalescingMiddleware(BaseMiddleware):
+    """
+    Пока обрабатывается нажатие кнопки сообщения (chat_id, message_id), новые нажатия на это сообщение
+    не запускают хендлер параллельно:
+    - та же кнопка (тот же callback_data) — дубль, отбрасывается;
+    - другая кнопка — ждёт окончания текущей; если за это время нажали ещё одну, ждущая вытесняется
+      новой (выполняется только последнее нажатие, как с правками в app/outbound.py).
+    Отброшенным нажатиям отвечаем пустым answer(), чтобы на кнопке не крутились часики.
+
+    Регистрируется outer middleware раньше BufferedFSMMiddleware: ждущее нажатие читает FSM
+    уже после того, как предыдущее записало свои изменения, а не снимок до них.
+
+    Состояние в памяти процесса: апдейты одного чата всегда приходят в один процесс.
+    В webhook-режиме апдейты чата и так идут строго по очереди (ChatSerializer), поэтому
+    там дубли доходят до хендлера, а лишние правки отсекает safe_edit_text.
+    """
+
+    def __init__(self) -> None:
+        self._busy: dict[tuple[int, int], _Busy] = {}
+
+    def __len__(self) -> int:
+        return len(self._busy)
+
+    def _release(self, key: tuple[int, int]) -> None:
+        busy = self._busy.pop(key)
+        if busy.next is not None and not busy.next.done():
+            # сообщение переходит к ждущему нажатию
+            self._busy[key] = _Busy(busy.next_data)
+            busy.next.set_result(True)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        call = event.callback_query if isinstance(event, Update) else event
+        if not isinstance(call, CallbackQuery) or call.message is None:
+            return await handler(event, data)
+
+        key = (call.message.chat.id, call.message.message_id)
+        busy = self._busy.get(key)
+        if busy is None:
+            self._busy[key] = _Busy(call.data)
+        else:
+            if call.data in (busy.data, busy.next_data):
+                CLICKS_COALESCED.inc(reason="duplicate")
+                await call.answer()
+                return None
+            if busy.next is not None and not busy.next.done():
+                busy.next.set_result(False)
+            turn = busy.next = asyncio.get_running_loop().create_future()
+            busy.next_data = call.data
+            try:
+                ours = await turn
+            except asyncio.CancelledError:
+                if turn.done() and not turn.cancelled() and turn.result():
+                    # очередь уже перешла к нам — передаём её дальше
+                    self._release(key)
+                raise
+            if not ours:
+                CLICKS_COALESCED.inc(reason="superseded")
+                await call.answer()
+                return None
+
+        try:
+            return await handler(event, data)
+        finally:
+            self._release(key)
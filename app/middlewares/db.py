@@ -3,13 +3,53 @@ from __future__ import annotations
 from typing import Any, Awaitable, Callable, Dict
 
 from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.handler import HandlerObject
 from aiogram.types import TelegramObject
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from app.database.instrumentation import assert_query_budget, report_query_stats, track_queries
+
 
 class DbSessionMiddleware(BaseMiddleware):
-    def __init__(self, sessionmaker: async_sessionmaker[AsyncSession]) -> None:
+    def __init__(
+        self,
+        sessionmaker: async_sessionmaker[AsyncSession],
+        max_statements: int = 10,
+        slow_ms: int = 200,
+        strict_budgets: bool = False,
+    ) -> None:
         self.sessionmaker = sessionmaker
+        self.max_statements = max_statements
+        self.slow_ms = slow_ms
+        # strict: падать (QueryBudgetExceeded), если хендлер вышел за QUERY_BUDGETS — для тестов
+        self.strict_budgets = strict_budgets
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        with track_queries() as stats:
+            data["query_stats"] = stats
+            async with self.sessionmaker() as session:
+                data["session"] = session
+                try:
+                    result = await handler(event, data)
+                    if self.strict_budgets:
+                        # до commit: перерасход откатывает записи хендлера, как любая другая ошибка
+                        assert_query_budget(stats)
+                    await session.commit()
+                except Exception:
+                    await session.rollback()
+                    raise
+                finally:
+                    report_query_stats(stats, max_statements=self.max_statements, slow_ms=self.slow_ms)
+        return result
+
+
+class HandlerTagMiddleware(BaseMiddleware):
+    """Inner middleware: подписывает статистику SQL именем сработавшего хендлера."""
 
     async def __call__(
         self,
@@ -17,12 +57,8 @@ class DbSessionMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any],
     ) -> Any:
-        async with self.sessionmaker() as session:
-            data["session"] = session
-            try:
-                result = await handler(event, data)
-                await session.commit()
-                return result
-            except Exception:
-                await session.rollback()
-                raise
+        stats = data.get("query_stats")
+        handler_obj: HandlerObject | None = data.get("handler")
+        if stats is not None and handler_obj is not None:
+            stats.handler = getattr(handler_obj.callback, "__name__", None)
+        return await handler(event, data)
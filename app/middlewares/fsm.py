@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import Any, Awaitable, Callable
+
+from aiogram import Bot
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.middleware import FSMContextMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import DEFAULT_DESTINY, BaseEventIsolation, BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.types import TelegramObject
+
+from app.metrics import Counter
+
+FSM_FLUSHES = Counter("fsm_flush_total", "FSM write-backs per update", labels=("result",))
+
+
+class BufferedFSMContext(FSMContext):
+    """
+    FSMContext поверх локальной копии: состояние и данные читаются один раз на апдейт (middleware),
+    get/set/update хендлеров меняют только копию, а в хранилище она пишется одним заходом в flush().
+    """
+
+    def __init__(self, storage: BaseStorage, key: StorageKey) -> None:
+        super().__init__(storage, key)
+        self._state: str | None = None
+        self._data: dict[str, Any] = {}
+        self._dirty = False
+
+    def _loaded(self, state: str | None, data: dict[str, Any]) -> None:
+        self._state, self._data, self._dirty = state, data, False
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    async def set_state(self, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        if value != self._state:
+            self._state, self._dirty = value, True
+
+    async def get_state(self) -> str | None:
+        return self._state
+
+    async def set_data(self, data: Mapping[str, Any]) -> None:
+        data = dict(data)
+        if data != self._data:
+            self._data, self._dirty = data, True
+
+    async def get_data(self) -> dict[str, Any]:
+        return dict(self._data)
+
+    async def get_value(self, key: str, default: Any | None = None) -> Any | None:
+        return self._data.get(key, default)
+
+    async def update_data(self, data: Mapping[str, Any] | None = None, **kwargs: Any) -> dict[str, Any]:
+        if data:
+            kwargs.update(data)
+        await self.set_data({**self._data, **kwargs})
+        return dict(self._data)
+
+
+class BufferedFSMMiddleware(FSMContextMiddleware):
+    """
+    Замена встроенного FSM middleware (Dispatcher(disable_fsm=True)): на апдейт — одно чтение
+    (MGET состояния и данных) и не больше одной записи (pipeline), и то только если хендлер что-то поменял.
+
+    ttls: префикс состояния ("BookingStates:") -> TTL в секундах. Ключи брошенных на полпути
+    сценариев истекают сами; состояние и данные пишутся с одним TTL, чтобы не пережить друг друга.
+    """
+
+    def __init__(
+        self,
+        storage: BaseStorage,
+        events_isolation: BaseEventIsolation,
+        ttls: Mapping[str, int] | None = None,
+    ) -> None:
+        super().__init__(storage, events_isolation)
+        self.ttls = dict(ttls or {})
+
+    def get_context(
+        self,
+        bot: Bot,
+        chat_id: int,
+        user_id: int,
+        thread_id: int | None = None,
+        business_connection_id: str | None = None,
+        destiny: str = DEFAULT_DESTINY,
+    ) -> BufferedFSMContext:
+        context = super().get_context(bot, chat_id, user_id, thread_id, business_connection_id, destiny)
+        return BufferedFSMContext(storage=context.storage, key=context.key)
+
+    def ttl_for(self, state: str | None) -> int | None:
+        if state is None:
+            return None
+        for prefix, ttl in self.ttls.items():
+            if state.startswith(prefix):
+                return ttl or None
+        return None
+
+    async def load(self, context: BufferedFSMContext) -> None:
+        storage = self.storage
+        if isinstance(storage, RedisStorage):
+            state, data = await storage.redis.mget(
+                storage.key_builder.build(context.key, "state"),
+                storage.key_builder.build(context.key, "data"),
+            )
+            if isinstance(state, bytes):
+                state = state.decode("utf-8")
+            if isinstance(data, bytes):
+                data = data.decode("utf-8")
+            context._loaded(state, storage.json_loads(data) if data else {})
+        else:
+            context._loaded(await storage.get_state(context.key), await storage.get_data(context.key))
+
+    async def flush(self, context: BufferedFSMContext) -> None:
+        if not context.dirty:
+            FSM_FLUSHES.inc(result="clean")
+            return
+        state, data = context._state, context._data
+        storage = self.storage
+        if isinstance(storage, RedisStorage):
+            ttl = self.ttl_for(state)
+            state_key = storage.key_builder.build(context.key, "state")
+            data_key = storage.key_builder.build(context.key, "data")
+            async with storage.redis.pipeline(transaction=True) as pipe:
+                if state is None:
+                    pipe.delete(state_key)
+                else:
+                    pipe.set(state_key, state, ex=ttl)
+                if data:
+                    pipe.set(data_key, storage.json_dumps(data), ex=ttl)
+                else:
+                    pipe.delete(data_key)
+                await pipe.execute()
+        else:
+            await storage.set_state(context.key, state)
+            await storage.set_data(context.key, data)
+        context._dirty = False
+        FSM_FLUSHES.inc(result="written")
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        context = self.resolve_event_context(data["bot"], data)
+        data["fsm_storage"] = self.storage
+        if context is None:
+            return await handler(event, data)
+        async with self.events_isolation.lock(key=context.key):
+            await self.load(context)
+            data.update({"state": context, "raw_state": context._state})
+            try:
+                return await handler(event, data)
+            finally:
+                # как и раньше, изменения FSM не откатываются, если хендлер упал после set_state
+                await self.flush(context)
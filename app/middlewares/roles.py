@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.roles import USER, RoleCache
+
+
+class RoleMiddleware(BaseMiddleware):
+    """
+    Кладёт в data["access"] роль автора апдейта (app.roles.Access) — хендлерам не нужен свой запрос.
+    Стоит до DbSessionMiddleware: промах кэша идёт своей короткой сессией и не попадает в бюджет хендлера.
+    """
+
+    def __init__(self, roles: RoleCache) -> None:
+        self.roles = roles
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        data["access"] = await self.roles.get(user.id) if user else USER
+        return await handler(event, data)
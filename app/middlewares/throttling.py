@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Container, Mapping
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject, Update
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.keyboards.callbacks import BookingAction, BookingNav, DatePick
+from app.metrics import Counter
+from app.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+THROTTLED = Counter("throttled_updates_total", "Updates dropped by per-user throttling", labels=("kind",))
+
+
+@dataclass(frozen=True)
+class Limit:
+    rate: float   # токенов в секунду
+    burst: float  # запас на серию быстрых нажатий
+
+
+# "slots" — кнопки, которые считают свободные слоты (самые тяжёлые запросы в боте)
+DEFAULT_LIMITS: Mapping[str, Limit] = {
+    "slots": Limit(rate=1.0, burst=3),
+    "callback": Limit(rate=2.0, burst=5),
+    "message": Limit(rate=1.0, burst=5),
+}
+
+_SLOT_PREFIXES = (DatePick.__prefix__ + ":", BookingNav(action=BookingAction.back_times).pack())
+
+
+def classify(event: TelegramObject) -> str | None:
+    """Класс лимита по самому апдейту: хендлер ещё не выбран, а сессию БД открывать не хотим."""
+    if isinstance(event, CallbackQuery):
+        return "slots" if (event.data or "").startswith(_SLOT_PREFIXES) else "callback"
+    if isinstance(event, Message):
+        return "message"
+    return None
+
+
+class MemoryThrottleStore:
+    """Bucket'ы в памяти процесса: точны, пока апдейты пользователя приходят в один процесс (polling, webhook по chat_id)."""
+
+    def __init__(self, idle_ttl: float = 300.0, clock: Callable[[], float] = time.monotonic) -> None:
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+        self._buckets: dict[tuple[int, str], TokenBucket] = {}
+        self._last_gc = clock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _gc(self) -> None:
+        now = self._clock()
+        if now - self._last_gc < self.idle_ttl:
+            return
+        self._last_gc = now
+        for key in [k for k, b in self._buckets.items() if now - b.idle_since > self.idle_ttl]:
+            del self._buckets[key]
+
+    async def allow(self, user_id: int, kind: str, limit: Limit) -> bool:
+        self._gc()
+        bucket = self._buckets.get((user_id, kind))
+        if bucket is None:
+            bucket = self._buckets[(user_id, kind)] = TokenBucket(limit.rate, capacity=limit.burst, clock=self._clock)
+        return bucket.try_acquire()
+
+
+# token bucket одним вызовом: время берём у Redis, чтобы реплики с разными часами считали одинаково
+_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return allowed
+"""
+
+
+class RedisThrottleStore:
+    """Bucket'ы в Redis (THROTTLE_BACKEND=redis): общий лимит для нескольких реплик, один EVALSHA на апдейт."""
+
+    def __init__(self, redis: Redis, prefix: str = "throttle") -> None:
+        self.prefix = prefix
+        self._script = redis.register_script(_BUCKET_LUA)
+
+    async def allow(self, user_id: int, kind: str, limit: Limit) -> bool:
+        try:
+            allowed = await self._script(keys=[f"{self.prefix}:{kind}:{user_id}"], args=[limit.rate, limit.burst])
+        except RedisError as e:
+            # Redis недоступен — лучше пропустить апдейт, чем положить бота
+            logger.warning("Throttle check failed, letting the update through: %s", e)
+            return True
+        return bool(allowed)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Лимит частоты апдейтов на пользователя и класс кнопок. Регистрируется на dp.update раньше
+    DbSessionMiddleware: лишний апдейт отбрасывается до того, как будет открыта сессия БД.
+    """
+
+    def __init__(
+        self,
+        store: MemoryThrottleStore | RedisThrottleStore,
+        limits: Mapping[str, Limit] = DEFAULT_LIMITS,
+        exempt: Container[int] = frozenset(),
+    ) -> None:
+        self.store = store
+        self.limits = limits
+        self.exempt = exempt
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        inner = event.event if isinstance(event, Update) else event
+        kind = classify(inner)
+        if user is None or kind is None or user.id in self.exempt:
+            return await handler(event, data)
+
+        if await self.store.allow(user.id, kind, self.limits[kind]):
+            return await handler(event, data)
+
+        THROTTLED.inc(kind=kind)
+        if isinstance(inner, CallbackQuery):
+            # без ответа у пользователя на кнопке крутятся часики
+            await inner.answer("Слишком часто — подожди секунду.")
+        return None
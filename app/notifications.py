@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import datetime as dt
+import logging
+
+from aiogram import Bot
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.database.requests import get_appointment_card
+from app.events import BookingEvent
+
+logger = logging.getLogger(__name__)
+
+_TITLES = {
+    "created": "🆕 Новая запись",
+    "paid": "💳 Запись оплачена",
+    "cancelled": "❌ Запись отменена",
+}
+
+
+def _change_kind(event: BookingEvent) -> str | None:
+    if event.table != "appointments" or not event.status_changed:
+        return None
+    if event.op == "INSERT":
+        return "created"
+    if event.status == "active" and event.old_status == "pending_payment":
+        return "paid"
+    if event.status == "cancelled":
+        return "cancelled"
+    return None
+
+
+class MasterNotifier:
+    """Подписчик BookingEventListener: сообщает мастеру о новых, оплаченных и отменённых записях."""
+
+    def __init__(self, bot: Bot, sessionmaker: async_sessionmaker, tz: dt.tzinfo, redis: Redis | None = None) -> None:
+        self.bot = bot
+        self.sessionmaker = sessionmaker
+        self.tz = tz
+        # NOTIFY получает каждая реплика бота — через Redis уведомление отправит только одна
+        self.redis = redis
+
+    async def _claim(self, event: BookingEvent, kind: str) -> bool:
+        if self.redis is None:
+            return True
+        return bool(await self.redis.set(f"notify:master:{event.id}:{kind}", "1", nx=True, ex=24 * 3600))
+
+    async def __call__(self, event: BookingEvent) -> None:
+        kind = _change_kind(event)
+        if kind is None:
+            return
+
+        async with self.sessionmaker() as session:
+            appt = await get_appointment_card(session, event.id)
+        if not appt or not appt.master or not appt.master.tg_user_id:
+            return
+        if not await self._claim(event, kind):
+            return
+
+        who = f"@{appt.user.username}" if appt.user and appt.user.username else f"user_id={appt.user_id}"
+        text = (
+            f"{_TITLES[kind]}\n\n"
+            f"Когда: {appt.starts_at.astimezone(self.tz).strftime('%d.%m.%Y %H:%M')}\n"
+            f"Услуга: {appt.service.name if appt.service else appt.service_id}\n"
+            f"Клиент: {who}"
+        )
+        try:
+            await self.bot.send_message(appt.master.tg_user_id, text)
+        except Exception as e:
+            logger.warning("Failed to notify master %s: %s", appt.master.tg_user_id, e)
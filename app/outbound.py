@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from aiogram.methods import (
+    CopyMessage,
+    EditMessageCaption,
+    EditMessageReplyMarkup,
+    EditMessageText,
+    ForwardMessage,
+    SendDocument,
+    SendMediaGroup,
+    SendMessage,
+    SendPhoto,
+    TelegramMethod,
+)
+from aiogram.methods.base import Response
+
+from app.metrics import Counter, Gauge, Histogram
+from app.ratelimit import TelegramRateLimiter
+
+logger = logging.getLogger(__name__)
+
+QUEUE_DEPTH = Gauge("tg_outbound_queue_depth", "Outgoing Bot API calls waiting for their rate-limit turn")
+WAIT_SECONDS = Histogram("tg_outbound_wait_seconds", "Time an outgoing Bot API call waited in the queue")
+DROPPED = Counter("tg_outbound_dropped_total", "Outgoing Bot API calls not sent as requested", labels=("reason",))
+RETRY_AFTER = Counter("tg_outbound_retry_after_total", "Flood-control (429) responses from Telegram")
+
+# Методы, которые расходуют лимиты на отправку в чат. Остальное (getUpdates, answerCallbackQuery, ...)
+# идёт напрямую — long polling нельзя ставить в очередь.
+SEND_METHODS: tuple[type[TelegramMethod], ...] = (
+    SendMessage,
+    SendDocument,
+    SendPhoto,
+    SendMediaGroup,
+    CopyMessage,
+    ForwardMessage,
+)
+# Правки одного сообщения, ждущие своей очереди, схлопываются: уходит только последняя.
+EDIT_METHODS: tuple[type[TelegramMethod], ...] = (
+    EditMessageText,
+    EditMessageReplyMarkup,
+    EditMessageCaption,
+)
+
+EditKey = tuple[str, Any, Any, Any]
+
+
+class OutboundQueueFull(TelegramAPIError):
+    """В очереди на отправку слишком много ожидающих вызовов — новый отброшен."""
+
+
+@dataclass
+class _PendingEdit:
+    method: TelegramMethod
+    future: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+    def fail(self, exc: BaseException) -> None:
+        if self.future.done():
+            return
+        if isinstance(exc, asyncio.CancelledError):
+            self.future.cancel()
+            return
+        self.future.set_exception(exc)
+        # схлопнутых вызовов могло не быть — не оставляем "exception was never retrieved"
+        self.future.exception()
+
+
+def _chat_of(method: TelegramMethod) -> int | None:
+    chat_id = getattr(method, "chat_id", None)
+    # @username каналов не различаем по лимитам чата — только глобальный лимит
+    return chat_id if isinstance(chat_id, int) else None
+
+
+def _edit_key(method: TelegramMethod) -> EditKey:
+    return (
+        method.__api_method__,
+        getattr(method, "chat_id", None),
+        getattr(method, "message_id", None),
+        getattr(method, "inline_message_id", None),
+    )
+
+
+class OutboundQueue(BaseRequestMiddleware):
+    """
+    Общая очередь исходящих вызовов Bot API (middleware сессии бота, см. bot.session.middleware).
+
+    Отправки и правки ждут своей очереди по TelegramRateLimiter (глобальный лимит + лимит чата),
+    на 429 ждут retry_after от сервера и повторяют. Пока правка сообщения ждёт очереди, новая правка
+    того же сообщения её заменяет: оба вызова получают результат последней. Очередь — на процесс,
+    глобальный лимит — общий для процессов, если limiter с Redis (create_bot при REDIS_URL).
+    """
+
+    def __init__(
+        self,
+        limiter: TelegramRateLimiter | None = None,
+        max_attempts: int = 3,
+        max_pending: int = 1000,
+    ) -> None:
+        self.limiter = limiter or TelegramRateLimiter()
+        self.max_attempts = max_attempts
+        self.max_pending = max_pending
+        self._pending = 0
+        self._edits: dict[EditKey, _PendingEdit] = {}
+
+    @property
+    def depth(self) -> int:
+        return self._pending
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Response:
+        if isinstance(method, EDIT_METHODS):
+            return await self._edit(make_request, bot, method)
+        if isinstance(method, SEND_METHODS):
+            await self._turn(method)
+            return await self._send(make_request, bot, method)
+        return await make_request(bot, method)
+
+    async def _turn(self, method: TelegramMethod) -> None:
+        """Дождаться права на вызов (или отбросить его, если очередь переполнена)."""
+        if self._pending >= self.max_pending:
+            DROPPED.inc(reason="overflow")
+            raise OutboundQueueFull(method=method, message=f"outbound queue is full ({self._pending} pending)")
+        started = time.monotonic()
+        self._pending += 1
+        QUEUE_DEPTH.inc()
+        try:
+            await self.limiter.acquire(_chat_of(method))
+        finally:
+            self._pending -= 1
+            QUEUE_DEPTH.dec()
+            WAIT_SECONDS.observe(time.monotonic() - started)
+
+    async def _send(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Response:
+        chat_id = _chat_of(method)
+        attempt = 1
+        while True:
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                RETRY_AFTER.inc()
+                if attempt >= self.max_attempts:
+                    DROPPED.inc(reason="gave_up")
+                    raise
+                logger.info("Flood control on %s for chat %s, retry in %ss", method.__api_method__, chat_id, e.retry_after)
+                await self.limiter.penalize(chat_id, e.retry_after)
+                attempt += 1
+                await self._turn(method)
+
+    async def _edit(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Response:
+        key = _edit_key(method)
+        pending = self._edits.get(key)
+        if pending is not None:
+            # предыдущая правка ещё не ушла — отправим только эту, ответ получат обе
+            pending.method = method
+            DROPPED.inc(reason="coalesced")
+            return await asyncio.shield(pending.future)
+
+        pending = self._edits[key] = _PendingEdit(method)
+        try:
+            await self._turn(method)
+        except BaseException as e:
+            pending.fail(e)
+            raise
+        finally:
+            self._edits.pop(key, None)
+
+        try:
+            response = await self._send(make_request, bot, pending.method)
+        except BaseException as e:
+            pending.fail(e)
+            raise
+        pending.future.set_result(response)
+        return response
@@ -1,12 +1,35 @@
 from __future__ import annotations
 from dataclasses import dataclass
+from typing import Any, Mapping
+
+# статусы, которые провайдер может сообщить вебхуком (payment_status без "pending")
+NOTICE_STATUSES = ("paid", "failed", "cancelled", "refunded")
 
 @dataclass(frozen=True)
 class PaymentIntent:
     external_id: str
     pay_url: str
 
+@dataclass(frozen=True)
+class PaymentNotice:
+    """Уведомление провайдера о платеже, приведённое к нашим статусам."""
+    external_id: str
+    status: str
+    amount_cents: int | None
+    payload: dict[str, Any]
+
+class WebhookRejected(Exception):
+    """Вебхук не от провайдера (подпись) или не разобран — провайдеру отвечаем 4xx."""
+
+    def __init__(self, reason: str, http_status: int = 400) -> None:
+        super().__init__(reason)
+        self.http_status = http_status
+
 class PaymentProvider:
     name: str
     async def create_intent(self, amount_cents: int, currency: str, description: str) -> PaymentIntent:
         raise NotImplementedError
+
+    def parse_webhook(self, body: bytes, headers: Mapping[str, str], secret: str) -> list[PaymentNotice]:
+        """Проверить подпись и разобрать тело вебхука; WebhookRejected — отказать."""
+        raise NotImplementedError
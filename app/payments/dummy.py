@@ -1,6 +1,18 @@
 from __future__ import annotations
+import hashlib
+import hmac
+import json
 import uuid
-from .base import PaymentProvider, PaymentIntent
+from typing import Any, Mapping
+
+from .base import NOTICE_STATUSES, PaymentIntent, PaymentNotice, PaymentProvider, WebhookRejected
+
+SIGNATURE_HEADER = "X-Dummy-Signature"
+
+
+def sign(body: bytes, secret: str) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
 
 class DummyProvider(PaymentProvider):
     name = "dummy"
@@ -10,3 +22,29 @@ class DummyProvider(PaymentProvider):
         # заглушка, но архитектура настоящая
         url = f"https://example.com/pay?pid={ext}"
         return PaymentIntent(external_id=ext, pay_url=url)
+
+    def parse_webhook(self, body: bytes, headers: Mapping[str, str], secret: str) -> list[PaymentNotice]:
+        """
+        Тело — объект {"external_id", "status", "amount_cents"} или их массив (app.payments.fake_provider
+        шлёт пачками); подпись — HMAC-SHA256 тела в заголовке X-Dummy-Signature.
+        """
+        if not hmac.compare_digest(headers.get(SIGNATURE_HEADER, ""), sign(body, secret)):
+            raise WebhookRejected("bad signature", http_status=401)
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise WebhookRejected("body is not JSON")
+        items: list[Any] = data if isinstance(data, list) else [data]
+        notices = []
+        for item in items:
+            if not isinstance(item, dict):
+                raise WebhookRejected("event must be an object")
+            external_id, status, amount = item.get("external_id"), item.get("status"), item.get("amount_cents")
+            if not isinstance(external_id, str) or not external_id or len(external_id) > 128:
+                raise WebhookRejected("bad external_id")
+            if status not in NOTICE_STATUSES:
+                raise WebhookRejected(f"bad status {status!r}")
+            if amount is not None and (not isinstance(amount, int) or isinstance(amount, bool)):
+                raise WebhookRejected("bad amount_cents")
+            notices.append(PaymentNotice(external_id=external_id, status=status, amount_cents=amount, payload=item))
+        return notices
@@ -0,0 +1,100 @@
+"""
+Локальный "провайдер оплаты" для demo-платежей: страница оплаты и подписанные вебхуки, как у настоящего.
+
+    PAYMENT_WEBHOOK_SECRET=s PAYMENT_DUMMY_URL=http://127.0.0.1:8091/pay python -m app.workers.payments
+    python -m app.payments.fake_provider --target http://127.0.0.1:8090/payments/dummy --secret s
+
+Кнопка «Оплатить» в боте ведёт на /pay/<external_id>: там «Оплатить» или «Отказаться» — и вебхук paid/failed.
+--retries N повторяет каждое уведомление N раз (провайдер, не дождавшийся ответа, шлёт его снова).
+--burst 1-5000 — без страницы отправить paid по этим external_id пачками по --batch и напечатать статусы и время.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from html import escape
+from typing import Any
+
+from aiohttp import ClientSession, web
+
+from app.payments.dummy import SIGNATURE_HEADER, sign
+
+PAGE = """<!doctype html><meta charset="utf-8"><title>Оплата</title>
+<h3>Демо-оплата {external_id}</h3>
+<form method="post"><button name="status" value="paid">Оплатить</button>
+<button name="status" value="failed">Отказаться</button></form>"""
+
+
+class FakeProvider:
+    def __init__(self, target: str, secret: str, retries: int = 1) -> None:
+        self.target = target
+        self.secret = secret
+        self.retries = retries
+        self.statuses: Counter = Counter()
+
+    async def notify(self, http: ClientSession, events: list[dict[str, Any]]) -> None:
+        body = json.dumps(events if len(events) > 1 else events[0]).encode()
+        headers = {SIGNATURE_HEADER: sign(body, self.secret), "Content-Type": "application/json"}
+        for _ in range(self.retries):
+            async with http.post(self.target, data=body, headers=headers) as resp:
+                self.statuses[resp.status] += 1
+
+    async def page(self, request: web.Request) -> web.Response:
+        return web.Response(text=PAGE.format(external_id=escape(request.match_info["external_id"])), content_type="text/html")
+
+    async def submit(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        status = "paid" if form.get("status") == "paid" else "failed"
+        async with ClientSession() as http:
+            await self.notify(http, [{"external_id": request.match_info["external_id"], "status": status}])
+        return web.Response(text=f"Готово ({status}), вернитесь в бот.", content_type="text/plain")
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/pay/{external_id}", self.page)
+        app.router.add_post("/pay/{external_id}", self.submit)
+        return app
+
+
+async def burst(provider: FakeProvider, ids: list[str], batch: int, concurrency: int = 20) -> None:
+    sem = asyncio.Semaphore(concurrency)
+    async with ClientSession() as http:
+
+        async def post(chunk: list[str]) -> None:
+            async with sem:
+                await provider.notify(http, [{"external_id": i, "status": "paid"} for i in chunk])
+
+        started = time.monotonic()
+        await asyncio.gather(*(post(ids[i:i + batch]) for i in range(0, len(ids), batch)))
+    print(f"posted {len(ids)} notices x{provider.retries} in {time.monotonic() - started:.2f}s: {dict(provider.statuses)}")
+
+
+async def _main(args: argparse.Namespace) -> None:
+    provider = FakeProvider(args.target, args.secret, retries=args.retries)
+    if args.burst:
+        first, _, last = args.burst.partition("-")
+        await burst(provider, [str(i) for i in range(int(first), int(last or first) + 1)], args.batch)
+        return
+    runner = web.AppRunner(provider.app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    print(f"pay pages on http://127.0.0.1:{args.port}/pay/<external_id>, callbacks -> {args.target}")
+    await asyncio.Event().wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake payment provider: pay pages + signed webhook callbacks")
+    parser.add_argument("--target", default="http://127.0.0.1:8090/payments/dummy", help="payment webhook URL")
+    parser.add_argument("--secret", required=True, help="PAYMENT_WEBHOOK_SECRET of the payments worker")
+    parser.add_argument("--port", type=int, default=8091, help="port for pay pages (PAYMENT_DUMMY_URL)")
+    parser.add_argument("--retries", type=int, default=1, help="send every notice this many times")
+    parser.add_argument("--burst", help="post 'paid' for this external_id range (e.g. 1-5000) and exit")
+    parser.add_argument("--batch", type=int, default=50, help="notices per webhook request in --burst")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Приём вебхуков провайдеров: POST /payments/<provider>. Уведомление только проверяется и кладётся
+в очередь payment_events (повтор — no-op по ключу), применяет их пачками app.workers.payments.
+Провайдеру отвечаем 200, как только уведомление в очереди, — его ретраи не ждут блокировок платежей.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Callable, Mapping
+
+from aiohttp import web
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.database.requests import enqueue_payment_notices
+from app.metrics import Counter
+from app.payments.base import PaymentProvider, WebhookRejected
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = "/payments/{provider}"
+
+NOTICES = Counter("payment_webhook_notices_total", "Provider payment notices by result", labels=("provider", "result"))
+
+
+class PaymentWebhook:
+    def __init__(
+        self,
+        sessionmaker: async_sessionmaker,
+        providers: Mapping[str, PaymentProvider],
+        secret: str,
+        on_queued: Callable[[], None] | None = None,
+    ) -> None:
+        self.sessionmaker = sessionmaker
+        self.providers = providers
+        self.secret = secret
+        # будит воркер в этом же процессе, не дожидаясь опроса очереди
+        self.on_queued = on_queued
+
+    async def handle(self, request: web.Request) -> web.Response:
+        name = request.match_info["provider"]
+        provider = self.providers.get(name)
+        if provider is None:
+            raise web.HTTPNotFound()
+        body = await request.read()
+        try:
+            notices = provider.parse_webhook(body, request.headers, self.secret)
+        except WebhookRejected as e:
+            NOTICES.inc(provider=name, result="rejected")
+            logger.warning("Rejected %s payment webhook: %s", name, e)
+            return web.Response(status=e.http_status, text=str(e))
+
+        async with self.sessionmaker() as session:
+            async with session.begin():
+                queued = await enqueue_payment_notices(session, provider.name, notices)
+        NOTICES.inc(queued, provider=name, result="queued")
+        NOTICES.inc(len(notices) - queued, provider=name, result="duplicate")
+        if queued and self.on_queued is not None:
+            self.on_queued()
+        return web.json_response({"queued": queued, "duplicates": len(notices) - queued})
+
+    def setup(self, app: web.Application) -> None:
+        app.router.add_post(WEBHOOK_PATH, self.handle)
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from redis.asyncio import Redis
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+logger = logging.getLogger(__name__)
+
+
+async def listen(
+    redis: Redis,
+    channel: str,
+    on_message: Callable[[str], None],
+    on_subscribed: Callable[[], Awaitable[None]],
+) -> None:
+    """
+    Подписка на Redis-канал с переподключением. Pub/sub не хранит сообщения: всё, что пришло,
+    пока подписки не было, теряется — поэтому после каждой (пере)подписки вызывается on_subscribed
+    (подписчик досверяется с БД или сбрасывает кэш).
+    """
+    backoff = 1.0
+    while True:
+        try:
+            async with redis.pubsub() as pubsub:
+                await pubsub.subscribe(channel)
+                await on_subscribed()
+                backoff = 1.0
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = message["data"]
+                    on_message(data.decode() if isinstance(data, bytes) else data)
+        except (OSError, RedisConnectionError) as e:
+            logger.warning("Subscription to %s failed: %s (retry in %.0fs)", channel, e, backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
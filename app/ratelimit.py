@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Callable
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Bot API: ~30 сообщений/сек суммарно, ~1/сек в один чат, ~20/мин в группу.
+TG_GLOBAL_RATE = 30.0
+TG_CHAT_RATE = 1.0
+TG_GROUP_RATE = 20.0 / 60.0
+
+
+class TokenBucket:
+    """
+    Классический token bucket. reserve() резервирует токен "в долг" и возвращает,
+    сколько нужно подождать — так конкурентные корутины выстраиваются в очередь без гонок.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None, clock: Callable[[], float] = time.monotonic) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1.0))
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def _refill(self) -> float:
+        now = self._clock()
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+        return now
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    @property
+    def idle_since(self) -> float:
+        return self._updated
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        self._refill()
+        self._tokens -= tokens
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
+
+    def drain(self, seconds: float) -> None:
+        """Запретить выдачу токенов на seconds секунд (например, после 429 от Telegram)."""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+
+# тот же token bucket, что у RedisThrottleStore, но с резервированием "в долг", как TokenBucket.reserve():
+# ARGV = rate, capacity, сколько взять, на сколько секунд запретить выдачу (drain); ответ — ждать мс
+_RESERVE_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local take = tonumber(ARGV[3])
+local drain = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+if drain > 0 then
+    tokens = math.min(tokens, 0) - drain * rate
+end
+tokens = tokens - take
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+if tokens >= 0 then
+    return 0
+end
+return math.ceil(-tokens / rate * 1000)
+"""
+
+
+class RedisTokenBucket:
+    """
+    TokenBucket, общий для процессов: состояние в Redis, время — у Redis, одно резервирование — один EVALSHA.
+    Redis недоступен — резервируем в локальном bucket'е (лимит снова на процесс), но не роняем отправку.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        key: str,
+        rate: float,
+        capacity: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.key = key
+        self.fallback = TokenBucket(rate, capacity, clock=clock)
+        self.rate = self.fallback.rate
+        self.capacity = self.fallback.capacity
+        self._script = redis.register_script(_RESERVE_LUA)
+
+    async def _call(self, tokens: float, drain: float) -> float | None:
+        try:
+            wait_ms = await self._script(keys=[self.key], args=[self.rate, self.capacity, tokens, drain])
+        except RedisError as e:
+            logger.warning("Shared rate limit %s is unavailable, using the local one: %s", self.key, e)
+            return None
+        return int(wait_ms) / 1000
+
+    async def reserve(self, tokens: float = 1.0) -> float:
+        delay = await self._call(tokens, 0)
+        return self.fallback.reserve(tokens) if delay is None else delay
+
+    async def drain(self, seconds: float) -> None:
+        if await self._call(0, seconds) is None:
+            self.fallback.drain(seconds)
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        delay = await self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+
+class TelegramRateLimiter:
+    """
+    Глобальный bucket + bucket на каждый чат (для групп — более строгий лимит).
+    С redis глобальный лимит один на все процессы бота (RedisTokenBucket), без него — на процесс.
+    Лимиты чатов — в процессе: апдейты чата обрабатывает один процесс.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = TG_GLOBAL_RATE,
+        chat_rate: float = TG_CHAT_RATE,
+        group_rate: float = TG_GROUP_RATE,
+        chat_idle_ttl: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        redis: Redis | None = None,
+        global_key: str = "tg:ratelimit:global",
+    ) -> None:
+        self.global_bucket: TokenBucket | RedisTokenBucket = (
+            RedisTokenBucket(redis, global_key, global_rate, clock=clock)
+            if redis is not None
+            else TokenBucket(global_rate, clock=clock)
+        )
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_idle_ttl = chat_idle_ttl
+        self._clock = clock
+        self._chats: dict[int, TokenBucket] = {}
+        self._last_gc = clock()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # отрицательные id — группы/каналы
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, capacity=1.0, clock=self._clock)
+        return bucket
+
+    def _gc(self) -> None:
+        now = self._clock()
+        if now - self._last_gc < self.chat_idle_ttl:
+            return
+        self._last_gc = now
+        stale = [cid for cid, b in self._chats.items() if now - b.idle_since > self.chat_idle_ttl]
+        for cid in stale:
+            del self._chats[cid]
+
+    async def acquire(self, chat_id: int | None) -> float:
+        """Дождаться права отправить сообщение в chat_id; возвращает суммарное ожидание."""
+        self._gc()
+        waited = 0.0
+        if chat_id is not None:
+            waited += await self._chat_bucket(chat_id).acquire()
+        waited += await self.global_bucket.acquire()
+        return waited
+
+    async def penalize(self, chat_id: int | None, seconds: float) -> None:
+        """Telegram ответил 429 (retry_after): притормозить чат, а без chat_id — всё (во всех процессах)."""
+        if chat_id is not None:
+            self._chat_bucket(chat_id).drain(seconds)
+        elif isinstance(self.global_bucket, RedisTokenBucket):
+            await self.global_bucket.drain(seconds)
+        else:
+            self.global_bucket.drain(seconds)
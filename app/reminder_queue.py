@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import datetime as dt
+import time
+from typing import Iterable
+
+from redis.asyncio import Redis
+
+from app.reminders import ReminderKind
+
+KEY_PREFIX = "reminders"
+
+# Атомарно забрать всё, что уже пора отправить: два воркера не получат один и тот же элемент.
+# Если передан ключ аренды шарда (KEYS[2]), pop выполняется только пока аренда наша
+# (значение совпадает с токеном, включающим fencing-номер) — "зомби"-воркер ничего не заберёт.
+_POP_DUE = """
+if #KEYS > 1 and redis.call('GET', KEYS[2]) ~= ARGV[3] then
+    return false
+end
+local items = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #items > 0 then
+    redis.call('ZREM', KEYS[1], unpack(items))
+end
+return items
+"""
+
+
+def _member(appointment_id: int, kind: str) -> str:
+    return f"{appointment_id}:{kind}"
+
+
+def _parse_member(member: str) -> tuple[int, str]:
+    appt_id, kind = member.split(":", 1)
+    return int(appt_id), kind
+
+
+class LeaseLost(Exception):
+    """Аренда шарда истекла или перехвачена другим воркером."""
+
+
+class ReminderQueue:
+    """
+    Очередь напоминаний в Redis ZSET: member = "<appointment_id>:<kind>", score = unix-время отправки;
+    kind — имя срока из REMINDER_OFFSETS (см. app.reminders).
+    Очередь разбита на shards ключей по appointment_id, чтобы воркеры делили работу (см. workers.leases).
+    Воркер спит до ближайшего score (или до сигнала в wakeup-списке шарда о новой записи).
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        kinds: tuple[ReminderKind, ...],
+        shards: int = 1,
+        prefix: str = KEY_PREFIX,
+    ) -> None:
+        if shards <= 0:
+            raise ValueError("shards must be positive")
+        self.redis = redis
+        self.kinds = kinds
+        self.shards = shards
+        self.prefix = prefix
+        self._pop_due = redis.register_script(_POP_DUE)
+
+    def shard_of(self, appointment_id: int) -> int:
+        return appointment_id % self.shards
+
+    def due_key(self, shard: int) -> str:
+        return f"{self.prefix}:due:{shard}"
+
+    def wakeup_key(self, shard: int) -> str:
+        return f"{self.prefix}:wakeup:{shard}"
+
+    async def schedule(
+        self,
+        appointment_id: int,
+        starts_at: dt.datetime,
+        skip: set[str] | None = None,
+        now: dt.datetime | None = None,
+    ) -> int:
+        """Поставить (или передвинуть) напоминания записи. Прошедшие сроки не ставим."""
+        now = now or dt.datetime.now(dt.timezone.utc)
+        mapping: dict[str, float] = {}
+        stale: list[str] = []
+        for kind in self.kinds:
+            due = starts_at - kind.offset
+            if (skip and kind.name in skip) or due <= now:
+                stale.append(_member(appointment_id, kind.name))
+            else:
+                mapping[_member(appointment_id, kind.name)] = due.timestamp()
+
+        shard = self.shard_of(appointment_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if stale:
+                pipe.zrem(self.due_key(shard), *stale)
+            if mapping:
+                pipe.zadd(self.due_key(shard), mapping)
+                # будим воркер: новый элемент мог оказаться раньше текущего ближайшего
+                pipe.lpush(self.wakeup_key(shard), "1")
+                pipe.ltrim(self.wakeup_key(shard), 0, 0)
+            await pipe.execute()
+        return len(mapping)
+
+    async def unschedule(self, appointment_id: int) -> None:
+        await self.redis.zrem(
+            self.due_key(self.shard_of(appointment_id)),
+            *(_member(appointment_id, kind.name) for kind in self.kinds),
+        )
+
+    async def reschedule(self, appointment_id: int, starts_at: dt.datetime, skip: set[str] | None = None) -> int:
+        # schedule() перезаписывает score и удаляет уже неактуальные элементы
+        return await self.schedule(appointment_id, starts_at, skip=skip)
+
+    async def requeue_now(self, items: list[tuple[int, str]]) -> None:
+        """Поставить пропущенные напоминания на "прямо сейчас" (catch-up после простоя)."""
+        if not items:
+            return
+        by_shard: dict[int, dict[str, float]] = {}
+        ts = time.time()
+        for appt_id, kind in items:
+            by_shard.setdefault(self.shard_of(appt_id), {})[_member(appt_id, kind)] = ts
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for shard, mapping in by_shard.items():
+                pipe.zadd(self.due_key(shard), mapping)
+                pipe.lpush(self.wakeup_key(shard), "1")
+                pipe.ltrim(self.wakeup_key(shard), 0, 0)
+            await pipe.execute()
+
+    async def pop_due(
+        self,
+        shard: int,
+        now: dt.datetime | None = None,
+        limit: int = 100,
+        lease: tuple[str, str] | None = None,
+    ) -> list[tuple[int, str]]:
+        """
+        Забрать созревшие напоминания шарда. lease = (ключ аренды, ожидаемое значение):
+        если аренда уже не наша — LeaseLost, и ничего не удаляется.
+        """
+        ts = (now or dt.datetime.now(dt.timezone.utc)).timestamp()
+        keys = [self.due_key(shard)]
+        args: list[object] = [ts, limit]
+        if lease is not None:
+            keys.append(lease[0])
+            args.append(lease[1])
+        items = await self._pop_due(keys=keys, args=args)
+        if items is None:
+            raise LeaseLost(f"lease for shard {shard} is no longer held")
+        return [_parse_member(m.decode() if isinstance(m, bytes) else m) for m in items]
+
+    async def wait_next(self, shards: Iterable[int], max_wait: float = 60.0) -> None:
+        """Заблокироваться до ближайшего срока в любом из шардов (или новой записи), но не дольше max_wait."""
+        shards = list(shards)
+        if not shards:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for shard in shards:
+                pipe.zrange(self.due_key(shard), 0, 0, withscores=True)
+            heads = await pipe.execute()
+        timeout = max_wait
+        for head in heads:
+            if head:
+                _, score = head[0]
+                timeout = min(timeout, score - time.time())
+        if timeout <= 0:
+            return
+        await self.redis.blpop([self.wakeup_key(shard) for shard in shards], timeout=timeout)
+
@@ -1,78 +1,102 @@
 from __future__ import annotations
 
-import asyncio
 import datetime as dt
-import logging
+import re
+from dataclasses import dataclass, replace
+from typing import Mapping
 
-from aiogram import Bot
-from sqlalchemy import and_, select, update
-from sqlalchemy.ext.asyncio import async_sessionmaker
-from sqlalchemy.orm import selectinload
+# Какие напоминания слать по умолчанию (переопределяется REMINDER_OFFSETS).
+DEFAULT_REMINDER_OFFSETS = "24h,1h"
 
-from app.database.models import Appointment
+# appointments.reminded_mask — INTEGER, старший бит знаковый
+MAX_REMINDER_KINDS = 31
 
-log = logging.getLogger("reminders")
+_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+_TOKEN = re.compile(r"^(\d+)([mhd])$")
 
 
-async def reminders_loop(bot: Bot, sessionmaker: async_sessionmaker, tz: dt.tzinfo) -> None:
+@dataclass(frozen=True)
+class ReminderKind:
     """
-    Every 30s:
-      - find appointments starting in ~24h, ~1h that are not reminded yet
-      - send message to user_id (private chat id == user_id)
-      - mark reminded flag
+    Один вид напоминания: name ("24h") попадает в очередь и outbox, offset — за сколько до начала слать,
+    bit — номер бита в appointments.reminded_mask. Бит закреплён за сроком в таблице reminder_bits
+    (bind_reminder_bits при старте воркера), а не за позицией в REMINDER_OFFSETS: сроки можно
+    переставлять и убирать, бит убранного срока больше никому не достаётся.
     """
-    while True:
-        try:
-            now = dt.datetime.now(tz=tz)
-
-            windows = [
-                ("reminded_24h", dt.timedelta(hours=24)),
-                ("reminded_1h", dt.timedelta(hours=1)),
-            ]
-
-            async with sessionmaker() as session:
-                for flag, delta in windows:
-                    start_from = now + delta - dt.timedelta(minutes=1)
-                    start_to = now + delta + dt.timedelta(minutes=1)
-
-                    res = await session.execute(
-                        select(Appointment)
-                        .options(selectinload(Appointment.master), selectinload(Appointment.service))
-                        .where(
-                            and_(
-                                Appointment.status == "active",
-                                getattr(Appointment, flag) == False,  # noqa: E712
-                                Appointment.starts_at >= start_from,
-                                Appointment.starts_at < start_to,
-                            )
-                        )
-                    )
-                    appts = list(res.scalars().all())
-                    if not appts:
-                        continue
-
-                    for a in appts:
-                        text = (
-                            "⏰ Напоминание о записи\n\n"
-                            f"Когда: {a.starts_at.astimezone(tz).strftime('%d.%m.%Y %H:%M')}\n"
-                            f"Мастер: {a.master.name}\n"
-                            f"Услуга: {a.service.name}\n"
-                        )
-                        try:
-                            await bot.send_message(chat_id=a.user_id, text=text)
-                        except Exception as e:
-                            log.warning("Failed to send reminder to %s: %s", a.user_id, e)
-                            continue
-
-                        # mark as reminded
-                        async with session.begin():
-                            await session.execute(
-                                update(Appointment)
-                                .where(Appointment.id == a.id)
-                                .values({flag: True})
-                            )
-
-        except Exception as e:
-            log.exception("Reminder loop error: %s", e)
-
-        await asyncio.sleep(30)
+
+    name: str
+    offset: dt.timedelta
+    bit: int | None = None
+
+    @property
+    def minutes(self) -> int:
+        return int(self.offset.total_seconds()) // 60
+
+    @property
+    def flag(self) -> int:
+        if self.bit is None:
+            raise RuntimeError(f"reminder offset {self.name!r} has no reminded_mask bit (see assign_reminder_bits)")
+        return 1 << self.bit
+
+
+def parse_reminder_offsets(value: str) -> tuple[ReminderKind, ...]:
+    """Разобрать "24h,3h,30m" в виды напоминаний; биты раздаёт assign_reminder_bits."""
+    kinds: list[ReminderKind] = []
+    for part in value.split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        m = _TOKEN.match(part)
+        if not m or int(m.group(1)) <= 0:
+            raise ValueError(f"bad reminder offset {part!r}, expected e.g. 24h, 90m, 2d")
+        offset = dt.timedelta(**{_UNITS[m.group(2)]: int(m.group(1))})
+        # "1d" и "24h" — один срок и один бит
+        if any(k.offset == offset for k in kinds):
+            raise ValueError(f"duplicate reminder offset {part!r}")
+        kinds.append(ReminderKind(name=part, offset=offset))
+    if not kinds:
+        raise ValueError("at least one reminder offset is required")
+    if len(kinds) > MAX_REMINDER_KINDS:
+        raise ValueError(f"at most {MAX_REMINDER_KINDS} reminder offsets are supported")
+    return tuple(kinds)
+
+
+def assign_reminder_bits(
+    kinds: tuple[ReminderKind, ...], known: Mapping[int, int]
+) -> tuple[tuple[ReminderKind, ...], dict[int, int]]:
+    """
+    Биты по сроку: known — уже закреплённые (минуты -> бит, в том числе за убранными сроками).
+    Новому сроку достаётся наименьший бит, который не был ничьим; при пустом known (первый старт
+    воркера после миграции 0018) это позиция срока в списке — так и ставились биты reminded_mask
+    до reminder_bits. Возвращает виды с битами и новые закрепления, которые нужно сохранить.
+    """
+    used = set(known.values())
+    new: dict[int, int] = {}
+    bound = []
+    for kind in kinds:
+        bit = known.get(kind.minutes)
+        if bit is None:
+            free = [b for b in range(MAX_REMINDER_KINDS) if b not in used]
+            if not free:
+                raise ValueError(
+                    f"no free reminded_mask bit for reminder offset {kind.name!r}: "
+                    f"all {MAX_REMINDER_KINDS} are taken by current and retired offsets"
+                )
+            bit = new[kind.minutes] = free[0]
+            used.add(bit)
+        bound.append(replace(kind, bit=bit))
+    return tuple(bound), new
+
+
+def reminded_kinds(mask: int, kinds: tuple[ReminderKind, ...]) -> set[str]:
+    """Имена уже отмеченных напоминаний по значению reminded_mask."""
+    return {k.name for k in kinds if mask & k.flag}
+
+
+def superseded_cutoff(kind: ReminderKind, kinds: tuple[ReminderKind, ...], now: dt.datetime) -> dt.datetime | None:
+    """
+    Напоминание "вытеснено", если запись начинается не позже now + ближайший меньший срок:
+    тогда за 24ч не шлём, раз уже пора слать за 1ч.
+    """
+    smaller = [k.offset for k in kinds if k.offset < kind.offset]
+    return now + max(smaller) if smaller else None
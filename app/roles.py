@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable
+
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.database.requests import get_user_access
+from app.metrics import Counter
+from app.pubsub import listen
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "roles"
+ROLES = ("user", "master", "admin")
+
+ROLE_LOOKUPS = Counter("role_cache_total", "Role lookups by cache result", labels=("result",))
+
+
+@dataclass(frozen=True)
+class Access:
+    """Роль пользователя; master_id — мастер, привязанный к нему (Master.tg_user_id)."""
+    role: str = "user"
+    master_id: int | None = None
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "admin"
+
+    @property
+    def is_master(self) -> bool:
+        return self.role == "master"
+
+
+USER = Access()
+
+
+class RoleCache:
+    """
+    Роли из users.role (+ привязка мастера) с кэшем в памяти на ttl секунд: на попадании — ни одного запроса.
+    ADMIN_IDS из .env — всегда admin, без БД (так админ не потеряет доступ из-за неверной роли в таблице).
+
+    После смены роли вызывающий (после commit) зовёт invalidate(): запись сбрасывается здесь и,
+    через Redis pub/sub, в остальных процессах. После переподписки кэш очищается целиком — сообщения
+    за время без подписки потеряны; TTL ограничивает устаревание, если Redis нет вовсе.
+    Сброс, пришедший, пока роль читается из БД, не даёт положить прочитанное в кэш: оно могло устареть.
+    """
+
+    def __init__(
+        self,
+        sessionmaker: async_sessionmaker,
+        redis: Redis | None = None,
+        admin_ids: frozenset[int] | set[int] = frozenset(),
+        ttl: float = 60.0,
+        maxsize: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+        channel: str = CHANNEL,
+    ) -> None:
+        self.sessionmaker = sessionmaker
+        self.redis = redis
+        self.admin_ids = frozenset(admin_ids)
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.channel = channel
+        self._clock = clock
+        self._entries: OrderedDict[int, tuple[float, Access]] = OrderedDict()
+        # чтения из БД в полёте (user_id -> сколько) и те из них, что застал сброс
+        self._loading: dict[int, int] = {}
+        self._stale: set[int] = set()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def _load(self, user_id: int) -> Access:
+        async with self.sessionmaker() as session:
+            row = await get_user_access(session, user_id)
+        if row is None:
+            return USER
+        role, master_id = row
+        return Access(role=role, master_id=master_id)
+
+    async def get(self, user_id: int) -> Access:
+        if user_id in self.admin_ids:
+            return Access(role="admin")
+        now = self._clock()
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > now:
+            ROLE_LOOKUPS.inc(result="hit")
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+        ROLE_LOOKUPS.inc(result="miss")
+        self._loading[user_id] = self._loading.get(user_id, 0) + 1
+        try:
+            access = await self._load(user_id)
+        finally:
+            stale = user_id in self._stale
+            self._loading[user_id] -= 1
+            if not self._loading[user_id]:
+                del self._loading[user_id]
+                self._stale.discard(user_id)
+        if stale:
+            return access
+        self._entries[user_id] = (now + self.ttl, access)
+        self._entries.move_to_end(user_id)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return access
+
+    def _drop(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+        if user_id in self._loading:
+            self._stale.add(user_id)
+
+    def _forget(self, data: str) -> None:
+        try:
+            self._drop(int(data))
+        except ValueError:
+            logger.warning("Bad role invalidation message %r", data)
+
+    async def invalidate(self, user_id: int) -> None:
+        """Вызывать после commit смены роли или привязки мастера."""
+        self._drop(user_id)
+        if self.redis is not None:
+            await self.redis.publish(self.channel, str(user_id))
+
+    async def _clear(self) -> None:
+        self._entries.clear()
+        self._stale.update(self._loading)
+
+    async def start(self) -> None:
+        if self.redis is not None:
+            self._task = asyncio.create_task(listen(self.redis, self.channel, self._forget, self._clear))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
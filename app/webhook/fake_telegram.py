@@ -0,0 +1,182 @@
+"""
+Локальный "Telegram" для проверки webhook-режима без настоящего Bot API.
+
+Поднимает сервер, который отвечает на вызовы Bot API (бот запускается с TELEGRAM_API_URL на него),
+и шлёт на вебхук /start от множества чатов с секретом в заголовке, как это делает Telegram.
+В конце печатает, сколько чатов получили ответ и за какое время.
+
+    BOT_MODE=webhook WEBHOOK_SECRET=s TELEGRAM_API_URL=http://127.0.0.1:8081 BOT_TOKEN=123:fake python main.py
+    python -m app.webhook.fake_telegram --target http://127.0.0.1:8080/webhook --secret s --chats 200
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import statistics
+import time
+from collections import Counter, defaultdict
+from typing import Any
+
+from aiohttp import ClientSession, web
+
+from app.webhook.routing import SECRET_HEADER
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+
+
+def message_update(update_id: int, chat_id: int, text: str) -> dict[str, Any]:
+    user = {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}"}
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": user,
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def callback_update(update_id: int, chat_id: int, message_id: int, data: str) -> dict[str, Any]:
+    user = {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}"}
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": user,
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": "…",
+            },
+        },
+    }
+
+
+class FakeTelegram:
+    """Отвечает на /bot<token>/<method> правдоподобными результатами и запоминает вызовы по чатам."""
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, dict[str, Any]]] = []
+        self.by_chat: dict[int, list[tuple[float, str, dict[str, Any]]]] = defaultdict(list)
+        self._message_ids = itertools.count(1_000_000)
+
+    def _message(self, params: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "message_id": int(params.get("message_id") or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": {"id": int(params["chat_id"]), "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text") or "",
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        form = await request.post()
+        params = {k: v for k, v in form.items() if isinstance(v, str)}
+        self.calls.append((method, params))
+        if "chat_id" in params:
+            self.by_chat[int(params["chat_id"])].append((time.monotonic(), method, params))
+
+        result: Any = True
+        if method == "getMe":
+            result = BOT_USER
+        elif "chat_id" in params and (method.startswith(("send", "edit")) or method in ("copyMessage", "forwardMessage")):
+            result = self._message(params)
+        return web.json_response({"ok": True, "result": result})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+
+async def post_updates(
+    target: str,
+    secret: str,
+    updates: list[dict[str, Any]],
+    concurrency: int = 50,
+) -> tuple[Counter, dict[int, float]]:
+    """POST апдейтов на вебхук. Возвращает статусы ответов и время первого POST по каждому чату."""
+    statuses: Counter = Counter()
+    first_post: dict[int, float] = {}
+    sem = asyncio.Semaphore(concurrency)
+
+    async with ClientSession() as http:
+
+        async def post(update: dict[str, Any]) -> None:
+            body = update.get("message") or update["callback_query"]["message"]
+            chat_id = body["chat"]["id"]
+            async with sem:
+                first_post.setdefault(chat_id, time.monotonic())
+                async with http.post(target, data=json.dumps(update), headers={
+                    SECRET_HEADER: secret,
+                    "Content-Type": "application/json",
+                }) as resp:
+                    statuses[resp.status] += 1
+
+        # апдейты одного чата Telegram шлёт по порядку — здесь тоже
+        by_chat: dict[int, list[dict[str, Any]]] = defaultdict(list)
+        for u in updates:
+            body = u.get("message") or u["callback_query"]["message"]
+            by_chat[body["chat"]["id"]].append(u)
+
+        async def chat_stream(items: list[dict[str, Any]]) -> None:
+            for u in items:
+                await post(u)
+
+        await asyncio.gather(*(chat_stream(items) for items in by_chat.values()))
+    return statuses, first_post
+
+
+async def _main(args: argparse.Namespace) -> None:
+    fake = FakeTelegram()
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+
+    ids = itertools.count(1)
+    chats = [10_000 + i for i in range(args.chats)]
+    updates = [message_update(next(ids), chat_id, "/start") for chat_id in chats for _ in range(args.messages)]
+
+    started = time.monotonic()
+    statuses, first_post = await post_updates(args.target, args.secret, updates)
+    print(f"posted {len(updates)} updates in {time.monotonic() - started:.2f}s: {dict(statuses)}")
+
+    # ждём, пока ответы перестанут приходить
+    seen = -1
+    while seen != len(fake.calls):
+        seen = len(fake.calls)
+        await asyncio.sleep(args.settle)
+
+    latencies = [
+        fake.by_chat[c][0][0] - first_post[c] for c in chats if fake.by_chat.get(c) and c in first_post
+    ]
+    print(f"api calls: {dict(Counter(m for m, _ in fake.calls))}")
+    print(f"chats answered: {len(latencies)}/{len(chats)}")
+    if latencies:
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else latencies[-1]
+        print(f"first reply latency: p50={statistics.median(latencies) * 1000:.0f}ms p95={p95 * 1000:.0f}ms")
+    await runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Telegram: Bot API stub + webhook update generator")
+    parser.add_argument("--target", default="http://127.0.0.1:8080/webhook", help="webhook URL of the bot")
+    parser.add_argument("--secret", required=True, help="WEBHOOK_SECRET of the bot")
+    parser.add_argument("--port", type=int, default=8081, help="port for the fake Bot API (TELEGRAM_API_URL)")
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=3, help="updates per chat")
+    parser.add_argument("--settle", type=float, default=2.0, help="stop after this many seconds without API calls")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
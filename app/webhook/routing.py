@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import hmac
+import json
+import logging
+from typing import Any, Awaitable, Hashable
+
+from aiohttp import web
+from redis.asyncio import Redis
+
+from app.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = "/webhook"
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+KEY_PREFIX = "updates"
+
+UPDATES = Counter("webhook_updates_total", "Updates received by the webhook endpoint", labels=("result",))
+
+# поля апдейта, в которых лежит сообщение (chat.id) или событие пользователя (from.id)
+_MESSAGE_FIELDS = ("message", "edited_message", "channel_post", "edited_channel_post", "business_message")
+_USER_FIELDS = ("callback_query", "inline_query", "chosen_inline_result", "pre_checkout_query", "shipping_query")
+
+
+def chat_id_of(update: dict[str, Any]) -> int | None:
+    """Чат апдейта по сырому JSON (без разбора в aiogram-модели): по нему держим порядок обработки."""
+    for name in _MESSAGE_FIELDS:
+        if name in update:
+            return update[name].get("chat", {}).get("id")
+    for name in _USER_FIELDS:
+        if name in update:
+            event = update[name]
+            message = event.get("message") or {}
+            chat = message.get("chat") or {}
+            return chat.get("id") or event.get("from", {}).get("id")
+    return None
+
+
+def queue_key(worker: int, prefix: str = KEY_PREFIX) -> str:
+    return f"{prefix}:{worker}"
+
+
+def worker_for(update: dict[str, Any], workers: int) -> int:
+    """Все апдейты одного чата попадают к одному процессу — так сохраняется их порядок."""
+    key = chat_id_of(update)
+    if key is None:
+        key = update.get("update_id", 0)
+    return key % workers
+
+
+class UpdateRouter:
+    """
+    Приём вебхука: проверяет секрет Telegram и кладёт апдейт в Redis-список процесса-обработчика,
+    выбранного по chat_id. Ответ Telegram — сразу, обработка идёт в процессах app.webhook.server.
+    """
+
+    def __init__(self, redis: Redis, workers: int, secret: str, prefix: str = KEY_PREFIX) -> None:
+        self.redis = redis
+        self.workers = workers
+        self.secret = secret
+        self.prefix = prefix
+
+    async def handle(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token.encode(), self.secret.encode()):
+            UPDATES.inc(result="unauthorized")
+            return web.Response(status=401)
+        try:
+            update = await request.json()
+        except json.JSONDecodeError:
+            UPDATES.inc(result="bad_request")
+            return web.Response(status=400)
+        if not isinstance(update, dict):
+            UPDATES.inc(result="bad_request")
+            return web.Response(status=400)
+
+        worker = worker_for(update, self.workers)
+        await self.redis.rpush(queue_key(worker, self.prefix), json.dumps(update))
+        UPDATES.inc(result="accepted")
+        return web.Response()
+
+    def setup(self, app: web.Application) -> None:
+        app.router.add_post(WEBHOOK_PATH, self.handle)
+
+
+class ChatSerializer:
+    """
+    Внутри процесса апдейты разных чатов обрабатываются параллельно, одного чата — строго по очереди:
+    каждая задача чата ждёт завершения предыдущей.
+    """
+
+    def __init__(self) -> None:
+        self._tails: dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._tails)
+
+    def submit(self, key: Hashable, coro: Awaitable[Any]) -> asyncio.Task:
+        prev = self._tails.get(key)
+
+        async def run() -> Any:
+            if prev is not None:
+                # ошибка предыдущего апдейта не мешает следующему
+                await asyncio.wait({prev})
+            return await coro
+
+        task = asyncio.create_task(run())
+        self._tails[key] = task
+
+        def forget(t: asyncio.Task) -> None:
+            if self._tails.get(key) is t:
+                del self._tails[key]
+
+        task.add_done_callback(forget)
+        return task
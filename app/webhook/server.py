@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import multiprocessing
+from multiprocessing.process import BaseProcess
+
+from aiogram.types import Update
+from aiohttp import web
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from redis.asyncio import Redis
+
+from app.agenda import AgendaUpdater, MasterAgenda
+from app.bot import create_bot, create_dispatcher
+from app.config import Config, load_config
+from app.database.instrumentation import instrument_engine
+from app.database.requests import ensure_seed_service
+from app.database.session import create_engine_and_sessionmaker
+from app.events import BookingEventListener, asyncpg_dsn
+from app.metrics import Gauge, start_metrics_server
+from app.notifications import MasterNotifier
+from app.webhook.routing import ChatSerializer, UpdateRouter, chat_id_of, queue_key
+
+logger = logging.getLogger(__name__)
+
+# хендлеры бота слушают только эти типы апдейтов
+ALLOWED_UPDATES = ["message", "callback_query"]
+# сколько апдейтов один процесс обрабатывает одновременно (разные чаты)
+MAX_IN_FLIGHT = 100
+SUPERVISE_EVERY = 5.0
+
+IN_FLIGHT = Gauge("webhook_updates_in_flight", "Updates being handled by this worker process")
+
+
+def _setup_logging() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(processName)s | %(name)s | %(message)s")
+
+
+# ---- процессы-обработчики ----
+async def _worker_main(index: int) -> None:
+    config = load_config()
+    engine, sessionmaker = create_engine_and_sessionmaker(config.database_url)
+    instrument_engine(engine)
+    redis = Redis.from_url(config.redis_url)
+    # глобальный лимит Telegram — общий bucket в Redis для всех обработчиков и процесса приёма
+    bot = create_bot(config, redis=redis)
+    dp = create_dispatcher(config, sessionmaker)
+    # у каждого процесса свой реестр метрик -> свой порт: METRICS_PORT + 1 + index
+    metrics_runner = await start_metrics_server(config.metrics_port + 1 + index) if config.metrics_port else None
+
+    chats = ChatSerializer()
+    slots = asyncio.Semaphore(MAX_IN_FLIGHT)
+    key = queue_key(index)
+
+    async def process(update: Update) -> None:
+        IN_FLIGHT.inc()
+        try:
+            await dp.feed_update(bot, update, config=config, db_engine=engine)
+        except Exception as e:
+            logger.exception("Update %s failed: %s", update.update_id, e)
+        finally:
+            IN_FLIGHT.dec()
+            slots.release()
+
+    # без start_polling startup-хуки (загрузка банов и т.п.) вызываем сами
+    await dp.emit_startup(bot=bot)
+    logger.info("Update worker %d listening on %s", index, key)
+    try:
+        while True:
+            await slots.acquire()
+            item = await redis.blpop([key], timeout=5)
+            if item is None:
+                slots.release()
+                continue
+            payload = json.loads(item[1])
+            try:
+                update = Update.model_validate(payload, context={"bot": bot})
+            except ValidationError as e:
+                logger.warning("Dropping malformed update: %s", e)
+                slots.release()
+                continue
+            chat_id = chat_id_of(payload)
+            chats.submit(chat_id if chat_id is not None else ("update", update.update_id), process(update))
+    finally:
+        await dp.emit_shutdown(bot=bot)
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await redis.close()
+        await dp.storage.close()
+        await bot.session.close()
+        await engine.dispose()
+
+
+def _worker_entry(index: int) -> None:
+    load_dotenv()
+    _setup_logging()
+    try:
+        asyncio.run(_worker_main(index))
+    except KeyboardInterrupt:
+        pass
+
+
+# ---- приём вебхука ----
+def _spawn(ctx: multiprocessing.context.SpawnContext, index: int) -> BaseProcess:
+    proc = ctx.Process(target=_worker_entry, args=(index,), name=f"update-worker-{index}", daemon=True)
+    proc.start()
+    return proc
+
+
+async def _supervise(ctx: multiprocessing.context.SpawnContext, procs: list[BaseProcess]) -> None:
+    """Перезапускать упавшие обработчики: их очередь в Redis за это время копится, а не пропадает."""
+    while True:
+        await asyncio.sleep(SUPERVISE_EVERY)
+        for i, proc in enumerate(procs):
+            if not proc.is_alive():
+                logger.warning("Update worker %d exited with %s, restarting", i, proc.exitcode)
+                procs[i] = _spawn(ctx, i)
+
+
+async def _router_main(config: Config, ctx: multiprocessing.context.SpawnContext, procs: list[BaseProcess]) -> None:
+    engine, sessionmaker = create_engine_and_sessionmaker(config.database_url)
+    redis = Redis.from_url(config.redis_url)
+    bot = create_bot(config, redis=redis)
+
+    async with sessionmaker() as session:
+        await ensure_seed_service(session)
+        await session.commit()
+
+    app = web.Application()
+    UpdateRouter(redis, config.webhook_workers, config.webhook_secret).setup(app)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, config.webhook_host, config.webhook_port).start()
+    logger.info(
+        "Webhook listening on %s:%d, %d update workers", config.webhook_host, config.webhook_port, len(procs)
+    )
+    metrics_runner = await start_metrics_server(config.metrics_port) if config.metrics_port else None
+
+    if config.webhook_url:
+        await bot.set_webhook(config.webhook_url, secret_token=config.webhook_secret, allowed_updates=ALLOWED_UPDATES)
+
+    # уведомления мастерам шлёт один процесс, а не каждый обработчик
+    events = BookingEventListener(asyncpg_dsn(config.database_url))
+    events.subscribe(MasterNotifier(bot, sessionmaker, config.tz, redis=redis))
+    # открытые записи мастеров лежат в Redis — обработчики их показывают, этот процесс обновляет
+    events.subscribe(AgendaUpdater(bot, sessionmaker, MasterAgenda(config.tz, redis=redis), redis=redis))
+    events_task = asyncio.create_task(events.run())
+    supervise_task = asyncio.create_task(_supervise(ctx, procs))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        supervise_task.cancel()
+        events_task.cancel()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await runner.cleanup()
+        await redis.close()
+        await bot.session.close()
+        await engine.dispose()
+
+
+def run_webhook() -> None:
+    """
+    BOT_MODE=webhook: этот процесс принимает вебхук на WEBHOOK_PORT и раскладывает апдейты
+    по Redis-очередям WEBHOOK_WORKERS процессов-обработчиков (по chat_id — порядок в чате сохраняется).
+    FSM — общий RedisStorage, так что чат может переехать к другому процессу при смене их числа.
+    """
+    _setup_logging()
+    config = load_config()
+    ctx = multiprocessing.get_context("spawn")
+    procs = [_spawn(ctx, i) for i in range(config.webhook_workers)]
+    try:
+        asyncio.run(_router_main(config, ctx, procs))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.join(timeout=10)
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Hashable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from app.metrics import Counter, Gauge, Histogram
+from app.ratelimit import TelegramRateLimiter
+
+logger = logging.getLogger(__name__)
+
+SEND_SECONDS = Histogram("reminders_send_seconds", "Reminder send latency incl. rate-limit wait")
+SEND_RESULTS = Counter("reminders_send_total", "Reminder send attempts by result", labels=("result",))
+BACKLOG = Gauge("reminders_delivery_backlog", "Reminders accepted by the delivery stage but not sent yet")
+
+
+@dataclass(frozen=True)
+class OutgoingMessage:
+    chat_id: int
+    text: str
+    key: Hashable = None  # идентификатор для вызывающего (например, (appointment_id, kind))
+
+
+class Delivery:
+    """
+    Параллельная отправка с ограничением: не больше concurrency запросов одновременно.
+    Темп и 429 обычно держит OutboundQueue в сессии бота; limiter нужен, если бот без неё.
+    Если 429 всё же дошёл сюда — ждём retry_after и пробуем снова.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        limiter: TelegramRateLimiter | None = None,
+        concurrency: int = 10,
+        max_attempts: int = 3,
+    ) -> None:
+        self.bot = bot
+        self.limiter = limiter
+        self._sem = asyncio.Semaphore(concurrency)
+        self.max_attempts = max_attempts
+
+    async def send(self, msg: OutgoingMessage) -> bool:
+        started = time.monotonic()
+        BACKLOG.inc()
+        try:
+            async with self._sem:
+                for attempt in range(1, self.max_attempts + 1):
+                    if self.limiter:
+                        await self.limiter.acquire(msg.chat_id)
+                    try:
+                        await self.bot.send_message(msg.chat_id, msg.text)
+                    except TelegramRetryAfter as e:
+                        SEND_RESULTS.inc(result="retry_after")
+                        logger.info("Flood control for %s, retry in %ss", msg.chat_id, e.retry_after)
+                        if self.limiter:
+                            await self.limiter.penalize(msg.chat_id, e.retry_after)
+                        else:
+                            await asyncio.sleep(e.retry_after)
+                        continue
+                    except (TelegramNetworkError, TelegramServerError) as e:
+                        SEND_RESULTS.inc(result="retry_error")
+                        logger.warning("Transient error sending to %s (attempt %d): %s", msg.chat_id, attempt, e)
+                        await asyncio.sleep(min(2 ** attempt, 30))
+                        continue
+                    except TelegramForbiddenError as e:
+                        # пользователь заблокировал бота — повторять бессмысленно
+                        SEND_RESULTS.inc(result="forbidden")
+                        logger.info("Reminder to %s rejected: %s", msg.chat_id, e)
+                        return False
+                    except Exception as e:
+                        SEND_RESULTS.inc(result="failed")
+                        logger.warning("Failed to send reminder to %s: %s", msg.chat_id, e)
+                        return False
+                    SEND_RESULTS.inc(result="ok")
+                    return True
+
+                SEND_RESULTS.inc(result="gave_up")
+                logger.warning("Gave up sending reminder to %s after %d attempts", msg.chat_id, self.max_attempts)
+                return False
+        finally:
+            BACKLOG.dec()
+            SEND_SECONDS.observe(time.monotonic() - started)
+
+    async def send_many(self, messages: list[OutgoingMessage]) -> list[bool]:
+        """Отправить пачку; результат — по сообщению, в том же порядке."""
+        return list(await asyncio.gather(*(self.send(m) for m in messages)))
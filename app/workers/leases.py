@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import socket
+import time
+import uuid
+from typing import Callable
+
+from redis.asyncio import Redis
+
+from app.metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+OWNED_SHARDS = Gauge("reminders_owned_shards", "Reminder shards leased by this worker")
+
+# SET NX PX + новый fencing-номер (монотонный INCR на шард) одной операцией.
+_ACQUIRE = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return false
+end
+local fence = redis.call('INCR', KEYS[2])
+local value = ARGV[1] .. ':' .. fence
+redis.call('SET', KEYS[1], value, 'PX', ARGV[2])
+return value
+"""
+
+# Продлить/отпустить можно только свою аренду (сравнение со значением вместе с fencing-номером).
+_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class ShardLeases:
+    """
+    Аренда шардов очереди напоминаний между репликами воркера.
+
+    Каждая реплика шлёт heartbeat в ZSET живых воркеров и держит не больше своей
+    "честной доли" шардов: ceil(shards / живые воркеры). Аренда — ключ с TTL, который
+    продлевается каждые ttl/3; упавший воркер перестаёт продлевать, и через ttl его шарды
+    подхватывают остальные. Значение аренды содержит fencing-номер: pop из очереди
+    сверяет его атомарно, поэтому воркер с протухшей арендой ничего не заберёт.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        shards: int,
+        ttl: float = 15.0,
+        prefix: str = "reminders",
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.redis = redis
+        self.shards = shards
+        self.ttl_ms = int(ttl * 1000)
+        self.prefix = prefix
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.owned: dict[int, str] = {}  # shard -> значение аренды ("<worker_id>:<fence>")
+        self._acquire = redis.register_script(_ACQUIRE)
+        self._renew = redis.register_script(_RENEW)
+        self._release = redis.register_script(_RELEASE)
+        # heartbeat'ы реплик сравниваются между собой — часы общие (wall clock)
+        self._clock = clock
+
+    @property
+    def workers_key(self) -> str:
+        return f"{self.prefix}:workers"
+
+    def lease_key(self, shard: int) -> str:
+        return f"{self.prefix}:lease:{shard}"
+
+    def fence_key(self, shard: int) -> str:
+        return f"{self.prefix}:fence:{shard}"
+
+    def lease_for(self, shard: int) -> tuple[str, str] | None:
+        value = self.owned.get(shard)
+        return (self.lease_key(shard), value) if value else None
+
+    def drop(self, shard: int) -> None:
+        """Забыть шард локально (например, pop сообщил LeaseLost)."""
+        self.owned.pop(shard, None)
+        OWNED_SHARDS.set(len(self.owned))
+
+    async def _fair_share(self) -> int:
+        now = self._clock()
+        ttl = self.ttl_ms / 1000
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(self.workers_key, {self.worker_id: now})
+            pipe.zremrangebyscore(self.workers_key, "-inf", now - ttl)
+            pipe.zcard(self.workers_key)
+            _, _, alive = await pipe.execute()
+        return math.ceil(self.shards / max(int(alive), 1))
+
+    async def renew(self) -> None:
+        for shard, value in list(self.owned.items()):
+            ok = await self._renew(keys=[self.lease_key(shard)], args=[value, self.ttl_ms])
+            if not ok:
+                logger.warning("Lost lease on reminders shard %s", shard)
+                self.drop(shard)
+
+    async def rebalance(self) -> None:
+        """Heartbeat + продление + добор свободных шардов до честной доли (или отдача лишних)."""
+        share = await self._fair_share()
+        await self.renew()
+
+        # начинаем обход с "своего" места, чтобы реплики не толпились на шарде 0
+        start = hash(self.worker_id) % self.shards
+        for i in range(self.shards):
+            if len(self.owned) >= share:
+                break
+            shard = (start + i) % self.shards
+            if shard in self.owned:
+                continue
+            value = await self._acquire(
+                keys=[self.lease_key(shard), self.fence_key(shard)],
+                args=[self.worker_id, self.ttl_ms],
+            )
+            if value:
+                value = value.decode() if isinstance(value, bytes) else value
+                self.owned[shard] = value
+                logger.info("Acquired reminders shard %s (lease %s)", shard, value)
+
+        # пришла новая реплика — отдаём лишнее, она подхватит сразу
+        while len(self.owned) > share:
+            shard, value = self.owned.popitem()
+            await self._release(keys=[self.lease_key(shard)], args=[value])
+            logger.info("Released reminders shard %s for rebalancing", shard)
+
+        OWNED_SHARDS.set(len(self.owned))
+
+    async def run(self) -> None:
+        """Фоновая задача: держать аренды, пока воркер жив."""
+        interval = self.ttl_ms / 1000 / 3
+        while True:
+            try:
+                await self.rebalance()
+            except Exception as e:
+                logger.exception("Lease maintenance error: %s", e)
+            await asyncio.sleep(interval)
+
+    async def release_all(self) -> None:
+        for shard, value in list(self.owned.items()):
+            await self._release(keys=[self.lease_key(shard)], args=[value])
+        self.owned.clear()
+        OWNED_SHARDS.set(0)
+        await self.redis.zrem(self.workers_key, self.worker_id)
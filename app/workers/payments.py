@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import logging
+import time
+
+from aiohttp import web
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.config import load_config
+from app.database.requests import apply_payment_events, purge_payment_events
+from app.metrics import Counter, start_metrics_server
+from app.payments.service import PROVIDERS
+from app.payments.webhook import PaymentWebhook
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_EVENTS_APPLIED = Counter("payment_events_applied_total", "Provider payment notices applied", labels=("result",))
+
+# уведомлений на транзакцию: платежи и записи пачки блокируются двумя запросами
+APPLY_BATCH = 500
+# очередь опрашивается и без сигнала от вебхука: другие реплики, уведомления, пришедшие до старта
+POLL_EVERY = 5
+# применённые уведомления хранятся столько дней — в это окно повтор от провайдера не создаёт строку
+KEEP_DAYS = 30
+PURGE_EVERY = 60 * 60
+
+
+async def _drain(Session: async_sessionmaker, batch: int = APPLY_BATCH) -> dict[str, int]:
+    """Применять пачки, пока очередь не опустеет; каждая пачка — своя транзакция."""
+    total: dict[str, int] = {}
+    while True:
+        async with Session() as session:
+            results = await apply_payment_events(session, limit=batch)
+        for result, n in results.items():
+            total[result] = total.get(result, 0) + n
+            PAYMENT_EVENTS_APPLIED.inc(n, result=result)
+        if sum(results.values()) < batch:
+            return total
+
+
+async def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+
+    config = load_config()
+    if not config.payment_webhook_secret:
+        raise RuntimeError("PAYMENT_WEBHOOK_SECRET is required for the payments worker")
+    engine = create_async_engine(config.database_url, pool_pre_ping=True)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    metrics_runner = await start_metrics_server(config.metrics_port) if config.metrics_port else None
+
+    wake = asyncio.Event()
+    app = web.Application()
+    PaymentWebhook(Session, PROVIDERS, config.payment_webhook_secret, on_queued=wake.set).setup(app)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, config.webhook_host, config.payment_webhook_port).start()
+    logger.info("Payment webhooks on %s:%d/payments/<provider>", config.webhook_host, config.payment_webhook_port)
+
+    last_purge = 0.0
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=POLL_EVERY)
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
+            try:
+                results = await _drain(Session)
+                if results:
+                    logger.info("Payment notices applied: %s", results)
+                if results.get("conflict") or results.get("amount_mismatch"):
+                    logger.warning("Payment notices need manual review (payment_events.result): %s", results)
+                if time.monotonic() - last_purge > PURGE_EVERY:
+                    async with Session() as session:
+                        async with session.begin():
+                            before = dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=KEEP_DAYS)
+                            purged = await purge_payment_events(session, before)
+                    last_purge = time.monotonic()
+                    if purged:
+                        logger.info("Purged %d applied payment notices", purged)
+            except ProgrammingError as e:
+                logger.warning("DB schema not ready yet, retry later: %s", e)
+            except Exception as e:
+                logger.exception("Payments worker error: %s", e)
+    finally:
+        await runner.cleanup()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
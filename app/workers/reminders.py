@@ -3,89 +3,203 @@ from __future__ import annotations
 import asyncio
 import datetime as dt
 import logging
-
-from aiogram import Bot
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
+import time
 
 from redis.asyncio import Redis
 from sqlalchemy import and_, select
 from sqlalchemy.exc import ProgrammingError
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.orm import selectinload
 
+from app.bot import create_bot
 from app.config import load_config
 from app.database.models import Appointment
+from app.database.requests import (
+    bind_reminder_bits,
+    claim_outbox_batch,
+    enqueue_due_reminders,
+    get_missed_reminders,
+    get_reminder_watermark,
+    mark_outbox_failed,
+    mark_outbox_sent,
+    set_reminder_watermark,
+)
+from app.events import BookingEvent, BookingEventListener, asyncpg_dsn
+from app.metrics import start_metrics_server
+from app.reminder_queue import LeaseLost, ReminderQueue
+from app.reminders import ReminderKind, reminded_kinds
+from app.workers.delivery import Delivery, OutgoingMessage
+from app.workers.leases import ShardLeases
 
 logger = logging.getLogger(__name__)
 
-LOCK_KEY = "reminders:lock"
+# как часто сверять очередь с БД (страховка поверх событий LISTEN/NOTIFY)
+RECONCILE_EVERY = 60 * 60
+# как часто досылать пропущенное (и сдвигать отметку); пачка — сколько записей за один запрос
+CATCH_UP_EVERY = 5 * 60
+CATCH_UP_BATCH = 500
+# без сохранённой отметки (первый запуск) смотрим назад не дальше суток
+CATCH_UP_HORIZON = dt.timedelta(hours=24)
+WATERMARK = "worker"
+OUTBOX_WAKEUP_KEY = "reminders:outbox:wakeup"
+OUTBOX_BATCH = 100
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_MAX_WAIT = 30.0
+# не спим дольше, чтобы быстро начать обслуживать только что взятые шарды
+MAX_WAIT = 5.0
 
 
-async def _tick(session: AsyncSession, bot: Bot, tz: dt.tzinfo) -> None:
-    """Send reminders and mark flags (runs inside a DB transaction)."""
-    try:
-        now = dt.datetime.now(dt.timezone.utc)
+async def _catch_up(Session: async_sessionmaker, queue: ReminderQueue, batch: int = CATCH_UP_BATCH) -> int:
+    """
+    Досылка после простоя: всё, чей срок напоминания попал в (отметка, now] и не отправлено,
+    ставится в очередь "на сейчас" пачками по batch — один запрос на пачку сразу по всем срокам.
+    Отметка сдвигается только после успешного прохода.
+    """
+    now = dt.datetime.now(dt.timezone.utc)
+    async with Session() as session:
+        since = await get_reminder_watermark(session, WATERMARK)
+    since = since or now - CATCH_UP_HORIZON
 
-        async def send_and_mark(appt: Appointment, kind: str) -> None:
-            local = appt.starts_at.astimezone(tz)
-            master_name = appt.master.name if appt.master else str(appt.master_id)
-            service_name = appt.service.name if appt.service else str(appt.service_id)
+    requeued = 0
+    after = None
+    while True:
+        async with Session() as session:
+            rows = await get_missed_reminders(session, queue.kinds, since=since, now=now, after=after, limit=batch)
+        if not rows:
+            break
+        await queue.requeue_now([(appt_id, kind) for appt_id, kind, _ in rows])
+        requeued += len(rows)
+        last_id, last_kind, last_starts_at = rows[-1]
+        after = (last_starts_at, last_id, last_kind)
+        if len(rows) < batch:
+            break
 
-            text = (
-                f"⏰ Напоминание: у вас запись {local.strftime('%d.%m %H:%M')}\n"
-                f"Мастер: {master_name}\n"
-                f"Услуга: {service_name}"
-            )
-            try:
-                await bot.send_message(appt.user_id, text)
-            except Exception as e:
-                logger.warning("Failed to send reminder to %s: %s", appt.user_id, e)
-                return
-
-            if kind == "24h":
-                appt.reminded_24h = True
-            else:
-                appt.reminded_1h = True
-
-        w = dt.timedelta(minutes=5)
-
-        t24 = now + dt.timedelta(hours=24)
-        q24 = await session.execute(
-            select(Appointment)
-            .options(selectinload(Appointment.master), selectinload(Appointment.service))
-            .where(
-                and_(
-                    Appointment.status == "active",
-                    Appointment.reminded_24h.is_(False),
-                    Appointment.starts_at >= t24,
-                    Appointment.starts_at < t24 + w,
-                )
-            )
-        )
-        for appt in q24.scalars().all():
-            await send_and_mark(appt, "24h")
-
-        t1 = now + dt.timedelta(hours=1)
-        q1 = await session.execute(
-            select(Appointment)
-            .options(selectinload(Appointment.master), selectinload(Appointment.service))
-            .where(
-                and_(
-                    Appointment.status == "active",
-                    Appointment.reminded_1h.is_(False),
-                    Appointment.starts_at >= t1,
-                    Appointment.starts_at < t1 + w,
-                )
+    async with Session() as session:
+        async with session.begin():
+            await set_reminder_watermark(session, WATERMARK, now)
+    return requeued
+
+
+async def _reconcile(session: AsyncSession, queue: ReminderQueue) -> int:
+    """Поставить в очередь все будущие активные записи (идемпотентно: ZADD перезаписывает score)."""
+    now = dt.datetime.now(dt.timezone.utc)
+    res = await session.execute(
+        select(Appointment).where(
+            and_(
+                Appointment.status == "active",
+                Appointment.starts_at > now,
             )
         )
-        for appt in q1.scalars().all():
-            await send_and_mark(appt, "1h")
+    )
+    scheduled = 0
+    for appt in res.scalars().all():
+        skip = reminded_kinds(appt.reminded_mask, queue.kinds)
+        scheduled += await queue.schedule(appt.id, appt.starts_at, skip=skip, now=now)
+    return scheduled
+
 
+def _schedule_on_event(queue: ReminderQueue):
+    """Подписчик BookingEventListener: ставит/снимает напоминания по изменениям записей."""
+
+    async def on_event(event: BookingEvent) -> None:
+        if event.table != "appointments":
+            return
+        moved = event.starts_at != event.old_starts_at
+        if event.status == "active" and (event.status_changed or moved):
+            await queue.schedule(event.id, event.starts_at)
+        elif event.status == "cancelled" and event.status_changed:
+            await queue.unschedule(event.id)
+
+    return on_event
+
+
+def _reminder_text(payload: dict, tz: dt.tzinfo) -> str:
+    local = dt.datetime.fromisoformat(payload["starts_at"]).astimezone(tz)
+    return (
+        f"⏰ Напоминание: у вас запись {local.strftime('%d.%m %H:%M')}\n"
+        f"Мастер: {payload['master_name']}\n"
+        f"Услуга: {payload['service_name']}"
+    )
+
+
+async def _tick(session: AsyncSession, due: list[tuple[int, str]], kinds: tuple[ReminderKind, ...]) -> int:
+    """Move popped reminders (all offsets at once) into the outbox and mark their bits in one statement."""
+    try:
+        now = dt.datetime.now(dt.timezone.utc)
+        return await enqueue_due_reminders(session, due, kinds, now)
     except ProgrammingError as e:
         # DB is not migrated yet
         logger.warning("DB schema not ready yet, retry later: %s", e)
-        return
+        return 0
+
+
+async def _wake_dispatcher(r: Redis) -> None:
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.lpush(OUTBOX_WAKEUP_KEY, "1")
+        pipe.ltrim(OUTBOX_WAKEUP_KEY, 0, 0)
+        await pipe.execute()
+
+
+async def _dispatch(Session: async_sessionmaker, delivery: Delivery, tz: dt.tzinfo) -> int:
+    """Отправить одну пачку из outbox. Транзакции — только на claim и на отметку результата."""
+    now = dt.datetime.now(dt.timezone.utc)
+    async with Session() as session:
+        async with session.begin():
+            batch = await claim_outbox_batch(session, now, limit=OUTBOX_BATCH)
+    if not batch:
+        return 0
+
+    # запись уже началась (outbox долго не разбирали) — напоминать поздно
+    expired = [o for o in batch if dt.datetime.fromisoformat(o.payload["starts_at"]) <= now]
+    live = [o for o in batch if o not in expired]
+    messages = [OutgoingMessage(chat_id=o.chat_id, text=_reminder_text(o.payload, tz), key=o) for o in live]
+    results = await delivery.send_many(messages)
+
+    done_at = dt.datetime.now(dt.timezone.utc)
+    async with Session() as session:
+        async with session.begin():
+            await mark_outbox_sent(session, [m.key.id for m, ok in zip(messages, results) if ok], done_at)
+            for o in expired:
+                await mark_outbox_failed(session, o.id, "appointment already started", retry_at=None)
+            for m, ok in zip(messages, results):
+                if ok:
+                    continue
+                o = m.key
+                retry_at = None
+                if o.attempts < OUTBOX_MAX_ATTEMPTS:
+                    retry_at = done_at + dt.timedelta(seconds=min(30 * 2 ** (o.attempts - 1), 15 * 60))
+                await mark_outbox_failed(session, o.id, "delivery failed", retry_at=retry_at)
+    return len(batch)
+
+
+async def _dispatch_loop(Session: async_sessionmaker, delivery: Delivery, tz: dt.tzinfo, r: Redis) -> None:
+    while True:
+        try:
+            if not await _dispatch(Session, delivery, tz):
+                # пусто — ждём сигнала от тика (или таймаута: пора повторить отложенные ретраи)
+                await r.blpop([OUTBOX_WAKEUP_KEY], timeout=OUTBOX_MAX_WAIT)
+        except ProgrammingError as e:
+            logger.warning("DB schema not ready yet, retry later: %s", e)
+            await asyncio.sleep(10)
+        except Exception as e:
+            logger.exception("Reminders dispatch error: %s", e)
+            await asyncio.sleep(10)
+
+
+async def _bind_kinds(Session: async_sessionmaker, kinds: tuple[ReminderKind, ...]) -> tuple[ReminderKind, ...]:
+    """
+    Биты reminded_mask закреплены за сроками в БД: REMINDER_OFFSETS можно переставлять и сокращать.
+    Первый старт закрепляет биты по текущему порядку REMINDER_OFFSETS — тому же, по которому они ставились раньше.
+    """
+    while True:
+        try:
+            async with Session() as session:
+                kinds = await bind_reminder_bits(session, kinds)
+        except ProgrammingError as e:
+            logger.warning("DB schema not ready yet, retry later: %s", e)
+            await asyncio.sleep(10)
+            continue
+        logger.info("Reminder offsets: %s", ", ".join(f"{k.name} (bit {k.bit})" for k in kinds))
+        return kinds
 
 
 async def main() -> None:
@@ -94,27 +208,93 @@ async def main() -> None:
     config = load_config()
 
     if not config.redis_url:
-        raise RuntimeError("REDIS_URL is required for reminders worker (distributed lock).")
+        raise RuntimeError("REDIS_URL is required for reminders worker (reminder queue).")
 
     engine = create_async_engine(config.database_url, pool_pre_ping=True)
     Session = async_sessionmaker(engine, expire_on_commit=False)
 
-    bot = Bot(token=config.bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    # лимиты Telegram и ретраи на 429 — в общей очереди исходящих вызовов (см. app.outbound);
+    # глобальный лимит — общий bucket в Redis с процессами бота
     r = Redis.from_url(config.redis_url, decode_responses=True)
+    bot = create_bot(config, redis=r)
+    kinds = await _bind_kinds(Session, config.reminder_offsets)
+    queue = ReminderQueue(r, kinds, shards=config.reminder_shards)
+    leases = ShardLeases(r, shards=config.reminder_shards)
+    delivery = Delivery(bot, concurrency=config.reminders_concurrency)
 
+    metrics_runner = await start_metrics_server(config.metrics_port) if config.metrics_port else None
+
+    events = BookingEventListener(asyncpg_dsn(config.database_url))
+    events.subscribe(_schedule_on_event(queue))
+
+    async def resync() -> None:
+        # пока LISTEN-соединения не было, события могли потеряться
+        async with Session() as session:
+            n = await _reconcile(session, queue)
+        logger.info("Reminders queue resynced after (re)connect: %d entries", n)
+
+    events.on_resync(resync)
+    events_task = asyncio.create_task(events.run())
+
+    # аренды шардов держит фоновая задача; первая итерация rebalance — сразу при старте
+    lease_task = asyncio.create_task(leases.run())
+    # отправка живёт отдельно от тика: медленный Telegram не держит транзакции открытыми
+    dispatch_task = asyncio.create_task(_dispatch_loop(Session, delivery, config.tz, r))
+
+    last_reconcile = 0.0
+    last_catch_up = 0.0
     try:
         while True:
             try:
-                got = await r.set(LOCK_KEY, "1", nx=True, ex=30)
-                if got:
+                if not leases.owned:
+                    # все шарды разобраны другими репликами — ждём, пока кто-нибудь не упадёт/не уступит
+                    await asyncio.sleep(1)
+                    continue
+
+                # сверку с БД и досылку делает владелец шарда 0, а не каждая реплика
+                if 0 in leases.owned and time.monotonic() - last_reconcile > RECONCILE_EVERY:
                     async with Session() as session:
-                        async with session.begin():
-                            await _tick(session, bot, config.tz)
+                        n = await _reconcile(session, queue)
+                    logger.info("Reminders queue reconciled: %d entries", n)
+                    last_reconcile = time.monotonic()
+                if 0 in leases.owned and time.monotonic() - last_catch_up > CATCH_UP_EVERY:
+                    n = await _catch_up(Session, queue)
+                    if n:
+                        logger.info("Reminders catch-up requeued %d missed reminders", n)
+                    last_catch_up = time.monotonic()
+
+                # спим, пока ничего не пора отправлять — без запросов к БД
+                await queue.wait_next(leases.owned, max_wait=MAX_WAIT)
+
+                for shard in list(leases.owned):
+                    lease = leases.lease_for(shard)
+                    if lease is None:
+                        continue
+                    try:
+                        due = await queue.pop_due(shard, lease=lease)
+                    except LeaseLost:
+                        logger.warning("Lease on reminders shard %s lost before pop", shard)
+                        leases.drop(shard)
+                        continue
+                    if due:
+                        async with Session() as session:
+                            async with session.begin():
+                                enqueued = await _tick(session, due, queue.kinds)
+                        if enqueued:
+                            await _wake_dispatcher(r)
+            except ProgrammingError as e:
+                logger.warning("DB schema not ready yet, retry later: %s", e)
+                await asyncio.sleep(10)
             except Exception as e:
                 logger.exception("Reminders loop error: %s", e)
-
-            await asyncio.sleep(10)
+                await asyncio.sleep(10)
     finally:
+        lease_task.cancel()
+        dispatch_task.cancel()
+        events_task.cancel()
+        await leases.release_all()
+        if metrics_runner:
+            await metrics_runner.cleanup()
         await r.close()
         await bot.session.close()
         await engine.dispose()
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import logging
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.config import Config, load_config
+from app.database.models import Appointment, Master
+from app.database.requests import (
+    claim_report_dirty,
+    get_reminder_watermark,
+    masters_missing_day_schedules,
+    materialize_day_schedules,
+    refresh_report_days,
+    set_reminder_watermark,
+)
+from app.metrics import Counter, start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+REPORT_DAYS_REFRESHED = Counter(
+    "report_days_refreshed_total", "Master-days recomputed into report rollups", labels=("reason",)
+)
+SCHEDULE_DAYS_WRITTEN = Counter(
+    "schedule_days_materialized_total", "Per-date master schedule rows written", labels=("reason",)
+)
+
+# как часто забирать отметки report_dirty и сколько за одну транзакцию
+REFRESH_EVERY = 30
+DIRTY_BATCH = 1000
+# rollup'ы ведутся до сегодня + AHEAD_DAYS (загрузка на будущее); дальше — по мере наступления дней
+AHEAD_DAYS = 31
+# первичное заполнение и продление — кусками по столько дней на транзакцию
+EXTEND_CHUNK_DAYS = 31
+# отметка в reminder_watermarks: первый день, который ещё не заполнен (локальная полночь)
+WATERMARK = "reports"
+# расписание мастеров раскладывается по датам на столько дней вперёд (запись — на 14 дней)
+SCHEDULE_HORIZON_DAYS = 60
+# полная сверка раскладки с правилами (новый день горизонта, смена fallback-часов в .env);
+# между сверками дораскладываются только мастера, у которых правки правил удалили строки
+SCHEDULE_FULL_EVERY = 60 * 60
+
+
+def _today(tz: dt.tzinfo) -> dt.date:
+    return dt.datetime.now(tz=tz).date()
+
+
+async def _covered_until(Session: async_sessionmaker, tz: dt.tzinfo) -> dt.date | None:
+    async with Session() as session:
+        value = await get_reminder_watermark(session, WATERMARK)
+    return value.astimezone(tz).date() if value else None
+
+
+async def _extend(Session: async_sessionmaker, config: Config) -> int:
+    """
+    Заполнить rollup'ы всех мастеров до сегодня + AHEAD_DAYS. Первый запуск начинает с самой ранней записи
+    (единственный проход по всей истории), дальше каждый день добавляет только новые даты.
+    """
+    tz = config.tz
+    target = _today(tz) + dt.timedelta(days=AHEAD_DAYS)
+    start = await _covered_until(Session, tz)
+    if start is None:
+        async with Session() as session:
+            earliest = await session.scalar(select(func.min(Appointment.starts_at)))
+        start = min(earliest.astimezone(tz).date(), _today(tz)) if earliest else _today(tz)
+
+    refreshed = 0
+    while start < target:
+        end = min(start + dt.timedelta(days=EXTEND_CHUNK_DAYS), target)
+        days = [start + dt.timedelta(days=i) for i in range((end - start).days)]
+        async with Session() as session:
+            async with session.begin():
+                master_ids = (await session.execute(select(Master.id))).scalars().all()
+                refreshed += await refresh_report_days(
+                    session,
+                    {(m, d) for m in master_ids for d in days},
+                    tz,
+                    config.work_start_hour,
+                    config.work_end_hour,
+                )
+                await set_reminder_watermark(session, WATERMARK, dt.datetime.combine(end, dt.time(), tzinfo=tz))
+        start = end
+    REPORT_DAYS_REFRESHED.inc(refreshed, reason="extend")
+    return refreshed
+
+
+async def _drain(Session: async_sessionmaker, config: Config, batch: int = DIRTY_BATCH) -> int:
+    """Пересчитать дни, отмеченные триггерами. Отметки удаляются в той же транзакции, что и пересчёт."""
+    tz = config.tz
+    covered = await _covered_until(Session, tz)
+    if covered is None:
+        return 0
+    today = _today(tz)
+
+    refreshed = 0
+    while True:
+        async with Session() as session:
+            async with session.begin():
+                marks = await claim_report_dirty(session, limit=batch)
+                pairs: set[tuple[int, dt.date]] = set()
+                for master_id, starts_at, day in marks:
+                    if starts_at is not None:
+                        pairs.add((master_id, starts_at.astimezone(tz).date()))
+                    elif day is not None:
+                        pairs.add((master_id, day))
+                    else:
+                        pairs.update((master_id, today + dt.timedelta(days=i)) for i in range((covered - today).days))
+                # дни за пределами заполненного диапазона заполнит _extend
+                pairs = {(m, d) for m, d in pairs if d < covered}
+                refreshed += await refresh_report_days(session, pairs, tz, config.work_start_hour, config.work_end_hour)
+        if len(marks) < batch:
+            break
+    REPORT_DAYS_REFRESHED.inc(refreshed, reason="dirty")
+    return refreshed
+
+
+async def _materialize_schedules(Session: async_sessionmaker, config: Config, full: bool) -> int:
+    """Разложить расписание на [вчера, сегодня + SCHEDULE_HORIZON_DAYS]: всех мастеров (full) или только с пропусками."""
+    today = _today(config.tz)
+    first, last = today - dt.timedelta(days=1), today + dt.timedelta(days=SCHEDULE_HORIZON_DAYS)
+    async with Session() as session:
+        async with session.begin():
+            master_ids = None if full else await masters_missing_day_schedules(session, first, last)
+            if master_ids is not None and not master_ids:
+                return 0
+            written = await materialize_day_schedules(
+                session, first, last, config.work_start_hour, config.work_end_hour, master_ids=master_ids
+            )
+    SCHEDULE_DAYS_WRITTEN.inc(written, reason="full" if full else "missing")
+    return written
+
+
+async def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+
+    config = load_config()
+    engine = create_async_engine(config.database_url, pool_pre_ping=True)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    metrics_runner = await start_metrics_server(config.metrics_port) if config.metrics_port else None
+
+    last_full: float | None = None
+    try:
+        while True:
+            try:
+                # раскладка — раньше отчётов: они берут из неё рабочие минуты
+                full = last_full is None or time.monotonic() - last_full > SCHEDULE_FULL_EVERY
+                n = await _materialize_schedules(Session, config, full=full)
+                if full:
+                    last_full = time.monotonic()
+                if n:
+                    logger.info("Master schedules materialized: %d days", n)
+                n = await _extend(Session, config)
+                if n:
+                    logger.info("Report rollups extended: %d master-days", n)
+                n = await _drain(Session, config)
+                if n:
+                    logger.info("Report rollups refreshed: %d master-days", n)
+            except ProgrammingError as e:
+                logger.warning("DB schema not ready yet, retry later: %s", e)
+            except Exception as e:
+                logger.exception("Reports worker error: %s", e)
+            await asyncio.sleep(REFRESH_EVERY)
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+"""
+Микробенчмарк кэша клавиатур: сколько CPU на апдейт уходит на разметку шагов записи
+без кэша (как раньше) и с кэшем.
+
+    python -m benchmarks.keyboards
+"""
+from __future__ import annotations
+
+import datetime as dt
+import timeit
+from zoneinfo import ZoneInfo
+
+from app.keyboards import builders
+
+TZ = ZoneInfo("Europe/Moscow")
+TODAY = dt.date(2026, 10, 19)
+MASTERS = [(i, f"Мастер {i}") for i in range(1, 9)]
+SERVICES = [(i, f"Услуга {i}") for i in range(1, 13)]
+SLOTS = [dt.datetime(2026, 10, 20, 10, tzinfo=TZ) + dt.timedelta(minutes=30 * i) for i in range(20)]
+
+
+def one_booking_flow() -> None:
+    # разметка, которую бот отдаёт за один проход записи: меню -> мастер -> услуга -> дата -> время -> подтверждение
+    builders.main_menu_kb()
+    builders.masters_kb(MASTERS)
+    builders.services_kb(SERVICES)
+    builders.calendar_14d_kb(TODAY)
+    builders.time_slots_kb(SLOTS, TZ)
+    builders.confirm_kb()
+
+
+def one_booking_flow_uncached() -> None:
+    builders.main_menu_kb.__wrapped__()
+    builders.masters_kb.__wrapped__(MASTERS)
+    builders.services_kb.__wrapped__(SERVICES)
+    builders.calendar_14d_kb.__wrapped__(TODAY)
+    builders.time_slots_kb.__wrapped__(SLOTS, TZ)
+    builders.confirm_kb.__wrapped__()
+
+
+def main() -> None:
+    number = 2000
+    steps = 6
+    for name, fn in (("uncached", one_booking_flow_uncached), ("cached", one_booking_flow)):
+        fn()  # прогрев (и заполнение кэша)
+        best = min(timeit.repeat(fn, number=number, repeat=5)) / number
+        print(f"{name:>9}: {best * 1e6:8.1f} µs per flow, {best / steps * 1e6:6.1f} µs per update")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,19 +3,17 @@ import logging
 
 from dotenv import load_dotenv
 
-from aiogram import Bot, Dispatcher
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.fsm.storage.redis import RedisStorage
+from redis.asyncio import Redis
 
+from app.bot import create_bot, create_dispatcher
 from app.config import load_config
+from app.database.instrumentation import instrument_engine
 from app.database.session import create_engine_and_sessionmaker
 from app.database.requests import ensure_seed_service
-from app.handlers.user import router as user_router
-from app.handlers.admin import router as admin_router
-from app.middlewares.db import DbSessionMiddleware
-from app.middlewares.ban import BanMiddleware
+from app.metrics import start_metrics_server
+from app.events import BookingEventListener, asyncpg_dsn
+from app.notifications import MasterNotifier
+from app.agenda import AgendaUpdater
 
 
 async def main() -> None:
@@ -29,20 +27,19 @@ async def main() -> None:
 
     config = load_config()
     engine, sessionmaker = create_engine_and_sessionmaker(config.database_url)
+    instrument_engine(engine)
 
-    bot = Bot(
-        token=config.bot_token,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
-    )
-
-    storage = RedisStorage.from_url(config.redis_url) if config.redis_url else MemoryStorage()
-    dp = Dispatcher(storage=storage)
+    redis = Redis.from_url(config.redis_url) if config.redis_url else None
+    bot = create_bot(config, redis=redis)
+    dp = create_dispatcher(config, sessionmaker)
 
-    dp.update.middleware(DbSessionMiddleware(sessionmaker))
-    dp.update.middleware(BanMiddleware(config.banned_ids))
+    metrics_runner = await start_metrics_server(config.metrics_port) if config.metrics_port else None
 
-    dp.include_router(user_router)
-    dp.include_router(admin_router)
+    # изменения записей приходят push'ем из Postgres (LISTEN/NOTIFY), а не опросом
+    events = BookingEventListener(asyncpg_dsn(config.database_url))
+    events.subscribe(MasterNotifier(bot, sessionmaker, config.tz, redis=redis))
+    events.subscribe(AgendaUpdater(bot, sessionmaker, dp["agenda"], redis=redis))
+    events_task = asyncio.create_task(events.run())
 
     try:
         async with sessionmaker() as session:
@@ -50,11 +47,25 @@ async def main() -> None:
             await session.commit()
 
         # Reminders are handled by a separate docker service: app.workers.reminders
+        # (it schedules them from the same booking events stream)
+        await bot.delete_webhook()  # на случай, если раньше бот работал в режиме webhook
         await dp.start_polling(bot, config=config, db_engine=engine)
     finally:
+        events_task.cancel()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        if redis:
+            await redis.close()
         await bot.session.close()
         await engine.dispose()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    load_dotenv()
+    if load_config().bot_mode == "webhook":
+        # приём вебхука + WEBHOOK_WORKERS процессов-обработчиков (app/webhook)
+        from app.webhook.server import run_webhook
+
+        run_webhook()
+    else:
+        asyncio.run(main())
@@ -0,0 +1,51 @@
+import asyncio
+import datetime as dt
+
+import app.agenda as agenda_mod
+from app.agenda import MasterAgenda
+from app.database.requests import MasterAgendaRow
+
+
+def test_master_agenda_prefetch_and_invalidate(monkeypatch):
+    tz = dt.timezone.utc
+    day = dt.date(2026, 10, 19)
+    now = [0.0]
+    agenda = MasterAgenda(tz, ttl=600, clock=lambda: now[0])
+    rows = [MasterAgendaRow(1, dt.datetime(2026, 10, 20, 10, tzinfo=tz), dt.datetime(2026, 10, 20, 11, tzinfo=tz),
+                            "pending_payment", "Стрижка", 5, None)]
+    calls = []
+
+    async def fake_get(session, tz, master_id, first, days=2):
+        calls.append(first)
+        if master_id == 2:
+            # событие по записям мастера пришло, пока шёл запрос
+            await agenda.invalidate(2)
+        return "Анна", list(rows)
+
+    monkeypatch.setattr(agenda_mod, "get_master_agenda", fake_get)
+
+    async def run():
+        assert "Записей нет." in await agenda.view(None, 1, day)
+        tomorrow = await agenda.view(None, 1, day + dt.timedelta(days=1))
+        assert "10:00–11:00 — Стрижка — user_id=5 — ⏳ не оплачено" in tomorrow
+        assert calls == [day]  # завтра — из того же запроса
+
+        await agenda.invalidate(1)
+        await agenda.view(None, 1, day + dt.timedelta(days=1))
+        assert len(calls) == 2
+
+        now[0] = 601  # срок отрисовки вышел
+        await agenda.view(None, 1, day + dt.timedelta(days=1))
+        assert len(calls) == 3
+
+        # отрисовка, посчитанная до события, не читается после него
+        await agenda.view(None, 2, day)
+        await agenda.view(None, 2, day)
+        assert len(calls) == 5
+
+        await agenda.pin(1, 100, 7, "tomorrow")
+        assert await agenda.pinned(1) == (100, 7, "tomorrow")
+        await agenda.unpin(1)
+        assert await agenda.pinned(1) is None
+
+    asyncio.run(run())
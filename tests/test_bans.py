@@ -0,0 +1,88 @@
+import asyncio
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message, Update
+from aiohttp.test_utils import TestServer
+
+import app.bans
+from app.bans import BanList
+from app.middlewares.ban import BanMiddleware
+from app.webhook.fake_telegram import FakeTelegram, callback_update, message_update
+
+
+class PublishOnly:
+    def __init__(self) -> None:
+        self.published: list[tuple[str, str]] = []
+
+    async def publish(self, channel: str, message: str) -> None:
+        self.published.append((channel, message))
+
+
+async def test_ban_list_applies_local_and_remote_changes():
+    redis = PublishOnly()
+    bans = BanList(sessionmaker=None, redis=redis, static={1})
+
+    await bans.announce("ban", 5_000_000_000)
+    assert 5_000_000_000 in bans
+    assert redis.published == [("bans", "ban:5000000000")]
+
+    # сообщения от других процессов
+    bans._on_message("ban:7")
+    bans._on_message("unban:5000000000")
+    bans._on_message("garbage")
+    # BANNED_IDS из .env командой не снимается
+    bans._on_message("unban:1")
+    assert list(bans) == [1, 7]
+
+
+class _NoSession:
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *exc) -> None:
+        pass
+
+
+async def test_reload_keeps_changes_published_during_the_query(monkeypatch):
+    bans = BanList(sessionmaker=_NoSession, static={1})
+    query_started, finish = asyncio.Event(), asyncio.Event()
+
+    async def list_banned_ids(session):
+        query_started.set()
+        await finish.wait()
+        return {7, 8}  # снимок до бана 9 и разбана 8
+
+    monkeypatch.setattr(app.bans, "list_banned_ids", list_banned_ids)
+    reload = asyncio.create_task(bans.reload())
+    await query_started.wait()
+    bans._on_message("ban:9")
+    bans._on_message("unban:8")
+    finish.set()
+    await reload
+    assert list(bans) == [1, 7, 9]
+
+
+async def test_ban_middleware_stops_updates_of_banned_users():
+    fake = FakeTelegram()
+    async with TestServer(fake.app()) as api:
+        bot = Bot("123:fake", session=AiohttpSession(api=TelegramAPIServer.from_base(str(api.make_url("")).rstrip("/"))))
+        dp = Dispatcher()
+        dp.update.middleware(BanMiddleware({5}))
+        router = Router()
+
+        @router.message()
+        async def echo(message: Message) -> None:
+            await message.answer("ok")
+
+        dp.include_router(router)
+        for update in (message_update(1, 5, "hi"), message_update(2, 6, "hi"), callback_update(3, 5, 1, "b1:x")):
+            await dp.feed_update(bot, Update.model_validate(update, context={"bot": bot}))
+        await bot.session.close()
+
+    assert [(m, p["text"]) for m, p in fake.calls] == [
+        ("sendMessage", "⛔️ Вы заблокированы."),
+        ("sendMessage", "ok"),
+        ("answerCallbackQuery", "⛔️ Вы заблокированы."),
+    ]
@@ -0,0 +1,60 @@
+import asyncio
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.memory import MemoryStorage, SimpleEventIsolation
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Update
+from aiohttp.test_utils import TestServer
+
+from app.handlers.common import safe_edit_text
+from app.middlewares.clicks import ClickCoalescingMiddleware
+from app.middlewares.fsm import BufferedFSMMiddleware
+from app.webhook.fake_telegram import FakeTelegram, callback_update
+
+
+async def test_repeated_clicks_run_the_handler_once_and_the_last_click_wins():
+    fake = FakeTelegram()
+    async with TestServer(fake.app()) as api:
+        bot = Bot("123:fake", session=AiohttpSession(api=TelegramAPIServer.from_base(str(api.make_url("")).rstrip("/"))))
+        clicks = ClickCoalescingMiddleware()
+        # как в create_dispatcher: нажатия сливаются до чтения FSM
+        dp = Dispatcher(storage=MemoryStorage(), events_isolation=SimpleEventIsolation(), disable_fsm=True)
+        dp.update.outer_middleware(clicks)
+        dp.update.outer_middleware(BufferedFSMMiddleware(dp.fsm.storage, dp.fsm.events_isolation))
+        router = Router()
+        handled: list[str] = []
+        seen: list[str] = []
+        kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="x", callback_data="x")]])
+
+        @router.callback_query()
+        async def click(call: CallbackQuery, state: FSMContext) -> None:
+            handled.append(call.data)
+            # каждое нажатие видит то, что записало предыдущее
+            assert await state.get_value("pages", []) == seen
+            await asyncio.sleep(0.05)
+            await state.update_data(pages=[*seen, call.data])
+            seen.append(call.data)
+            await safe_edit_text(call.message, f"page {call.data}", reply_markup=kb)
+            await call.answer()
+
+        dp.include_router(router)
+        # одно сообщение: три одинаковых нажатия, две другие кнопки и снова первая
+        datas = ["a", "a", "a", "b", "c", "a"]
+        updates = [
+            Update.model_validate(callback_update(i, chat_id=1, message_id=10, data=d), context={"bot": bot})
+            for i, d in enumerate(datas, start=1)
+        ]
+        await asyncio.gather(*(dp.feed_update(bot, u) for u in updates))
+        # "c" ждал своей очереди и вытеснил "b"; повторный рендер "a" сообщение уже показывает
+        late = Update.model_validate(callback_update(9, chat_id=1, message_id=10, data="c"), context={"bot": bot})
+        await dp.feed_update(bot, late)
+        await bot.session.close()
+
+    assert handled == ["a", "c", "c"]
+    assert seen == handled
+    edits = [p["text"] for m, p in fake.calls if m == "editMessageText"]
+    assert edits == ["page a", "page c"]
+    assert len([m for m, _ in fake.calls if m == "answerCallbackQuery"]) == len(datas) + 1
+    assert len(clicks) == 0
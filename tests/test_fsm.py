@@ -0,0 +1,111 @@
+import asyncio
+
+from aiogram import Bot
+from aiogram.dispatcher.middlewares.user_context import EventContext
+from aiogram.fsm.storage.memory import DisabledEventIsolation, SimpleEventIsolation
+from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.types import Chat, User
+
+from app.handlers.user import BookingStates
+from app.middlewares.fsm import BufferedFSMMiddleware
+
+
+class FakeRedis:
+    """Только то, что зовёт BufferedFSMMiddleware: MGET и pipeline с SET/DELETE."""
+
+    def __init__(self) -> None:
+        self.values: dict[str, str] = {}
+        self.ttls: dict[str, int | None] = {}
+        self.round_trips = 0
+
+    async def mget(self, *keys: str) -> list[bytes | None]:
+        self.round_trips += 1
+        return [self.values[k].encode() if k in self.values else None for k in keys]
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis) -> None:
+        self.redis = redis
+        self.ops: list = []
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        pass
+
+    def set(self, key: str, value: str, ex: int | None = None) -> None:
+        self.ops.append(("set", key, value, ex))
+
+    def delete(self, key: str) -> None:
+        self.ops.append(("delete", key))
+
+    async def execute(self) -> None:
+        self.redis.round_trips += 1
+        for op in self.ops:
+            if op[0] == "set":
+                self.redis.values[op[1]], self.redis.ttls[op[1]] = op[2], op[3]
+            else:
+                self.redis.values.pop(op[1], None)
+
+
+async def test_booking_step_is_one_read_and_one_write_with_ttl():
+    redis = FakeRedis()
+    fsm = BufferedFSMMiddleware(
+        RedisStorage(redis), DisabledEventIsolation(), ttls={BookingStates.__full_group_name__: 1800}
+    )
+    bot = Bot("123:fake")
+
+    # шаг "выбор мастера": прочитать данные, дописать, сменить состояние
+    state = fsm.get_context(bot, chat_id=1, user_id=1)
+    await fsm.load(state)
+    await state.update_data(master_id=7)
+    await state.set_state(BookingStates.choosing_service)
+    assert await state.get_data() == {"master_id": 7}
+    await fsm.flush(state)
+    assert redis.round_trips == 2
+    assert set(redis.ttls.values()) == {1800}
+
+    # следующий апдейт видит записанное; без изменений — ни одной записи
+    state = fsm.get_context(bot, chat_id=1, user_id=1)
+    await fsm.load(state)
+    assert await state.get_state() == BookingStates.choosing_service.state
+    await state.update_data(master_id=7)
+    await fsm.flush(state)
+    assert redis.round_trips == 3
+
+    await state.clear()
+    await fsm.flush(state)
+    assert redis.values == {}
+    await bot.session.close()
+
+
+async def test_updates_of_one_chat_see_each_others_writes():
+    redis = FakeRedis()
+    fsm = BufferedFSMMiddleware(RedisStorage(redis), SimpleEventIsolation())
+    bot = Bot("123:fake")
+    context = EventContext(chat=Chat(id=1, type="private"), user=User(id=1, is_bot=False, first_name="u"))
+    shown = asyncio.Event()
+
+    # выбор времени: клавиатура «Подтвердить» показана раньше, чем записаны when и состояние
+    async def choose_time(event, data):
+        shown.set()
+        await asyncio.sleep(0.01)
+        await data["state"].update_data(when="2026-10-20T10:00")
+        await data["state"].set_state(BookingStates.confirming)
+
+    # «Подтвердить», нажатое сразу после показа
+    async def confirm(event, data):
+        await shown.wait()
+        assert await data["state"].get_state() == BookingStates.confirming.state
+        return (await data["state"].get_data())["when"]
+
+    first = asyncio.create_task(fsm(choose_time, None, {"bot": bot, "event_context": context}))
+    await shown.wait()
+    when = await fsm(confirm, None, {"bot": bot, "event_context": context})
+    await first
+    assert when == "2026-10-20T10:00"
+    await bot.session.close()
@@ -0,0 +1,72 @@
+import datetime as dt
+import json
+
+from app.importer import parse_import
+
+
+def test_csv_and_json_give_the_same_plan():
+    csv_plan, errors = parse_import(
+        "kind;name;description;duration_minutes;price;weekday;start;end;date\n"
+        "master;Анна;;;;;;;\n"
+        "service;Стрижка;;60;1500,50;;;;\n"
+        "hours;Анна;;;;0;10:00;19:00;\n"
+        "break;Анна;;;;0;14:00;15:00;\n"
+        "day_off;Анна;Отпуск;;;;;;2026-12-31\n".encode(),
+        "branch.csv",
+    )
+    assert errors == []
+    json_plan, errors = parse_import(json.dumps({
+        "masters": [{
+            "name": "Анна",
+            "working_hours": [{"weekday": 0, "start": "10:00", "end": "19:00"}],
+            "breaks": [{"weekday": 0, "start": "14:00", "end": "15:00"}],
+            "days_off": [{"date": "2026-12-31", "reason": "Отпуск"}],
+        }],
+        "services": [{"name": "Стрижка", "duration_minutes": 60, "price": "1500.50"}],
+    }).encode(), "branch.json")
+    assert errors == []
+    assert csv_plan == json_plan
+    assert csv_plan.services[0].price_cents == 150050
+    assert csv_plan.days_off[0].date == dt.date(2026, 12, 31)
+    assert csv_plan.referenced_masters() == set()
+
+
+def test_all_errors_are_reported_with_their_rows():
+    plan, errors = parse_import(
+        b"kind,name,description,duration_minutes,price,weekday,start,end,date\n"
+        b"service,X,,0,abc,,,,\n"
+        b"hours,B,,,,2,19:00,10:00,\n"
+        b"hours,B,,,,3,10:00,19:00,\n",
+        "bad.csv",
+    )
+    assert errors == [
+        "строка 2: duration_minutes: 0 вне диапазона",
+        "строка 2: price: ожидается цена в рублях",
+        "строка 3: start должен быть раньше end",
+    ]
+    assert plan.referenced_masters() == {"B"}
+
+
+def test_schedule_templates_and_holidays():
+    plan, errors = parse_import(
+        "kind,name,description,duration_minutes,price,weekday,start,end,date\n"
+        "template,2/2,10:00-20:00 10:00-20:00 - -,,,,14:00,15:00,\n"
+        "assign,Анна,2/2,,,,,,2026-11-02\n"
+        "assign,Борис,-,,,,,,\n"
+        "holiday,,Новый год,,,,,,2027-01-01\n".encode(),
+        "templates.csv",
+    )
+    assert errors == []
+    t = plan.templates[0]
+    assert t.days == ((dt.time(10), dt.time(20)), (dt.time(10), dt.time(20)), None, None)
+    assert t.breaks == ((dt.time(14), dt.time(15)),)
+    assert [(a.master, a.template, a.anchor) for a in plan.assignments] == [
+        ("Анна", "2/2", dt.date(2026, 11, 2)),
+        ("Борис", None, dt.date(2024, 1, 1)),
+    ]
+    assert plan.holidays[0].name == "Новый год"
+    assert plan.referenced_masters() == {"Анна", "Борис"}
+    assert plan.referenced_templates() == set()
+
+    _, errors = parse_import(json.dumps({"templates": [{"name": "off", "days": [None, "20:00-10:00"]}]}).encode())
+    assert errors == ["templates[1]: days[1]: начало должно быть раньше конца"]
@@ -0,0 +1,46 @@
+import datetime as dt
+
+from app.keyboards.builders import calendar_14d_kb, masters_kb, time_slots_kb
+from app.keyboards.cache import cached_keyboard
+from app.keyboards.callbacks import MyPage, PayAction, PayCb, TimePick
+
+
+def test_keyboards_are_built_once_per_input():
+    masters = [(1, "Анна"), (2, "Борис")]
+    assert masters_kb(list(masters)) is masters_kb(list(masters))
+    # каталог поменялся -> другой ключ, другая разметка
+    changed = masters_kb(masters + [(3, "Вера")])
+    assert changed is not masters_kb(masters)
+    assert [row[0].text for row in changed.inline_keyboard[:3]] == ["Анна", "Борис", "Вера"]
+
+    day = dt.date(2026, 10, 19)
+    assert calendar_14d_kb(day) is calendar_14d_kb(day)
+    assert calendar_14d_kb(day) is not calendar_14d_kb(day + dt.timedelta(days=1))
+
+
+def test_cached_keyboard_evicts_least_recently_used():
+    built = []
+
+    @cached_keyboard(maxsize=2)
+    def kb(n: int) -> list[int]:
+        built.append(n)
+        return [n]
+
+    kb(1), kb(2), kb(1), kb(3)  # 2 — самый давний, вытесняется
+    kb(1), kb(2)
+    assert built == [1, 2, 3, 2]
+    assert kb.cache_len() == 2
+
+
+def test_time_slot_callbacks_are_compact_and_round_trip():
+    tz = dt.timezone(dt.timedelta(hours=3))
+    slots = [dt.datetime(2026, 10, 19, 10, 0, tzinfo=tz), dt.datetime(2026, 10, 19, 10, 30, tzinfo=tz)]
+    buttons = [b for row in time_slots_kb(slots, tz).inline_keyboard for b in row if b.callback_data]
+    picks = [TimePick.unpack(b.callback_data) for b in buttons[:2]]
+    assert [p.when for p in picks] == slots
+    assert all(len(b.callback_data.encode()) <= 16 for b in buttons)
+
+    cb = MyPage(page=12, forward=False, at=int(slots[0].timestamp()), appt_id=987654).pack()
+    back = MyPage.unpack(cb)
+    assert back.key == (slots[0], 987654) and not back.forward
+    assert PayCb.unpack(PayCb(action=PayAction.done, payment_id=5).pack()).action is PayAction.done
@@ -0,0 +1,165 @@
+import datetime as dt
+
+import pytest
+
+from app.reminder_queue import _POP_DUE, LeaseLost, ReminderQueue
+from app.reminders import assign_reminder_bits, parse_reminder_offsets
+from app.workers.leases import _ACQUIRE, _RELEASE, _RENEW, ShardLeases
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeRedis:
+    """
+    Ровно то, что зовут ShardLeases и ReminderQueue.pop_due: строки с PX по общим часам, INCR, ZSET.
+    Lua-скрипты подменены их смыслом на Python — атомарны так же, как в Redis (без await внутри).
+    """
+
+    def __init__(self, clock: FakeClock) -> None:
+        self.clock = clock
+        self.strings: dict[str, tuple[str, float | None]] = {}
+        self.zsets: dict[str, dict[str, float]] = {}
+        self._scripts = {_ACQUIRE: self._acquire, _RENEW: self._renew, _RELEASE: self._release, _POP_DUE: self._pop_due}
+
+    def get(self, key: str) -> str | None:
+        value, expires = self.strings.get(key, (None, None))
+        if expires is not None and expires <= self.clock():
+            self.strings.pop(key)
+            return None
+        return value
+
+    def register_script(self, script: str):
+        impl = self._scripts[script]
+
+        async def run(keys: list[str], args: list) -> object:
+            return impl(keys, args)
+        return run
+
+    def _acquire(self, keys, args):
+        if self.get(keys[0]) is not None:
+            return None
+        fence = int(self.get(keys[1]) or 0) + 1
+        self.strings[keys[1]] = (str(fence), None)
+        value = f"{args[0]}:{fence}"
+        self.strings[keys[0]] = (value, self.clock() + args[1] / 1000)
+        return value.encode()
+
+    def _renew(self, keys, args):
+        if self.get(keys[0]) != args[0]:
+            return 0
+        self.strings[keys[0]] = (args[0], self.clock() + args[1] / 1000)
+        return 1
+
+    def _release(self, keys, args):
+        if self.get(keys[0]) != args[0]:
+            return 0
+        del self.strings[keys[0]]
+        return 1
+
+    def _pop_due(self, keys, args):
+        if len(keys) > 1 and self.get(keys[1]) != args[2]:
+            return None
+        zset = self.zsets.get(keys[0], {})
+        items = sorted((m for m, score in zset.items() if score <= args[0]), key=zset.get)[: args[1]]
+        for m in items:
+            del zset[m]
+        return [m.encode() for m in items]
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+    async def zrem(self, key: str, *members: str) -> None:
+        for m in members:
+            self.zsets.get(key, {}).pop(m, None)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis) -> None:
+        self.redis = redis
+        self.ops: list = []
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        pass
+
+    def zadd(self, key: str, mapping: dict[str, float]) -> None:
+        self.ops.append(lambda: self.redis.zsets.setdefault(key, {}).update(mapping) or len(mapping))
+
+    def zremrangebyscore(self, key: str, low: str, high: float) -> None:
+        def run() -> int:
+            zset = self.redis.zsets.get(key, {})
+            stale = [m for m, score in zset.items() if score <= high]
+            for m in stale:
+                del zset[m]
+            return len(stale)
+        self.ops.append(run)
+
+    def zcard(self, key: str) -> None:
+        self.ops.append(lambda: len(self.redis.zsets.get(key, {})))
+
+    async def execute(self) -> list:
+        return [op() for op in self.ops]
+
+
+def _leases(redis: FakeRedis, clock: FakeClock, name: str, shards: int = 4) -> ShardLeases:
+    leases = ShardLeases(redis, shards=shards, ttl=15, clock=clock)
+    leases.worker_id = name
+    return leases
+
+
+async def test_two_workers_split_shards():
+    clock = FakeClock()
+    redis = FakeRedis(clock)
+    a, b = _leases(redis, clock, "a"), _leases(redis, clock, "b")
+
+    await a.rebalance()
+    assert set(a.owned) == {0, 1, 2, 3}
+
+    # b пришёл: свободных шардов нет, но a видит его heartbeat и отдаёт лишнее
+    await b.rebalance()
+    assert b.owned == {}
+    await a.rebalance()
+    await b.rebalance()
+    assert len(a.owned) == len(b.owned) == 2
+    assert set(a.owned) | set(b.owned) == {0, 1, 2, 3}
+
+    # продление своих аренд проходит, чужие не трогаются
+    clock.now += 10
+    await a.rebalance()
+    await b.rebalance()
+    assert len(a.owned) == len(b.owned) == 2
+
+
+async def test_renewal_after_expiry_fails_and_pop_due_rejects_the_lost_lease():
+    clock = FakeClock()
+    redis = FakeRedis(clock)
+    a, b = _leases(redis, clock, "a", shards=2), _leases(redis, clock, "b", shards=2)
+    kinds, _ = assign_reminder_bits(parse_reminder_offsets("1h"), {})
+    queue = ReminderQueue(redis, kinds, shards=2)
+
+    await a.rebalance()
+    stale = a.lease_for(0)
+    redis.zsets[queue.due_key(0)] = {"10:1h": clock.now - 1}
+
+    # a завис дольше ttl: аренды и heartbeat истекли, b забрал все шарды (fencing-номер вырос)
+    clock.now += 20
+    await b.rebalance()
+    assert set(b.owned) == {0, 1}
+    assert b.lease_for(0)[1] == "b:2"
+
+    now = dt.datetime.fromtimestamp(clock.now, dt.timezone.utc)
+    with pytest.raises(LeaseLost):
+        await queue.pop_due(0, now=now, lease=stale)
+    assert list(redis.zsets[queue.due_key(0)]) == ["10:1h"]  # ничего не забрано
+
+    await a.renew()
+    assert a.owned == {}
+    assert await queue.pop_due(0, now=now, lease=b.lease_for(0)) == [(10, "1h")]
@@ -0,0 +1,56 @@
+import datetime as dt
+import json
+
+import pytest
+
+from app.database.models import Appointment, Payment, PaymentEvent
+from app.database.requests import _apply_payment_event
+from app.payments.base import WebhookRejected
+from app.payments.dummy import SIGNATURE_HEADER, DummyProvider, sign
+
+
+def test_dummy_webhook_signature_and_parsing():
+    provider = DummyProvider()
+    body = json.dumps([{"external_id": "7", "status": "paid", "amount_cents": 1500}, {"external_id": "8", "status": "failed"}]).encode()
+
+    notices = provider.parse_webhook(body, {SIGNATURE_HEADER: sign(body, "s")}, "s")
+    assert [(n.external_id, n.status, n.amount_cents) for n in notices] == [("7", "paid", 1500), ("8", "failed", None)]
+
+    with pytest.raises(WebhookRejected) as e:
+        provider.parse_webhook(body, {SIGNATURE_HEADER: sign(body, "other")}, "s")
+    assert e.value.http_status == 401
+    bad = b'{"external_id": "7", "status": "pending"}'
+    with pytest.raises(WebhookRejected):
+        provider.parse_webhook(bad, {SIGNATURE_HEADER: sign(bad, "s")}, "s")
+
+
+def test_apply_payment_event_transitions():
+    now = dt.datetime(2026, 10, 19, 12, tzinfo=dt.timezone.utc)
+
+    def make(payment_status, appt_status, starts_in_days=1):
+        p = Payment(id=1, status=payment_status, amount_cents=1500)
+        a = Appointment(payment_id=1, status=appt_status, starts_at=now + dt.timedelta(days=starts_in_days))
+        return p, a
+
+    def event(status, amount=None):
+        return PaymentEvent(provider="dummy", external_id="1", status=status, amount_cents=amount)
+
+    p, a = make("pending", "pending_payment")
+    assert _apply_payment_event(event("paid", 1500), p, a, now) == "applied"
+    assert (p.status, p.paid_at, a.status) == ("paid", now, "active")
+    assert _apply_payment_event(event("paid"), p, a, now) == "duplicate"
+
+    p, a = make("pending", "pending_payment")
+    assert _apply_payment_event(event("paid", 999), p, a, now) == "amount_mismatch"
+    assert p.status == "pending"
+
+    p, a = make("pending", "pending_payment")
+    assert _apply_payment_event(event("failed"), p, a, now) == "applied"
+    assert (p.status, a.status) == ("failed", "cancelled")
+    assert _apply_payment_event(event("paid"), p, a, now) == "conflict"  # оплата после отказа — вручную
+
+    p, a = make("paid", "active", starts_in_days=-1)
+    assert _apply_payment_event(event("refunded"), p, a, now) == "applied"
+    assert (p.status, a.status) == ("refunded", "active")  # прошедшая запись остаётся как была
+
+    assert _apply_payment_event(event("paid"), None, None, now) == "unknown"
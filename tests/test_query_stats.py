@@ -0,0 +1,226 @@
+import asyncio
+import datetime as dt
+import json
+import os
+from zoneinfo import ZoneInfo
+
+import pytest
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message, Update
+from aiohttp.test_utils import TestServer
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config import Config
+from app.database.instrumentation import (
+    QUERY_BUDGETS,
+    QueryBudgetExceeded,
+    QueryStats,
+    assert_query_budget,
+    instrument_engine,
+    track_queries,
+)
+from app.database.models import Appointment, Base, Master, Service, User
+from app.database.requests import materialize_day_schedules
+from app.handlers.user import MY_APPOINTMENTS_PAGE, BookingStates
+from app.handlers.user import router as user_router
+from app.keyboards.callbacks import DatePick, MyPage, to_epoch_day
+from app.middlewares.db import DbSessionMiddleware, HandlerTagMiddleware
+from app.webhook.fake_telegram import FakeTelegram, callback_update, message_update
+
+
+@pytest.fixture()
+def engine():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    instrument_engine(engine)  # idempotent: statements must not be counted twice
+    yield engine
+    engine.dispose()
+
+
+def test_counts_statements_per_block(engine):
+    with track_queries("choose_date") as stats:
+        with engine.connect() as conn:
+            for _ in range(3):
+                conn.execute(text("SELECT 1"))
+
+    assert stats.statements == 3
+    assert stats.total_time >= stats.slowest_time > 0
+    assert stats.slowest_statement == "SELECT 1"
+
+    # outside the block nothing is recorded
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert stats.statements == 3
+
+
+def test_query_budget(engine):
+    with track_queries("my_appointments") as stats:
+        with engine.connect() as conn:
+            for _ in range(5):
+                conn.execute(text("SELECT 1"))
+
+    with pytest.raises(QueryBudgetExceeded):
+        assert_query_budget(stats)
+    assert_query_budget(stats, budget=5)
+
+
+@pytest.fixture(scope="module")
+def pg_url():
+    """Async-драйвер — asyncpg, значит нужен Postgres: TEST_DATABASE_URL или контейнер, как в test_overlap."""
+    url = os.getenv("TEST_DATABASE_URL")
+    if url:
+        yield url
+        return
+    from testcontainers.postgres import PostgresContainer
+
+    with PostgresContainer("postgres:16") as pg:
+        yield pg.get_connection_url().replace("postgresql://", "postgresql+asyncpg://", 1)
+
+
+async def test_middlewares_attribute_async_statements_per_update(pg_url):
+    engine = create_async_engine(pg_url)
+    instrument_engine(engine)
+    seen: dict[str, QueryStats] = {}
+
+    def build(strict: bool) -> Dispatcher:
+        dp = Dispatcher()
+        dp.update.middleware(DbSessionMiddleware(async_sessionmaker(engine), strict_budgets=strict))
+        dp.message.middleware(HandlerTagMiddleware())
+        router = Router()
+
+        # имена хендлеров — ключи QUERY_BUDGETS: my_appointments — 4, master_agenda — 1
+        @router.message(F.text == "list")
+        async def my_appointments(message: Message, session: AsyncSession, query_stats: QueryStats) -> None:
+            seen[message.text] = query_stats
+            for _ in range(3):
+                await session.execute(text("SELECT pg_sleep(0.01)"))
+                await asyncio.sleep(0)  # апдейты перемежаются, статистика — у каждого своя
+
+        @router.message(F.text == "agenda")
+        async def master_agenda(message: Message, session: AsyncSession, query_stats: QueryStats) -> None:
+            seen[message.text] = query_stats
+            await session.execute(text("SELECT 1"))
+            await asyncio.sleep(0.02)
+            await session.execute(text("SELECT 2"))
+
+        dp.include_router(router)
+        return dp
+
+    bot = Bot("123:fake")
+    updates = [
+        Update.model_validate(message_update(i, chat_id=i, text=t), context={"bot": bot})
+        for i, t in enumerate(["list", "agenda"], start=1)
+    ]
+    try:
+        await asyncio.gather(*(build(strict=False).feed_update(bot, u) for u in updates))
+        assert (seen["list"].handler, seen["list"].statements) == ("my_appointments", 3)
+        assert (seen["agenda"].handler, seen["agenda"].statements) == ("master_agenda", 2)
+        assert seen["list"].slowest_statement == "SELECT pg_sleep(0.01)"
+
+        # strict_budgets: два запроса при бюджете 1 — падение, как в тестах хендлеров
+        with pytest.raises(QueryBudgetExceeded, match="master_agenda: 2 SQL statements, budget is 1"):
+            await build(strict=True).feed_update(bot, updates[1])
+        await build(strict=True).feed_update(bot, updates[0])
+    finally:
+        await bot.session.close()
+        await engine.dispose()
+
+
+async def test_user_handlers_stay_within_their_budgets(pg_url):
+    """Настоящие хендлеры через DbSessionMiddleware(strict) и HandlerTagMiddleware — бюджеты QUERY_BUDGETS держатся."""
+    schema = "budgets_test"
+    admin = create_async_engine(pg_url)
+    async with admin.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {schema}"))
+    await admin.dispose()
+    engine = create_async_engine(pg_url, connect_args={"server_settings": {"search_path": schema}})
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    instrument_engine(engine)
+    sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+
+    config = Config(
+        bot_token="123:fake", admin_ids=set(), banned_ids=set(), database_url=pg_url,
+        tz=ZoneInfo("Europe/Moscow"), work_start_hour=10, work_end_hour=20, slot_minutes=30, redis_url=None,
+    )
+    user_id = 7
+    tomorrow = dt.datetime.now(config.tz).date() + dt.timedelta(days=1)
+    async with sessionmaker() as session, session.begin():
+        session.add(User(id=user_id))
+        master, service = Master(name="Анна"), Service(name="Стрижка", duration_minutes=60, price_cents=150000)
+        session.add_all([master, service])
+        await session.flush()
+        for i in range(MY_APPOINTMENTS_PAGE + 2):  # две страницы
+            starts = dt.datetime.combine(tomorrow + dt.timedelta(days=i), dt.time(12), tzinfo=config.tz)
+            session.add(Appointment(user_id=user_id, master_id=master.id, service_id=service.id,
+                                    starts_at=starts, ends_at=starts + dt.timedelta(hours=1)))
+        # как после воркера отчётов: даты разложены в master_day_schedule, правила не читаются
+        await session.flush()
+        await materialize_day_schedules(session, tomorrow, tomorrow + dt.timedelta(days=13), 10, 20)
+
+    seen: list[QueryStats] = []
+
+    async def keep_stats(handler, event, data):
+        seen.append(data["query_stats"])
+        return await handler(event, data)
+
+    dp = Dispatcher()
+    dp["config"] = config
+    dp.update.middleware(DbSessionMiddleware(sessionmaker, strict_budgets=True))
+    dp.update.middleware(keep_stats)
+    dp.message.middleware(HandlerTagMiddleware())
+    dp.callback_query.middleware(HandlerTagMiddleware())
+    dp.include_router(user_router)
+
+    # перерасход откатывает записи хендлера: проверка бюджета — до commit
+    extra = Router()
+
+    @extra.message(F.text == "agenda")
+    async def master_agenda(message: Message, session: AsyncSession) -> None:
+        session.add(Master(name="Лишний"))
+        await session.flush()
+        await session.execute(text("SELECT 1"))
+
+    dp.include_router(extra)
+
+    fake = FakeTelegram()
+    async with TestServer(fake.app()) as api:
+        bot = Bot("123:fake", session=AiohttpSession(api=TelegramAPIServer.from_base(str(api.make_url("")).rstrip("/"))))
+        try:
+            def update(raw: dict) -> Update:
+                return Update.model_validate(raw, context={"bot": bot})
+
+            await dp.feed_update(bot, update(message_update(1, chat_id=user_id, text="👤 Мои записи")))
+            sent = next(p for m, p in fake.calls if m == "sendMessage")
+            buttons = [b for row in json.loads(sent["reply_markup"])["inline_keyboard"] for b in row]
+            next_page = next(b["callback_data"] for b in buttons if b["callback_data"].startswith(MyPage.__prefix__))
+            await dp.feed_update(bot, update(callback_update(2, chat_id=user_id, message_id=10, data=next_page)))
+
+            state = dp.fsm.get_context(bot, chat_id=user_id, user_id=user_id)
+            await state.update_data(master_id=master.id, service_id=service.id)
+            day = DatePick(day=to_epoch_day(tomorrow)).pack()
+            await dp.feed_update(bot, update(callback_update(3, chat_id=user_id, message_id=11, data=day)))
+
+            with pytest.raises(QueryBudgetExceeded, match="master_agenda"):
+                await dp.feed_update(bot, update(message_update(4, chat_id=user_id, text="agenda")))
+        finally:
+            await bot.session.close()
+
+    try:
+        handled = {s.handler: s.statements for s in seen}
+        assert set(handled) == {"my_appointments", "my_appointments_page", "choose_date", "master_agenda"}
+        for name in ("my_appointments", "my_appointments_page", "choose_date"):
+            assert 0 < handled[name] <= QUERY_BUDGETS[name], (name, handled[name])
+        assert await state.get_state() == BookingStates.choosing_time.state
+        async with sessionmaker() as session:
+            assert await session.scalar(select(Master.id).where(Master.name == "Лишний")) is None
+    finally:
+        await engine.dispose()
+        admin = create_async_engine(pg_url)
+        async with admin.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        await admin.dispose()
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import EditMessageText, SendMessage
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.outbound import OutboundQueue
+from app.ratelimit import RedisTokenBucket, TelegramRateLimiter, TokenBucket
+from app.workers.delivery import Delivery, OutgoingMessage
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_bucket_reserve_and_refill():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    # третий токен — в долг, ждать половину секунды
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert not bucket.try_acquire()
+
+    clock.now += 1.5
+    assert bucket.try_acquire()
+
+
+def test_token_bucket_drain():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, capacity=1, clock=clock)
+    bucket.drain(5)
+    assert bucket.reserve() == pytest.approx(6.0)
+
+
+class FakeScriptRedis:
+    """register_script без Lua: отвечает заданными задержками в мс, None — Redis недоступен."""
+
+    def __init__(self, replies: list[int | None]) -> None:
+        self.replies = replies
+        self.calls: list[tuple[list[str], list[float]]] = []
+
+    def register_script(self, script: str):
+        async def run(keys: list[str], args: list[float]) -> int:
+            self.calls.append((keys, args))
+            reply = self.replies.pop(0)
+            if reply is None:
+                raise RedisConnectionError("down")
+            return reply
+        return run
+
+
+async def test_shared_global_bucket_goes_through_redis_and_falls_back_to_local():
+    clock = FakeClock()
+    redis = FakeScriptRedis([0, 250, None, 0])
+    limiter = TelegramRateLimiter(global_rate=2, chat_rate=1000, clock=clock, redis=redis)
+    assert isinstance(limiter.global_bucket, RedisTokenBucket)
+
+    assert await limiter.global_bucket.reserve() == 0.0
+    assert await limiter.global_bucket.reserve() == pytest.approx(0.25)
+    # Redis лёг — резервируем локально, отправка не падает
+    assert await limiter.global_bucket.reserve() == 0.0
+    assert limiter.global_bucket.fallback.tokens == pytest.approx(1.0)
+
+    # 429 без чата тормозит все процессы: drain уходит в общий bucket
+    await limiter.penalize(None, 3)
+    assert redis.calls[-1] == (["tg:ratelimit:global"], [2.0, 2.0, 0, 3])
+
+
+class FakeBot:
+    def __init__(self, failures: dict[int, list[Exception]]) -> None:
+        self.failures = failures
+        self.sent: list[tuple[int, str]] = []
+
+    async def send_message(self, chat_id: int, text: str) -> None:
+        pending = self.failures.get(chat_id)
+        if pending:
+            raise pending.pop(0)
+        self.sent.append((chat_id, text))
+
+
+async def test_delivery_honors_retry_after_and_keeps_order():
+    method = SendMessage(chat_id=1, text="x")
+    bot = FakeBot({
+        1: [TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0)],
+        2: [TelegramForbiddenError(method=method, message="bot was blocked by the user")],
+    })
+    limiter = TelegramRateLimiter(global_rate=1000, chat_rate=1000)
+    delivery = Delivery(bot, limiter=limiter, concurrency=2)
+
+    results = await delivery.send_many([
+        OutgoingMessage(chat_id=1, text="a"),
+        OutgoingMessage(chat_id=2, text="b"),
+        OutgoingMessage(chat_id=3, text="c"),
+    ])
+
+    assert results == [True, False, True]
+    assert sorted(bot.sent) == [(1, "a"), (3, "c")]
+
+
+async def test_outbound_queue_retries_after_429_and_coalesces_edits():
+    calls: list[object] = []
+
+    async def make_request(bot, method):
+        calls.append(method)
+        if isinstance(method, SendMessage) and len(calls) == 1:
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0)
+        return method.text
+
+    # токен чата потрачен отправкой выше: все три правки ждут очереди и схлопываются в последнюю
+    queue = OutboundQueue(TelegramRateLimiter(global_rate=1000, chat_rate=5))
+
+    assert await queue(make_request, None, SendMessage(chat_id=1, text="hi")) == "hi"
+    assert len(calls) == 2
+
+    calls.clear()
+    edits = [EditMessageText(chat_id=1, message_id=7, text=t) for t in ("a", "b", "c")]
+    results = await asyncio.gather(*(queue(make_request, None, m) for m in edits))
+    assert [m.text for m in calls] == ["c"]
+    assert results == ["c", "c", "c"]
+    assert queue.depth == 0
@@ -0,0 +1,44 @@
+import datetime as dt
+
+import pytest
+
+from app.reminders import assign_reminder_bits, parse_reminder_offsets, reminded_kinds, superseded_cutoff
+
+
+def test_reminder_bits_stay_with_their_offsets():
+    kinds, new = assign_reminder_bits(parse_reminder_offsets("24h, 1h,90m,2d"), {})
+    assert [(k.name, k.bit) for k in kinds] == [("24h", 0), ("1h", 1), ("90m", 2), ("2d", 3)]
+    assert new == {1440: 0, 60: 1, 90: 2, 2880: 3}
+    assert kinds[2].offset == dt.timedelta(minutes=90)
+    assert reminded_kinds(0b1010, kinds) == {"1h", "2d"}
+
+    # 24h убрали, порядок поменяли, 1d == 24h вернули: биты прежние, бит убранного 90m никому не отдаётся
+    kinds, new = assign_reminder_bits(parse_reminder_offsets("2d,1h,30m,1d"), {1440: 0, 60: 1, 90: 2, 2880: 3})
+    assert [(k.name, k.bit) for k in kinds] == [("2d", 3), ("1h", 1), ("30m", 4), ("1d", 0)]
+    assert new == {30: 4}
+    assert reminded_kinds(0b1010, kinds) == {"1h", "2d"}
+
+    with pytest.raises(ValueError):
+        assign_reminder_bits(parse_reminder_offsets("5m"), {10000 + i: i for i in range(31)})
+
+
+def test_first_start_pins_the_positional_bits():
+    # пустая reminder_bits (миграция 0018 её только создаёт): биты — позиции в REMINDER_OFFSETS воркера,
+    # как в reminded_mask, записанных до таблицы; порядок — как в списке, не по сроку
+    kinds, new = assign_reminder_bits(parse_reminder_offsets("3h,24h,30m"), {})
+    assert [(k.name, k.bit) for k in kinds] == [("3h", 0), ("24h", 1), ("30m", 2)]
+    assert new == {180: 0, 1440: 1, 30: 2}
+    assert reminded_kinds(0b010, kinds) == {"24h"}
+
+
+@pytest.mark.parametrize("value", ["", "24h,24h", "1d,24h", "0h", "1w", "h"])
+def test_parse_reminder_offsets_rejects_bad_values(value):
+    with pytest.raises(ValueError):
+        parse_reminder_offsets(value)
+
+
+def test_superseded_cutoff_uses_next_smaller_offset():
+    kinds = parse_reminder_offsets("24h,3h,1h")
+    now = dt.datetime(2026, 1, 1, tzinfo=dt.timezone.utc)
+    assert superseded_cutoff(kinds[0], kinds, now) == now + dt.timedelta(hours=3)
+    assert superseded_cutoff(kinds[2], kinds, now) is None
@@ -0,0 +1,38 @@
+import datetime as dt
+from zoneinfo import ZoneInfo
+
+from app.database.requests import _day_ranges
+
+TZ = ZoneInfo("Europe/Moscow")
+
+
+def test_day_ranges_merge_consecutive_days():
+    d = dt.date(2026, 10, 1)
+    days = {d, d + dt.timedelta(days=1), d + dt.timedelta(days=2), d + dt.timedelta(days=10)}
+    ranges = _day_ranges(days, TZ)
+    assert ranges == [
+        (dt.datetime(2026, 10, 1, tzinfo=TZ), dt.datetime(2026, 10, 4, tzinfo=TZ)),
+        (dt.datetime(2026, 10, 11, tzinfo=TZ), dt.datetime(2026, 10, 12, tzinfo=TZ)),
+    ]
+    assert _day_ranges(set(), TZ) == []
+
+
+def test_export_period_parsing():
+    from app.handlers.admin import _parse_period
+
+    today = dt.date(2026, 2, 14)
+    assert _parse_period(None, today) == (dt.date(2026, 2, 1), dt.date(2026, 2, 28))
+    assert _parse_period("2025-12", today) == (dt.date(2025, 12, 1), dt.date(2025, 12, 31))
+    assert _parse_period("2026-01-05", today) == (dt.date(2026, 1, 5), dt.date(2026, 1, 5))
+    assert _parse_period("2026-01-05 2026-01-20", today) == (dt.date(2026, 1, 5), dt.date(2026, 1, 20))
+    assert _parse_period("2026-01-20 2026-01-05", today) is None
+    assert _parse_period("январь", today) is None
+
+
+def test_day_schedule_working_minutes():
+    from app.database.requests import DAY_OFF, DaySchedule
+
+    day = DaySchedule(dt.time(10), dt.time(20), ((dt.time(14), dt.time(15)), (dt.time(19, 30), dt.time(21))))
+    assert day.working_minutes == 600 - 60 - 30
+    assert DAY_OFF.off and DAY_OFF.working_minutes == 0
+    assert DaySchedule(dt.time(0), dt.time.max).working_minutes == 24 * 60
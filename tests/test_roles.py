@@ -0,0 +1,67 @@
+import asyncio
+
+from app.roles import Access, RoleCache
+
+
+class _Cache(RoleCache):
+    def __init__(self, roles, **kwargs):
+        super().__init__(sessionmaker=None, **kwargs)
+        self.roles = roles
+        self.loads = 0
+
+    async def _load(self, user_id):
+        self.loads += 1
+        return self.roles.get(user_id, Access())
+
+
+def test_role_cache_ttl_and_invalidate():
+    now = [0.0]
+    cache = _Cache({7: Access("master", 3)}, admin_ids={1}, ttl=60, clock=lambda: now[0])
+
+    async def run():
+        assert await cache.get(1) == Access("admin")
+        assert cache.loads == 0  # ADMIN_IDS — без БД
+
+        assert await cache.get(7) == Access("master", 3)
+        cache.roles[7] = Access()
+        assert await cache.get(7) == Access("master", 3)  # из кэша
+        assert cache.loads == 1
+
+        await cache.invalidate(7)
+        assert await cache.get(7) == Access()
+        assert cache.loads == 2
+
+        cache.roles[7] = Access("admin")
+        now[0] = 61
+        assert (await cache.get(7)).is_admin
+
+    asyncio.run(run())
+
+
+def test_invalidate_during_load_is_not_overwritten_by_the_stale_read():
+    cache = _Cache({7: Access("master", 3)}, ttl=60)
+    reading, release = asyncio.Event(), asyncio.Event()
+    load = cache._load
+
+    async def slow_load(user_id):
+        access = await load(user_id)  # прочитано до смены роли
+        reading.set()
+        await release.wait()
+        return access
+
+    async def run():
+        cache._load = slow_load
+        pending = asyncio.create_task(cache.get(7))
+        await reading.wait()
+        # роль сменили и сбросили, пока чтение ещё не вернулось (локально или сообщением из другого процесса)
+        cache.roles[7] = Access()
+        cache._forget("7")
+        release.set()
+        assert await pending == Access("master", 3)
+
+        cache._load = load
+        assert await cache.get(7) == Access()
+        assert cache.loads == 2
+        assert not cache._loading and not cache._stale
+
+    asyncio.run(run())
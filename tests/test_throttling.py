@@ -0,0 +1,45 @@
+from aiogram.types import CallbackQuery, Update, User
+
+from app.keyboards.callbacks import BookingAction, BookingNav, DatePick, MasterPick
+from app.middlewares.throttling import Limit, MemoryThrottleStore, ThrottlingMiddleware, classify
+from app.webhook.fake_telegram import message_update
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _callback(data: str) -> CallbackQuery:
+    return CallbackQuery(id="1", from_user=User(id=1, is_bot=False, first_name="u"), chat_instance="1", data=data)
+
+
+def test_slot_buttons_have_their_own_class():
+    assert classify(_callback(DatePick(day=20000).pack())) == "slots"
+    assert classify(_callback(BookingNav(action=BookingAction.back_times).pack())) == "slots"
+    assert classify(_callback(MasterPick(master_id=1).pack())) == "callback"
+
+
+async def test_excess_updates_are_dropped_before_the_handler():
+    clock = FakeClock()
+    middleware = ThrottlingMiddleware(
+        MemoryThrottleStore(clock=clock), limits={"message": Limit(rate=1.0, burst=2)}, exempt={42}
+    )
+    handled: list[int] = []
+
+    async def handler(event, data):
+        handled.append(data["event_from_user"].id)
+
+    update = Update.model_validate(message_update(1, 7, "hi"))
+    user, admin = User(id=7, is_bot=False, first_name="u"), User(id=42, is_bot=False, first_name="a")
+    for _ in range(5):
+        await middleware(handler, update, {"event_from_user": user})
+        await middleware(handler, update, {"event_from_user": admin})
+    clock.now = 1.0
+    await middleware(handler, update, {"event_from_user": user})
+
+    assert handled.count(7) == 3  # burst 2 + один токен за секунду
+    assert handled.count(42) == 5
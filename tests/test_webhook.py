@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message, Update
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from app.webhook.fake_telegram import FakeTelegram, callback_update, message_update
+from app.webhook.routing import SECRET_HEADER, ChatSerializer, UpdateRouter, chat_id_of, queue_key, worker_for
+
+
+class ListQueues:
+    """Вместо Redis: только RPUSH, который делает UpdateRouter."""
+
+    def __init__(self) -> None:
+        self.lists: dict[str, list[str]] = {}
+
+    async def rpush(self, key: str, value: str) -> None:
+        self.lists.setdefault(key, []).append(value)
+
+
+def test_updates_of_one_chat_go_to_one_worker():
+    msg = message_update(1, chat_id=42, text="/start")
+    cb = callback_update(2, chat_id=42, message_id=5, data="bk:x")
+    assert chat_id_of(msg) == chat_id_of(cb) == 42
+    assert worker_for(msg, 4) == worker_for(cb, 4) == 42 % 4
+    # группы (отрицательные id) тоже раскладываются в [0, workers)
+    assert 0 <= worker_for(message_update(3, chat_id=-100123, text="hi"), 3) < 3
+
+
+async def test_router_checks_secret_and_routes_by_chat():
+    queues = ListQueues()
+    app = web.Application()
+    UpdateRouter(queues, workers=2, secret="s3cret").setup(app)
+
+    async with TestClient(TestServer(app)) as client:
+        resp = await client.post("/webhook", json=message_update(1, 7, "/start"), headers={SECRET_HEADER: "wrong"})
+        assert resp.status == 401
+        for update_id, chat_id in ((2, 7), (3, 8), (4, 7)):
+            resp = await client.post(
+                "/webhook", json=message_update(update_id, chat_id, "/start"), headers={SECRET_HEADER: "s3cret"}
+            )
+            assert resp.status == 200
+
+    routed = {k: [json.loads(v)["update_id"] for v in items] for k, items in queues.lists.items()}
+    assert routed == {queue_key(1): [2, 4], queue_key(0): [3]}
+
+
+async def test_worker_keeps_per_chat_order_against_fake_telegram():
+    fake = FakeTelegram()
+    async with TestServer(fake.app()) as api:
+        bot = Bot("123:fake", session=AiohttpSession(api=TelegramAPIServer.from_base(str(api.make_url("")).rstrip("/"))))
+        router = Router()
+
+        @router.message()
+        async def echo(message: Message) -> None:
+            # первый апдейт чата обрабатывается дольше — без сериализации второй его обгонит
+            if message.text.endswith("-0"):
+                await asyncio.sleep(0.05)
+            await message.answer(message.text)
+
+        dp = Dispatcher()
+        dp.include_router(router)
+
+        chats = ChatSerializer()
+        tasks = []
+        update_ids = iter(range(1, 100))
+        for n in range(3):
+            for chat_id in (1, 2):
+                payload = message_update(next(update_ids), chat_id, f"{chat_id}-{n}")
+                update = Update.model_validate(payload, context={"bot": bot})
+                tasks.append(chats.submit(chat_id_of(payload), dp.feed_update(bot, update)))
+        await asyncio.gather(*tasks)
+        await bot.session.close()
+
+    for chat_id in (1, 2):
+        assert [p["text"] for _, _, p in fake.by_chat[chat_id]] == [f"{chat_id}-{n}" for n in range(3)]
+    assert len(chats) == 0